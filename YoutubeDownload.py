@@ -1,495 +1,79 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import sys, os, re, queue, math, logging, io, traceback, datetime
-import threading, time
+import sys, os, math, logging, io
+import threading, time, queue
+_STARTUP_T0 = time.perf_counter()   # mốc 0 của báo cáo khởi động (trước khi nạp PySide6 / engine)
+import logging.handlers
+from collections import deque
 
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List
 
-from PySide6.QtCore import Qt, QThread, Signal, QTimer, QSettings
+from PySide6.QtCore import Qt, Signal, QTimer, QSettings
 from PySide6.QtGui import QAction, QIcon, QCursor, QPainter, QPen, QBrush, QLinearGradient, QColor, QKeySequence
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QPushButton, QFileDialog, QTableWidget, QTableWidgetItem,
+    QLabel, QPushButton, QFileDialog, QTableView,
     QHeaderView, QSpinBox, QComboBox, QLineEdit, QMenu, QAbstractItemView,
     QStyledItemDelegate, QMessageBox, QInputDialog, QTabWidget, QPlainTextEdit, QDialog, QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, QToolTip
 )
-from license_check import check_license, save_token_text, APP_LICENSE_FILE
-from yt_dlp import YoutubeDL
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import license_check
+from license_check import save_token_text
+from download_core import (
+    USER_DATA_DIR, COOKIE_FILE, INSTAGRAM_COOKIE_FILE, QUALITY_OPTIONS,
+    Scheduler, HostBudget, WorkerPool, ProcessPool, FFMPEG, PERMANENT_ERRORS, RETRY_STRATEGIES, TitlePrefetcher,
+    PlaylistExpander,
+    BANDWIDTH, parse_rate, parse_schedule, parse_platform_limits, find_archived, forget_unavailable, reuse_archived, safe_filename,
+    _sanitize_yt_watch_url, detect_platform, build_format, split_urls,
+    looks_like_playlist_or_channel, identity_key,
+)
+from job_journal import JobJournal, is_finished
+from job_table import JobTableModel, JobEvents, COL_PROGRESS, PROGRESS_ROLE
+from gsheet import SheetParser, SheetSyncState, SheetWriteBack, gs_service, gs_sync_sheet_rows, sheet_key
+import download_core, gsheet
 import certifi  
 os.environ["SSL_CERT_FILE"] = certifi.where()
 APP_DIR = Path(__file__).resolve().parent
-USER_DATA_DIR = Path.home() / ".myduyen"
-USER_DATA_DIR.mkdir(parents=True, exist_ok=True)
-TOKEN_FILE = USER_DATA_DIR / "gsheets_token.json"
-SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 CREDENTIALS_FILE = APP_DIR / "credentials.json"
-COOKIE_FILE = APP_DIR / "cookies.txt"  # Cookie file for YouTube
-INSTAGRAM_COOKIE_FILE = APP_DIR / "instagram_cookies.txt"  # Cookie file for Instagram
-
-def ensure_embedded_credentials() -> Path:
-    """Trả về Path tới file credentials.json."""
-    return CREDENTIALS_FILE
-# ------------------------ Helpers ------------------------
-
-# === NEW: helpers dọn .part khi dính 416 ===
-def _delete_part_files_by_id(out_dir: Path, video_id: str):
-    """
-    Xóa mọi file *.part ứng với mẫu [<id>] để tránh resume sai → 416.
-    (Tên chuẩn từ _ydl_opts: ... [%(id)s].%(ext)s)
-    """
-    if not video_id:
-        return
-    patt = f"*[{video_id}].*.part"
-    for p in out_dir.glob(patt):
-        try:
-            p.unlink(missing_ok=True)
-        except Exception:
-            pass
 
-def _has_416(err: Exception) -> bool:
-    msg = repr(err).lower()
-    return ("requested range not satisfiable" in msg) or ("http error 416" in msg)
-
-def _is_valid_netscape_cookie(p: Path) -> bool:
-    """Kiểm tra xem file có đúng định dạng Netscape cookie hay không."""
-    if not p or not p.exists() or not p.is_file():
-        return False
-    try:
-        if p.stat().st_size == 0:
-            return False
-        with open(p, "r", encoding="utf-8", errors="ignore") as f:
-            first_line = f.readline()
-            # File Netscape cookie chuẩn luôn bắt đầu bằng # Netscape HTTP Cookie File
-            return "# Netscape HTTP Cookie File" in first_line
-    except Exception:
-        return False
-
-def _sanitize_yt_watch_url(u: str) -> str:
-    """
-    Làm sạch tham số thời gian (&t=, ?t=, &start=, &time_continue=, &si=...) khỏi URL YouTube.
-    Giữ nguyên các tham số còn lại.
-    """
-    if not u:
-        return u
-    try:
-        from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
-        p = urlparse(u)
-        host = (p.netloc or "").lower()
-        path = p.path or ""
-
-        # Chỉ xử lý YouTube
-        if ("youtube.com" in host and "/watch" in path) or ("youtu.be" in host):
-            # youtu.be/<id>?t=123  → đổi sang dạng /watch?v=<id>
-            if "youtu.be" in host:
-                video_id = path.strip("/").split("/")[0] if path.strip("/") else ""
-                if video_id:
-                    # chuyển sang watch URL chuẩn
-                    q = dict(parse_qsl(p.query, keep_blank_values=True))
-                    q["v"] = video_id
-                    # bỏ các tham số thời gian
-                    for k in ("t", "start", "time_continue", "si"):
-                        q.pop(k, None)
-                    new_query = urlencode(q, doseq=True)
-                    return urlunparse(("https", "www.youtube.com", "/watch", "", new_query, ""))
-
-            # youtube.com/watch?...  → giữ lại mọi tham số trừ thời gian
-            q = dict(parse_qsl(p.query, keep_blank_values=True))
-            for k in ("t", "start", "time_continue", "si"):
-                q.pop(k, None)
-            new_query = urlencode(q, doseq=True)
-            return urlunparse((p.scheme or "https", p.netloc, p.path, p.params, new_query, p.fragment))
-    except Exception:
-        # có lỗi thì trả về nguyên URL
-        return u
-    return u
-
-def _gs_get_creds(credentials_path: str, token_path: str | None = None) -> Credentials:
-    """
-    Lấy credentials với các bước:
-    1) Nếu đã có token → refresh nếu cần.
-    2) Cố gắng mở local server trên 127.0.0.1:55009; nếu fail → port=0.
-    3) Nếu vẫn không nhận redirect → fallback run_console() (copy-paste code).
-    4) Lưu token vào USER_DATA_DIR (ghi chắc hơn APP_DIR).
-    """
-    try:
-        token_file = TOKEN_FILE if token_path is None else Path(token_path)
-        if token_file.parent and not token_file.parent.exists():
-            token_file.parent.mkdir(parents=True, exist_ok=True)
+class StartupReport:
+    """Mốc khởi động (ms kể từ lúc nạp module) → dòng log "Startup: …" để thấy ngay khi mở app chậm đi."""
 
-        creds = None
-        if token_file.exists():
-            creds = Credentials.from_authorized_user_file(str(token_file), SHEETS_SCOPES)
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.marks: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
 
-        if creds and creds.valid:
-            return creds
+    def mark(self, name: str, since: float | None = None):
+        """since: perf_counter lúc bắt đầu việc nền → ghi thời lượng thay vì mốc."""
+        now = time.perf_counter()
+        with self._lock:
+            self.marks.append((name, (now - (self.t0 if since is None else since)) * 1000))
 
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                token_file.write_text(creds.to_json(), encoding="utf-8")
-                return creds
-            except Exception:
-                # token hỏng → xoá để chạy luồng mới
-                try:
-                    token_file.unlink(missing_ok=True)
-                except Exception:
-                    pass
-                creds = None
+    def line(self) -> str:
+        with self._lock:
+            return "Startup: " + " · ".join(f"{n} {ms:.0f} ms" for n, ms in self.marks)
 
-        # Không có token hợp lệ → chạy OAuth flow
-        flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SHEETS_SCOPES)
+STARTUP = StartupReport(_STARTUP_T0)
+STARTUP.mark("imports")
 
-        # 1) thử port “thân thiện” 55009 (hay dùng trong log của bạn)
-        try:
-            creds = flow.run_local_server(
-                host="127.0.0.1",
-                port=55009,
-                open_browser=True,
-                authorization_prompt_message="🔐 Trình duyệt sẽ mở để cấp quyền Google Sheets…",
-                success_message="✅ Đăng nhập thành công. Bạn có thể đóng tab này.",
-                timeout_seconds=180
-            )
-        except Exception:
-            # 3) Cuối cùng: thử một lần nữa với cấu hình đặc biệt
-            try:
-                print("⚠️ Thử lại với cấu hình đặc biệt...")
-                creds = flow.run_local_server(
-                    bind_addr="127.0.0.1",
-                    port=0,
-                    open_browser=True,
-                    authorization_prompt_message="🔐 Vui lòng cấp quyền trong trình duyệt...",
-                    success_message="✅ Đăng nhập thành công!",
-                    timeout_seconds=300
-                )
-            except Exception as final_err:
-                # Nếu vẫn không được, báo lỗi rõ ràng
-                raise RuntimeError(
-                    "Không thể hoàn tất OAuth flow. Vui lòng kiểm tra:\n"
-                    "1. Trình duyệt có mở được không?\n"
-                    "2. Firewall có chặn localhost không?\n"
-                    "3. Cổng 55009 hoặc các cổng khác có bị chiếm không?\n"
-                    f"Chi tiết lỗi: {final_err}"
-                )
-
-
-        token_file.write_text(creds.to_json(), encoding="utf-8")
-        return creds
-
-    except Exception as e:
-        raise RuntimeError(f"OAuth failed: {e}")
-
-def _gs_extract_spreadsheet_id(url: str) -> str:
-    # .../spreadsheets/d/<ID>/...
-    m = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", url)
-    return m.group(1) if m else ""
-
-def _gs_extract_gid(url: str) -> str | None:
-    m = re.search(r"[?#&]gid=(\d+)", url)
-    return m.group(1) if m else None
-
-def _gs_get_sheet_name_by_gid(service, spreadsheet_id: str, gid: str) -> str | None:
-    meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    for sh in meta.get("sheets", []):
-        props = sh.get("properties", {})
-        if str(props.get("sheetId")) == str(gid):
-            return props.get("title")
-    return None
+def ensure_embedded_credentials() -> Path:
+    """Trả về Path tới file credentials.json."""
+    return CREDENTIALS_FILE
+# ------------------------ Helpers ------------------------
+# (helper tải/URL nằm trong download_core.py — dùng chung với chế độ headless)
 
-def gs_get_values_from_url(sheet_url: str, credentials_path: str, a1_range: str | None = None):
-    """
-    Đọc dữ liệu từ Google Sheet theo URL (hỗ trợ gid). Mặc định lấy A1:Z1000.
-    """
-    spreadsheet_id = _gs_extract_spreadsheet_id(sheet_url)
-    if not spreadsheet_id:
-        raise RuntimeError("Không lấy được Spreadsheet ID từ URL.")
-
-    # Lưu ở USER_DATA_DIR để chắc quyền ghi
-    creds = _gs_get_creds(credentials_path, None)
-
-    service = build("sheets", "v4", credentials=creds)
-
-    sheet_name = None
-    gid = _gs_extract_gid(sheet_url)
-    if gid:
-        sheet_name = _gs_get_sheet_name_by_gid(service, spreadsheet_id, gid)
-        if not sheet_name:
-            raise RuntimeError("Không tìm thấy sheet theo GID.")
-    else:
-        # sheet đầu tiên
-        meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        sheets = meta.get("sheets", [])
-        sheet_name = (sheets[0]["properties"]["title"] if sheets else "Sheet1")
-
-    rng = a1_range or f"{sheet_name}!A1:Z1000"
-    resp = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=rng).execute()
-    return resp.get("values", [])
 def resource_path(name: str) -> str:
     base = getattr(sys, "_MEIPASS", str(APP_DIR))
     return str(Path(base) / name)
 
-QUALITY_OPTIONS = ["1080p", "720p", "480p", "360p"]
-
-def detect_platform(url: str) -> str:
-    u = (url or "").lower()
-    if "tiktok.com" in u: return "tt"
-    if "instagram.com" in u: return "ig"
-    if "facebook.com" in u or "fb.watch" in u: return "fb"
-    if "youtube.com" in u or "youtu.be" in u: return "yt"
-    if "dailymotion.com" in u or "dai.ly" in u: return "dm"
-    if ("reddit.com" in u) or ("v.redd.it" in u) or ("old.reddit.com" in u) or ("redd.it" in u): return "rd"
-    return "other"
-
-def build_format(quality: str, platform: str = "any") -> str:
-    """
-    Chọn format linh hoạt với fallback để tránh lỗi "format not available".
-    """
-    if quality == "Best":
-        return (
-            "bestvideo+bestaudio[acodec^=mp4a]/"
-            "bestvideo+bestaudio/"
-            "best"
-        )
-
-    h = {"1080p": 1080, "720p": 720, "480p": 480, "360p": 360}.get(quality, 0)
-    if h:
-        # ✅ Flexible format with fallbacks - tránh fail khi không có đúng độ phân giải
-        return (
-            f"bv[height<={h}]+ba/"
-            f"bv*[height<={h}]+ba/"
-            "bestvideo+bestaudio/"
-            "best"
-        )
-
-    return "bestvideo+bestaudio/best"
-
-
-
-def split_urls(text: str):
-    urls = []
-    for line in re.split(r"[\r\n\s]+", (text or "").strip()):
-        if line and line.startswith("http"):
-            urls.append(line)
-    return urls
-
-# ---- Nhận diện/mở rộng kênh/playlist thành danh sách video (explode) ----
-_YDL_EXPAND_OPTS = {
-    "quiet": True,
-    "skip_download": True,
-    "extract_flat": True,      # lấy danh sách nhanh, không tải metadata nặng
-    "noplaylist": False,
-    "lazy_playlist": False,
-    # ✅ TV Embedded không cần PO Token
-    "extractor_args": {
-        "youtube": {
-            "player_client": ["tv_embedded", "android_vr", "mweb"],
-            "player_skip": ["android", "ios", "web_creator", "mediaconnect", "tv", "web"]
-        }
-    }
-}
-
-YOUTUBE_WATCH = "https://www.youtube.com/watch?v="
-
-PLAYLIST_ID_RE = re.compile(r"[?&]list=([A-Za-z0-9_\-]+)")
-
-def canonicalize_playlist_url(u: str) -> str:
-    """Chuẩn hoá URL playlist YouTube. Nền tảng khác trả nguyên."""
-    if not u:
-        return u
-    lu = u.lower()
-    if ("youtube.com" in lu) or ("youtu.be" in lu):
-        m = PLAYLIST_ID_RE.search(u)
-        if m:
-            pid = m.group(1)
-            return f"https://www.youtube.com/playlist?list={pid}"
-    return u
-
-def canonicalize_channel_url(u: str) -> str:
-    """
-    Đưa link kênh YouTube về tab /videos; KHÔNG đụng vào URL video
-    và KHÔNG áp dụng cho TikTok/Instagram/Facebook.
-    """
-    if not u:
-        return u
-    lu = u.lower()
-
-    # Chỉ xử lý YouTube
-    if ("youtube.com" in lu) or ("youtu.be" in lu):
-        # Nếu là video watch thì giữ nguyên
-        if "/watch" in lu:
-            return u
-        # Nếu là dạng kênh/slug thì thêm /videos
-        if ("/channel/" in lu) or ("/user/" in lu) or ("/c/" in lu) or ("/@" in lu):
-            return u.rstrip("/") + "/videos"
-    return u
-
-def _normalize_video_url(entry: Dict[str, Any]) -> str:
-    if not entry: return ""
-    u = entry.get("url") or ""
-    vid = entry.get("id") or ""
-    if u.startswith("http"): return u
-    if vid: return f"{YOUTUBE_WATCH}{vid}"
-    return u
-
-def _flatten_entries(node: Dict[str, Any]) -> List[str]:
-    out = []
-    if not node: return out
-    if "entries" in node and isinstance(node["entries"], list):
-        for e in node["entries"]:
-            if isinstance(e, dict) and "entries" in e:
-                out.extend(_flatten_entries(e))
-            elif isinstance(e, dict):
-                u = _normalize_video_url(e)
-                if u: out.append(u)
-    else:
-        u = _normalize_video_url(node)
-        if u: out.append(u)
-    return out
-
-def looks_like_playlist_or_channel(u: str) -> bool:
-    """Chỉ coi là playlist/kênh nếu là YouTube."""
-    if not u:
-        return False
-    lu = u.lower()
-    if ("youtube.com" in lu) or ("youtu.be" in lu):
-        # playlist id
-        if "list=" in lu or "/playlist" in lu:
-            return True
-        # các kiểu kênh/slug YouTube
-        if ("/channel/" in lu) or ("/user/" in lu) or ("/c/" in lu) or ("/@" in lu):
-            # đừng nhầm video YouTube (/watch?v=) là kênh
-            if "/watch" in lu:
-                return False
-            return True
-    # TikTok/IG/FB/...: KHÔNG explode
-    return False
-
-def get_video_title(url: str) -> str | None:
-    """
-    Lấy title từ YouTube video URL. Trả về None nếu không lấy được.
-    """
-    try:
-        from urllib.parse import urlparse
-        host = (urlparse(url or "").netloc or "").lower()
-        is_yt = ("youtube.com" in host) or ("youtu.be" in host)
-        if not is_yt:
-            return None
-        
-        # Sanitize URL trước khi lấy title
-        url = _sanitize_yt_watch_url(url)
-        
-        opts = {
-            "quiet": True,
-            "skip_download": True,
-            "extractor_args": {
-                "youtube": {
-                    "player_client": ["tv_embedded", "android_vr", "mweb"],
-                    "player_skip": ["android", "ios", "web_creator", "tv", "web", "mediaconnect"]
-                }
-            }
-        }
-        with YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if info and isinstance(info, dict):
-                return info.get("title")
-    except Exception:
-        pass
-    return None
-
-def expand_url_to_videos(u: str) -> List[str]:
-    """
-    Chỉ expand playlist/kênh cho YouTube. Nền tảng khác trả [u].
-    """
-    try:
-        if not looks_like_playlist_or_channel(u):
-            return [u]
-
-        # ✅ Skip YouTube Mix/Radio playlists (RD..., RDMM..., RDAO..., etc.)
-        # Những playlist này do YouTube tạo tự động và không thể expand
-        if "list=" in u:
-            match = re.search(r"[?&]list=(RD[A-Za-z0-9_\-]+)", u)
-            if match:
-                # Đây là Mix/Radio playlist, không thể expand → trả về URL gốc
-                return [u]
-
-        # Lúc này chắc chắn là YouTube
-        if "list=" in u or "/playlist" in u:
-            u = canonicalize_playlist_url(u)
-        else:
-            u = canonicalize_channel_url(u)
-
-        with YoutubeDL(_YDL_EXPAND_OPTS) as ydl:
-            info = ydl.extract_info(u, download=False)
-
-        if not info:
-            return [u]
-        if "entries" in info:
-            vids = _flatten_entries(info)
-            seen, uniq = set(), []
-            for v in vids:
-                if v and v not in seen:
-                    seen.add(v); uniq.append(v)
-            return uniq or [u]
-        return [u]
-    except Exception:
-        return [u]
-def extract_urls_from_text(text: str) -> list[str]:
-    if not text: return []
-    urls = []
-    for part in re.split(r"[ \t]+", text.strip()):
-        if part.startswith("http://") or part.startswith("https://"):
-            urls.append(part)
-    return urls
-
-def parse_cell_content(cell: str):
-    """
-    Trả về (regular_urls, preventive_urls, sound_urls).
-    Nhận diện 'link dự phòng', 'original_sound'/'original sound'.
-    """
-    regular, preventive, sound = [], [], []
-    if not cell: return regular, preventive, sound
-    lines = [ln.strip() for ln in re.split(r"[\r\n]+", cell) if ln.strip()]
-    in_prev = in_sound = False
-    for ln in lines:
-        lower = ln.lower()
-        if "link dự phòng" in lower:
-            in_prev, in_sound = True, False
-            preventive += extract_urls_from_text(ln)
-            continue
-        if "original_sound" in lower or "original sound" in lower:
-            in_sound, in_prev = True, False
-            sound += extract_urls_from_text(ln)
-            continue
-
-        urls = extract_urls_from_text(ln)
-        if in_prev: preventive += urls
-        elif in_sound: sound += urls
-        else: regular += urls
-    return regular, preventive, sound
-
-_SUPPORTED = (
-    "youtube.com","youtu.be",
-    "instagram.com",
-    "facebook.com","fb.watch",
-    "tiktok.com",
-    "x.com","twitter.com",
-    "dailymotion.com","dai.ly",
-    "reddit.com","v.redd.it","old.reddit.com","redd.it"
-)
-def is_valid_video_url(u: str) -> bool:
-    if not u or not (u.startswith("http://") or u.startswith("https://")): return False
-    return any(dom in u.lower() for dom in _SUPPORTED)
 
-# ------------------------ Glow viền hàng active ------------------------
+# ------------------------ Glow viền hàng active + thanh tiến độ ------------------------
 class GlowDelegate(QStyledItemDelegate):
-    def __init__(self, table, active_rows_getter):
+    def __init__(self, table, active_ids_getter):
         super().__init__(table)
         self.table = table
-        self._get_active = active_rows_getter
+        self._get_active = active_ids_getter  # set job id đang chạy
         self._phase = 0.0
         # ✅ Tắt animation để tăng performance - chỉ update khi cần
         self._timer = QTimer(self)
@@ -500,9 +84,10 @@ class GlowDelegate(QStyledItemDelegate):
         if self.table.isVisible():
             self.table.viewport().update()
     def paint(self, painter, option, index):
+        if index.column() == COL_PROGRESS:
+            self._paint_progress(painter, option, index.data(PROGRESS_ROLE))
         super().paint(painter, option, index)
-        row = index.row()
-        if row not in self._get_active(): return
+        if self.table.model().job_at(index.row()).id not in self._get_active(): return
         r = option.rect.adjusted(1, 1, -1, -1)
         t = self._phase
         c1 = QColor(56,189,248,200); c2 = QColor(59,130,246,200)
@@ -515,6 +100,17 @@ class GlowDelegate(QStyledItemDelegate):
         painter.setPen(QPen(QBrush(grad), 2.0)); painter.setBrush(Qt.NoBrush)
         painter.drawRoundedRect(r, 6, 6)
 
+    def _paint_progress(self, painter, option, pct):
+        # ✅ Vẽ thẳng thanh % (không tạo QLabel/QProgressBar cho từng hàng)
+        if pct is None or pct <= 0: return
+        r = option.rect.adjusted(3, 4, -3, -4)
+        r.setWidth(max(1, int(r.width() * min(pct, 100) / 100)))
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setPen(Qt.NoPen); painter.setBrush(QColor(56, 189, 248, 90))
+        painter.drawRoundedRect(r, 4, 4)
+        painter.restore()
+
 # ------------------------ Ô nhập “click để paste” ------------------------
 class PasteOnClickLineEdit(QLineEdit):
     pastedOne = Signal(str)
@@ -531,805 +127,54 @@ class PasteOnClickLineEdit(QLineEdit):
         super().mousePressEvent(e)
 
 # ------------------------ Worker tải đơn ------------------------
-class DownloadWorker(QThread):
-    progress = Signal(int, int)
-    status   = Signal(int, str)
-    done     = Signal(int, bool, str)
-    log      = Signal(str)
+class DownloadWorker:
+    """
+    Handle của 1 hàng đang tải: tạo job qua pool của MainWindow (WorkerPool: thread sống lâu,
+    ProcessPool: process con) và gửi vào pool. Progress/status của job ghi vào JobEvents —
+    MainWindow gom và vẽ theo nhịp timer; kết thúc báo qua JobEvents.done.
+    Log đi qua logger "app" (lọc level ngay tại thread tải).
+    """
 
     def __init__(self, row: int, url: str, out_dir: Path, fmt: str,
+                 events: JobEvents,
+                 pool: WorkerPool | ProcessPool,
                  filename_base: str | None = None,
                  per_folder: bool = False,
                  from_collection: bool = False,
                  audio_only: bool = False,
-                 convert_av1: bool = False,
-                 parent=None):
-        super().__init__(parent)
+                 convert_av1: bool = False):
         self.row = row
         self.url = url
-        self.out_dir = out_dir
-        self.fmt = fmt
-        self.filename_base = filename_base
-        self.per_folder = per_folder
-        self.from_collection = from_collection
-        self.audio_only = audio_only
-        self.convert_av1 = convert_av1
-        self._pause_evt = threading.Event(); self._pause_evt.set()
-        self._stop_flag = False
-        self._was_paused = False
+        self.events = events
+        self.pool = pool
+        self.job = pool.new_job(
+            row=row, url=url, out_dir=out_dir, fmt=fmt,
+            filename_base=filename_base,
+            per_folder=per_folder,
+            from_collection=from_collection,
+            audio_only=audio_only,
+            convert_av1=convert_av1,
+            on_progress=lambda pct: events.progress(row, pct),
+            on_status=lambda text: events.status(row, text),
+            on_log=logging.getLogger("app").info,
+        )
 
     def pause(self):
-        """Tạm dừng tiến trình tải (giữ kết nối, đứng trong hook)."""
-        self._pause_evt.clear()
-        try:
-            self.status.emit(self.row, "Paused")
-        except Exception:
-            pass
+        self.job.pause()
 
     def resume(self):
-        """Tiếp tục sau khi pause."""
-        self._pause_evt.set()
-        try:
-            self.status.emit(self.row, "Downloading")
-        except Exception:
-            pass
+        self.job.resume()
 
     def stop(self):
-        """Hủy job đang chạy (sẽ raise trong hook)."""
-        self._stop_flag = True
-        # nếu đang pause, cho thoát khỏi vòng chờ ngay
-        self._pause_evt.set()
-        try:
-            self.status.emit(self.row, "Canceling…")
-        except Exception:
-            pass
-
-    class _YTDLPLogger:
-        def __init__(self, outer): self.outer = outer
-        def debug(self, msg):  self.outer.log.emit(f"[{self.outer.row}] {msg}")
-        def warning(self, msg): self.outer.log.emit(f"[{self.outer.row}] WARNING: {msg}")
-        def error(self, msg):  self.outer.log.emit(f"[{self.outer.row}] ERROR: {msg}")
-    UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-          "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+        self.job.stop()
 
-    def _ydl_opts(self):
-        """
-        - per_folder=True: ghi vào subfolder cho từng item (video + thumbnail cùng chỗ)
-        - convert_av1=True: re-encode video → H.264 (libx264). Tắt → giữ nguyên video (copy).
-        - Luôn remux MP4; ép audio → AAC để tương thích.
-        - ✅ YouTube: dùng ios/android client + cookies.txt (bypass SABR, nsig, age-restrict).
-        - ✅ Instagram: dùng instagram_cookies.txt (bypass login required & rate-limit).
-        - ✅ Các nền tảng khác: không dùng cookies để tránh lỗi.
-        """
-        from urllib.parse import urlparse
-        from shutil import which
-
-        host = (urlparse(self.url or "").netloc or "").lower()
-        is_yt = ("youtube.com" in host) or ("youtu.be" in host)
-        is_ig = "instagram.com" in host
-        is_tt = "tiktok.com" in host
-        is_fb = ("facebook.com" in host) or ("fb.watch" in host)
-        is_dm = ("dailymotion.com" in host) or ("dai.ly" in host)
-        is_rd = ("reddit.com" in host) or ("v.redd.it" in host) or ("old.reddit.com" in host) or ("redd.it" in host)
-        is_tg = ("t.me" in host) or ("telegram.org" in host)
-
-        # ---- ffmpeg ----
-        def _which_ffmpeg():
-            # ✅ Tìm ffmpeg ở nhiều vị trí, bao gồm subdirectory ffmpeg/
-            search_paths = [
-                APP_DIR / "ffmpeg.exe",                    # ffmpeg.exe trong APP_DIR
-                APP_DIR / "ffmpeg",                         # ffmpeg trong APP_DIR
-                APP_DIR / "ffmpeg" / "ffmpeg.exe",          # ffmpeg.exe trong APP_DIR/ffmpeg/
-                APP_DIR / "ffmpeg" / "ffmpeg",              # ffmpeg trong APP_DIR/ffmpeg/
-                Path(sys.executable).parent / "ffmpeg.exe", # ffmpeg.exe trong thư mục Python
-                Path(sys.executable).parent / "ffmpeg",     # ffmpeg trong thư mục Python
-            ]
-            for p in search_paths:
-                if Path(p).exists():
-                    return str(p)
-            # Cuối cùng, thử tìm trong PATH
-            return which("ffmpeg")
-        
-        def _verify_ffmpeg(path: str | None) -> bool:
-            """Verify ffmpeg thực sự có thể chạy được bằng cách test chạy"""
-            if not path:
-                return False
-            try:
-                import subprocess
-                p = Path(path)
-                
-                # Nếu là file, kiểm tra tồn tại
-                if p.is_file():
-                    if not p.exists():
-                        return False
-                    # Trên Windows, nếu không có extension, thử thêm .exe
-                    if sys.platform == "win32" and not path.lower().endswith((".exe", ".bat", ".cmd")):
-                        exe_path = p.parent / f"{p.name}.exe"
-                        if exe_path.exists():
-                            path = str(exe_path)
-                        else:
-                            # Thử thêm .exe vào path hiện tại
-                            path = str(p) + ".exe"
-                            if not Path(path).exists():
-                                return False
-                    # Test chạy ffmpeg với -version
-                    try:
-                        result = subprocess.run(
-                            [path, "-version"],
-                            capture_output=True,
-                            timeout=5,
-                            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-                        )
-                        return result.returncode == 0
-                    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                        return False
-                # Nếu là thư mục, tìm ffmpeg bên trong
-                elif p.is_dir():
-                    for exe_name in ("ffmpeg.exe", "ffmpeg"):
-                        exe_path = p / exe_name
-                        if exe_path.exists() and exe_path.is_file():
-                            try:
-                                result = subprocess.run(
-                                    [str(exe_path), "-version"],
-                                    capture_output=True,
-                                    timeout=5,
-                                    creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-                                )
-                                if result.returncode == 0:
-                                    return True
-                            except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                                continue
-                    return False
-                else:
-                    return False
-            except Exception:
-                return False
-
-        ffmpeg_path = _which_ffmpeg()
-        have_ffmpeg = _verify_ffmpeg(ffmpeg_path)
-        
-        # ✅ Debug: log ffmpeg path nếu có
-        if ffmpeg_path:
-            try:
-                self.log.emit(f"[{self.row}] 🔍 FFmpeg found: {ffmpeg_path} (verified: {have_ffmpeg})")
-            except Exception:
-                pass
-
-        # ✅ Đã loại bỏ hoàn toàn cookie - không cần thiết
-
-        # ---- Headers / extractor args ----
-        headers = {"User-Agent": self.UA}
-        referer = (
-            "https://www.instagram.com/"   if is_ig else
-            "https://www.facebook.com/"    if is_fb else
-            "https://www.tiktok.com/"      if is_tt else
-            "https://www.dailymotion.com/" if is_dm else
-            "https://www.reddit.com/"      if is_rd else
-            "https://t.me/"                if is_tg else
-            None
-        )
-        if referer:
-            headers["Referer"] = referer
-
-        # ✅ Tối ưu extractor_args cho tất cả nền tảng - không cần cookies
-        extractor_args = {}
-        
-        # YouTube: Strategy - Cookies vs No-Cookies (Fixed)
-        if is_yt:
-            has_valid_cookie = _is_valid_netscape_cookie(COOKIE_FILE)
-            
-            if has_valid_cookie:
-                # ⚠️ TV Embedded + Cookies = HTTP 400
-                # → Dùng mweb (mobile web) - ít bị chặn và hỗ trợ cookies
-                extractor_args["youtube"] = {
-                    "player_client": ["mweb", "web"],
-                    "player_skip": ["android", "ios", "tv_embedded", "android_vr", "web_creator", "tv", "mediaconnect"]
-                }
-                self.log.emit(f"[{self.row}] 🍪 YouTube: Using cookies with mweb client.")
-            else:
-                # Không cookies: Dùng tv_embedded (bypass tốt, không cần PO Token)
-                extractor_args["youtube"] = {
-                    "player_client": ["tv_embedded", "android_vr", "mweb"],
-                    "player_skip": ["android", "ios", "web", "web_creator", "tv", "mediaconnect"]
-                }
-                self.log.emit(f"[{self.row}] ℹ️ YouTube: Using tv_embedded (no cookies).")
-        
-        # TikTok: không cần extractor_args đặc biệt, để yt-dlp tự động xử lý
-        if is_tt:
-            extractor_args["tiktok"] = {
-                "webpage_download": ["1"]
-            }
-        
-        # Facebook: bật HD
-        if is_fb:
-            extractor_args["facebook"] = {"hd": ["1"]}
-        
-        # Instagram: không cần extractor_args đặc biệt
-        # Telegram: không cần extractor_args đặc biệt
-        # Reddit: không cần extractor_args đặc biệt
-        # Dailymotion: không cần extractor_args đặc biệt
-
-        # ---- Chọn format ----
-        desired_fmt = self.fmt
-        if not have_ffmpeg and ("+" in desired_fmt) and not self.audio_only:
-            desired_fmt = "best[ext=mp4][height<=720]/best"
-        if self.audio_only:
-            desired_fmt = "bestaudio/best"
-        
-        # ✅ TikTok & Facebook: dùng format linh hoạt hơn
-        if is_tt or is_fb:
-            if not self.audio_only:
-                desired_fmt = "bv*+ba/b"  # Flexible best video + audio
-
-        # ---- Thư mục output + mẫu tên file ----
-        try:
-            self.out_dir.mkdir(parents=True, exist_ok=True)
-        except Exception:
-            pass
-
-        safe_base = None
-        if getattr(self, "filename_base", None):
-            safe_base = re.sub(r'[\\/:*?"<>|]+', "_", self.filename_base)
-
-        target_dir = self.out_dir
-        subdir_tpl = None
-        if self.per_folder:
-            subdir_tpl = safe_base if safe_base else "%(title).190B [%(id)s]"
-        if subdir_tpl:
-            target_dir = self.out_dir / subdir_tpl
-            try:
-                target_dir.mkdir(parents=True, exist_ok=True)
-            except Exception:
-                target_dir = self.out_dir
-
-        if safe_base:
-            outtmpl = str(target_dir / f"{safe_base}.%(ext)s")
-        else:
-            base_tpl = "%(title).190B [%(id)s]" if self.per_folder else "%(title)s"
-            outtmpl = str(target_dir / f"{base_tpl}.%(ext)s")
-
-        # ✅ TẮT HOÀN TOÀN tính năng impersonate vì gây lỗi trên một số máy
-        # Ngay cả khi có curl-cffi, yt-dlp có thể không tương thích
-        has_impersonate = False
-
-        # ---- yt-dlp options core ----
-        opts: dict[str, Any] = {
-            "outtmpl": outtmpl,
-            "format": desired_fmt,
-            "quiet": True,
-            "noprogress": True,
-            "ignoreerrors": True, # Tiếp tục tải nếu có 1 video trong danh sách bị lỗi
-
-            # Network / độ ổn định / Tối ưu né chặn
-            "retries": 15,
-            "fragment_retries": 15,
-            "concurrent_fragment_downloads": 2 if is_yt else 5, 
-            "socket_timeout": 30, # Chờ lâu hơn một chút để tránh rớt mạng
-            "file_access_retries": 5,
-
-            "geo_bypass": True,
-            "geo_bypass_country": "US",
-            "http_headers": headers,
-            "extractor_args": extractor_args,
-            # ✅ TẮT impersonate vì gây lỗi 100% trên một số máy
-            # "impersonate": "chrome" if (has_impersonate and (is_yt or is_tt)) else None,
-            "windowsfilenames": True,
-            "trim_file_name": 180,
-            "format_sort": ["res:2160,1440,1080,720,480,360", "fps", "hdr:12", "codec:avc1,h264,vp9,av01"],
-            "format_sort_force": True,
-            "prefer_ffmpeg": True,
-
-            "progress_hooks": [self._hook],
-        }
-
-        # ✅ Cookie handling: Chỉ dùng nếu file hợp lệ (Netscape format)
-        # YouTube: cookies.txt file (for SABR, nsig, age-restricted videos)
-        if is_yt and _is_valid_netscape_cookie(COOKIE_FILE):
-            try:
-                opts["cookiefile"] = str(COOKIE_FILE)
-            except Exception:
-                pass
-        
-        # Instagram: instagram_cookies.txt file (for login required & rate-limit)
-        if is_ig and _is_valid_netscape_cookie(INSTAGRAM_COOKIE_FILE):
-            try:
-                opts["cookiefile"] = str(INSTAGRAM_COOKIE_FILE)
-                self.log.emit(f"[{self.row}] 🍪 Instagram: Using validated cookies.")
-            except Exception:
-                pass
-        elif is_ig and INSTAGRAM_COOKIE_FILE.exists():
-            self.log.emit(f"[{self.row}] ⚠️ Instagram: cookies invalid format, ignoring.")
-
-        # ---- FFmpeg & postprocessors ----
-        if have_ffmpeg:
-            if self.audio_only:
-                opts.setdefault("postprocessors", []).append({
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "0",
-                })
-            else:
-                opts["merge_output_format"] = "mp4"
-                opts["ffmpeg_location"] = ffmpeg_path
-
-                # Remux nhanh
-                opts.setdefault("postprocessors", []).append({
-                    "key": "FFmpegVideoRemuxer",
-                    "preferedformat": "mp4",
-                })
-
-                # Convert có điều kiện:
-                if self.convert_av1:
-                    # Ép H.264 + AAC (bắt buộc khi cắt video)
-                    opts.setdefault("postprocessors", []).append({
-                        "key": "FFmpegVideoConvertor",
-                        "preferedformat": "mp4",
-                    })
-                    opts.setdefault("postprocessor_args", []).extend([
-                        "-c:v", "libx264",
-                        "-pix_fmt", "yuv420p",
-                        "-c:a", "aac",
-                        "-b:a", "192k",
-                        "-ar", "48000",
-                        "-movflags", "+faststart",
-                    ])
-                else:
-                    # Copy video stream; chỉ ép audio → AAC để tương thích MP4
-                    opts.setdefault("postprocessors", []).append({
-                        "key": "FFmpegVideoConvertor",
-                        "preferedformat": "mp4",
-                    })
-                    opts.setdefault("postprocessor_args", []).extend([
-                        "-c:v", "copy",
-                        "-c:a", "aac",
-                        "-b:a", "192k",
-                        "-ar", "48000",
-                        "-movflags", "+faststart",
-                    ])
-
-        # ---- Thumbnail + folder riêng (nếu bật) ----
-        if self.per_folder and not self.audio_only:
-            opts["writethumbnail"] = True
-            if have_ffmpeg:
-                opts.setdefault("postprocessors", []).append({
-                    "key": "FFmpegThumbnailsConvertor",
-                    "format": "jpg",
-                })
-
-        return opts
-
-
-    def _hook(self, d):
-        # Chặn khi người dùng Pause
-        while not self._pause_evt.is_set() and not self._stop_flag:
-            if not self._was_paused:
-                # cập nhật trạng thái một lần khi vừa vào pause
-                self.status.emit(self.row, "Paused")
-                self._was_paused = True
-            time.sleep(0.2)
-        if self._was_paused and self._pause_evt.is_set() and not self._stop_flag:
-            # vừa resume
-            self._was_paused = False
-            self.status.emit(self.row, "Downloading")
-
-        # Nếu user bấm Stop → hủy ngay
-        if self._stop_flag:
-            raise KeyboardInterrupt("UserCanceled")
-
-        st = d.get("status")
-        st = d.get("status")
-        if st == "downloading":
-            total = d.get("total_bytes") or d.get("total_bytes_estimate")
-            downloaded = d.get("downloaded_bytes", 0)
-            if total:
-                pct = int(downloaded * 100 / max(1, total))
-                if pct != getattr(self, '_last_pct', -1):
-                    self.progress.emit(self.row, max(0, min(100, pct)))
-                    self._last_pct = pct
-            else:
-                if not hasattr(self, '_sent_indeterminate'):
-                    self.progress.emit(self.row, -1)
-                    self._sent_indeterminate = True
-            if not hasattr(self, '_sent_downloading'):
-                self.status.emit(self.row, "Downloading")
-                self._sent_downloading = True
-        elif st == "finished":
-            if not hasattr(self, '_sent_merging'):
-                self.status.emit(self.row, "Merging")
-                self._sent_merging = True
-
-    def run(self):
-        self.status.emit(self.row, "Starting")
-        self.progress.emit(self.row, -1)
-        self.log.emit(f"[{self.row}] Start download: {self.url}")
-
-        def _is_canceled(ex: Exception) -> bool:
-            return isinstance(ex, KeyboardInterrupt) or "UserCanceled" in repr(ex)
-
-        # Chuẩn bị opts + lấy trước metadata (để biết id cho việc xoá .part khi cần)
-        opts = self._ydl_opts()
-        video_id = ""
-        try:
-            with YoutubeDL({**opts, "skip_download": True}) as y_info:
-                info = y_info.extract_info(self.url, download=False)
-                video_id = (info or {}).get("id") or ""
-        except Exception:
-            pass
-
-        # --- Attempt 1: tải bình thường ---
-        try:
-            with YoutubeDL(opts) as ydl:
-                ydl.download([self.url])
-            self.progress.emit(self.row, 100)
-            self.status.emit(self.row, "Bong")
-            self.log.emit(f"[{self.row}] Done")
-            self.done.emit(self.row, True, "")
-            return
-        except Exception as e:
-            if _is_canceled(e):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] First attempt failed: {e!r}")
-
-            # ✅ Thông báo rõ ràng khi gặp lỗi phổ biến
-            msg = (repr(e) or "").lower()
-            try:
-                # Instagram: Login required / Rate-limit / Chrome permission
-                if "instagram" in self.url.lower():
-                    has_ig_cookie = INSTAGRAM_COOKIE_FILE.exists()
-                    if ("could not copy chrome cookie" in msg) or ("permission denied" in msg and "chrome" in msg):
-                        self.log.emit(f"[{self.row}] ⚠️ Instagram: Chrome cookie error → App sẽ thử instaloader/gallery-dl")
-                    elif ("login required" in msg or "login_required" in msg or "checkpoint_required" in msg or "rate" in msg):
-                        if not has_ig_cookie:
-                            self.log.emit(f"[{self.row}] ⚠️ Instagram: Login required → Click '🍪 Import Cookie' chọn Instagram và import cookies!")
-                        else:
-                            self.log.emit(f"[{self.row}] ⚠️ Instagram: Video có thể bị private hoặc cookies hết hạn")
-                    elif ("429" in msg):
-                        self.log.emit(f"[{self.row}] ⚠️ Instagram: Rate-limit (429) → Đợi vài phút hoặc import cookies mới")
-                
-                # YouTube: Members-only
-                if ("members-only" in msg or "member" in msg or "error 153" in msg or "player configuration error" in msg):
-                    self.status.emit(self.row, "Members-only")
-                    self.log.emit(f"[{self.row}] ⚠️ YouTube: Members-only → Import cookies từ tài khoản có membership")
-                
-                # YouTube: nsig/SABR/PO Token errors
-                if ("nsig extraction failed" in msg) or ("sabr streaming" in msg) or ("n challenge" in msg) or ("po token" in msg):
-                    self.log.emit(f"[{self.row}] ⚠️ YouTube: nsig/SABR/PO Token error → Giải pháp: 1) Import cookies (🍪) 2) Cài Node.js 3) pip install -U yt-dlp")
-                
-                # YouTube: 403 Forbidden
-                if "403" in msg and "forbidden" in msg:
-                    self.log.emit(f"[{self.row}] ⚠️ YouTube: 403 Forbidden → Giải pháp: 1) Import cookies (🍪) 2) pip install -U yt-dlp")
-                
-                # Impersonate error
-                if "Impersonate target" in msg:
-                    self.log.emit(f"[{self.row}] ⚠️ Lỗi giả lập trình duyệt. Đang tự động tắt để tải bình thường...")
-                    # Tắt impersonate cho các lần retry sau
-                    if "impersonate" in opts:
-                        opts["impersonate"] = None
-                    if "impersonate" in opts4:
-                        opts4["impersonate"] = None
-                
-                # Format not available
-                if ("only images are available" in msg) or ("format is not available" in msg):
-                    cookie_exists = COOKIE_FILE.exists()
-                    if not cookie_exists:
-                        self.log.emit(f"[{self.row}] ⚠️ Format not available → Click '🍪 Import Cookie' để mở khóa formats!")
-                    else:
-                        self.log.emit(f"[{self.row}] ⚠️ Format not available → Thử giảm quality (720p/480p) hoặc pip install -U yt-dlp")
-                
-                # FFmpeg missing
-                if ("ffmpeg" in msg or "ffprobe" in msg) and ("not found" in msg or "could not be found" in msg):
-                    self.log.emit(f"[{self.row}] ⚠️ FFmpeg not found → Download FFmpeg và thêm vào PATH: https://ffmpeg.org/download.html")
-                
-                # TikTok: Impersonation
-                if "tiktok" in self.url.lower() and ("impersonat" in msg or "not available" in msg):
-                    self.log.emit(f"[{self.row}] ⚠️ TikTok: Video not available → Thử: pip install 'yt-dlp[default]' hoặc pip install -U yt-dlp")
-            except Exception:
-                pass
-
-            # Nếu lỗi là 416 → dọn .part và thử lại fresh (tắt resume)
-            if _has_416(e):
-                try:
-                    _delete_part_files_by_id(self.out_dir, video_id)
-                except Exception:
-                    pass
-                try:
-                    fresh = dict(opts)
-                    fresh["continuedl"] = False
-                    fresh["http_chunk_size"] = 0
-                    fresh["concurrent_fragment_downloads"] = 1
-                    with YoutubeDL(fresh) as y0:
-                        y0.download([self.url])
-                    self.progress.emit(self.row, 100)
-                    self.status.emit(self.row, "Bong")
-                    self.log.emit(f"[{self.row}] Retry fresh after 416 → OK")
-                    self.done.emit(self.row, True, "")
-                    return
-                except Exception as e0:
-                    if _is_canceled(e0):
-                        self.status.emit(self.row, "Canceled")
-                        self.log.emit(f"[{self.row}] Canceled by user")
-                        self.done.emit(self.row, False, "Canceled")
-                        return
-                    self.log.emit(f"[{self.row}] Fresh retry after 416 failed: {e0!r}")
-
-        # --- Retry TikTok với format đơn giản ---
-        try:
-            from urllib.parse import urlparse
-            host = urlparse(self.url or "").netloc.lower()
-            is_tt = "tiktok.com" in host
-            if is_tt:
-                self.status.emit(self.row, "Retry(TikTok/simple)")
-                opts2 = self._ydl_opts()
-                # ✅ Dùng format đơn giản nhất
-                opts2["format"] = "best"
-                # ✅ Loại bỏ extractor_args phức tạp
-                opts2.pop("extractor_args", None)
-                # ✅ Thêm force generic để fallback
-                opts2["force_generic_extractor"] = False
-                with YoutubeDL(opts2) as y2:
-                    y2.download([self.url])
-                self.progress.emit(self.row, 100)
-                self.status.emit(self.row, "Bong")
-                self.log.emit(f"[{self.row}] Retry TikTok OK")
-                self.done.emit(self.row, True, "")
-                return
-        except Exception as e2:
-            if _is_canceled(e2):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(TikTok) failed: {e2!r}")
-
-        # --- Retry Facebook với format đơn giản ---
-        try:
-            from urllib.parse import urlparse
-            host = urlparse(self.url or "").netloc.lower()
-            is_fb = ("facebook.com" in host) or ("fb.watch" in host)
-            if is_fb:
-                self.status.emit(self.row, "Retry(Facebook/simple)")
-                opts_fb = self._ydl_opts()
-                opts_fb["format"] = "best"
-                # Loại bỏ HD requirement
-                if "extractor_args" in opts_fb and "facebook" in opts_fb["extractor_args"]:
-                    opts_fb["extractor_args"].pop("facebook", None)
-                with YoutubeDL(opts_fb) as yfb:
-                    yfb.download([self.url])
-                self.progress.emit(self.row, 100)
-                self.status.emit(self.row, "Bong")
-                self.log.emit(f"[{self.row}] Retry Facebook OK")
-                self.done.emit(self.row, True, "")
-                return
-        except Exception as efb:
-            if _is_canceled(efb):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(Facebook) failed: {efb!r}")
-
-        # --- Retry Reddit generic ---
-        try:
-            from urllib.parse import urlparse
-            host = urlparse(self.url or "").netloc.lower()
-            is_rd = ("reddit.com" in host) or ("v.redd.it" in host) or ("old.reddit.com" in host) or ("redd.it" in host)
-            if is_rd:
-                self.status.emit(self.row, "Retry(Reddit)")
-                opts3 = self._ydl_opts()
-                opts3["format"] = "bv*+ba/best"
-                hdrs = (opts3.get("http_headers") or {}).copy()
-                hdrs["Referer"] = "https://www.reddit.com/"
-                opts3["http_headers"] = hdrs
-                opts3["force_generic_extractor"] = True
-                with YoutubeDL(opts3) as y3:
-                    y3.download([self.url])
-                self.progress.emit(self.row, 100)
-                self.status.emit(self.row, "Bong")
-                self.log.emit(f"[{self.row}] Retry Reddit OK")
-                self.done.emit(self.row, True, "")
-                return
-        except Exception as e3:
-            if _is_canceled(e3):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Reddit retry failed: {e3!r}\n{traceback.format_exc()}")
-
-        # --- Retry Instagram với Instaloader ---
-        try:
-            from urllib.parse import urlparse
-            host = urlparse(self.url or "").netloc.lower()
-            is_ig = "instagram.com" in host
-            if is_ig:
-                self.status.emit(self.row, "Retry(Instagram/instaloader)")
-                self.log.emit(f"[{self.row}] Trying instaloader for Instagram...")
-                
-                # Parse Instagram URL to get shortcode
-                import re
-                shortcode_match = re.search(r'instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)', self.url)
-                if shortcode_match:
-                    shortcode = shortcode_match.group(1)
-                    
-                    # Use instaloader
-                    import subprocess
-                    instaloader_cmd = [
-                        sys.executable, "-m", "instaloader",
-                        "--no-captions", "--no-metadata-json",
-                        "--dirname-pattern", str(self.out_dir),
-                        "--filename-pattern", "{shortcode}",
-                        f"--post={shortcode}"
-                    ]
-                    
-                    # Add cookies if available
-                    if COOKIE_FILE.exists():
-                        instaloader_cmd.extend(["--cookies", str(COOKIE_FILE)])
-                    
-                    result = subprocess.run(
-                        instaloader_cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=300,
-                        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-                    )
-                    
-                    if result.returncode == 0:
-                        self.progress.emit(self.row, 100)
-                        self.status.emit(self.row, "Bong")
-                        self.log.emit(f"[{self.row}] Instagram download (instaloader) OK")
-                        self.done.emit(self.row, True, "")
-                        return
-                    else:
-                        self.log.emit(f"[{self.row}] Instaloader failed: {result.stderr}")
-                else:
-                    self.log.emit(f"[{self.row}] Could not extract shortcode from Instagram URL")
-        except Exception as e_insta:
-            if _is_canceled(e_insta):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(Instagram/instaloader) failed: {e_insta!r}")
-
-        # --- Retry Instagram với gallery-dl ---
-        try:
-            from urllib.parse import urlparse
-            host = urlparse(self.url or "").netloc.lower()
-            is_ig = "instagram.com" in host
-            if is_ig:
-                self.status.emit(self.row, "Retry(Instagram/gallery-dl)")
-                self.log.emit(f"[{self.row}] Trying gallery-dl for Instagram...")
-                
-                import subprocess
-                gallery_cmd = [
-                    sys.executable, "-m", "gallery_dl",
-                    "--dest", str(self.out_dir),
-                    "--filename", "{category}_{post_shortcode}.{extension}",
-                    self.url
-                ]
-                
-                # Add cookies if available
-                if COOKIE_FILE.exists():
-                    gallery_cmd.extend(["--cookies", str(COOKIE_FILE)])
-                
-                result = subprocess.run(
-                    gallery_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300,
-                    creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-                )
-                
-                if result.returncode == 0:
-                    self.progress.emit(self.row, 100)
-                    self.status.emit(self.row, "Bong")
-                    self.log.emit(f"[{self.row}] Instagram download (gallery-dl) OK")
-                    self.done.emit(self.row, True, "")
-                    return
-                else:
-                    self.log.emit(f"[{self.row}] gallery-dl failed: {result.stderr}")
-        except Exception as e_gallery:
-            if _is_canceled(e_gallery):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(Instagram/gallery-dl) failed: {e_gallery!r}")
-
-        # --- Retry YouTube với ios/android client (có cookies) ---
-        try:
-            from urllib.parse import urlparse
-            host = (urlparse(self.url or "").netloc or "").lower()
-            is_yt = ("youtube.com" in host) or ("youtu.be" in host)
-            if is_yt and COOKIE_FILE.exists():
-                # ✅ Có cookie: thử ios/android client (bypass nsig/SABR tốt hơn)
-                self.status.emit(self.row, "Retry(YouTube/ios+cookie)")
-                opts_ios = self._ydl_opts()
-                opts_ios["format"] = "best"
-                opts_ios["extractor_args"] = {
-                    "youtube": {
-                        "player_client": ["android", "ios"],
-                        "player_skip": ["web", "web_creator", "web_embedded", "tv", "tv_embedded", "mediaconnect"]
-                    }
-                }
-                with YoutubeDL(opts_ios) as yios:
-                    yios.download([self.url])
-                self.progress.emit(self.row, 100)
-                self.status.emit(self.row, "Bong")
-                self.log.emit(f"[{self.row}] Retry YouTube (ios+cookie) OK")
-                self.done.emit(self.row, True, "")
-                return
-        except Exception as e_ios:
-            if _is_canceled(e_ios):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(YouTube-ios) failed: {e_ios!r}")
-        
-        # --- Retry YouTube: format đơn giản (fallback cuối) ---
-        try:
-            from urllib.parse import urlparse
-            host = (urlparse(self.url or "").netloc or "").lower()
-            is_yt = ("youtube.com" in host) or ("youtu.be" in host)
-            if is_yt:
-                # ✅ Retry với format đơn giản (best)
-                self.status.emit(self.row, "Retry(YouTube/simple)")
-                opts_simple = self._ydl_opts()
-                opts_simple["format"] = "best"
-                with YoutubeDL(opts_simple) as ysimple:
-                    ysimple.download([self.url])
-                self.progress.emit(self.row, 100)
-                self.status.emit(self.row, "Bong")
-                self.log.emit(f"[{self.row}] Retry YouTube (simple) OK")
-                self.done.emit(self.row, True, "")
-                return
-        except Exception as e_simple:
-            if _is_canceled(e_simple):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Retry(YouTube-simple) failed: {e_simple!r}")
+    def kill(self):
+        """ProcessPool: giết process của job treo; WorkerPool: thread không kill được → stop."""
+        getattr(self.job, "kill", self.job.stop)()
 
-        # --- Retry cuối: ép recode h264/aac ---
-        try:
-            self.status.emit(self.row, "Retry(recode h264/aac)")
-            opts4 = self._ydl_opts()
-            # TẮT thumbnail ở nhánh retry để tránh lỗi convert
-            opts4.pop("writethumbnail", None)
-            # đảm bảo có convert
-            if "postprocessors" not in opts4:
-                opts4["postprocessors"] = []
-            opts4["postprocessors"].append({"key": "FFmpegVideoConvertor", "preferedformat": "mp4"})
-            opts4.setdefault("postprocessor_args", []).extend([
-                "-c:v", "libx264",
-                "-pix_fmt", "yuv420p",
-                "-c:a", "aac",
-                "-movflags", "+faststart"
-            ])
-            with YoutubeDL(opts4) as y4:
-                y4.download([self.url])
-            self.progress.emit(self.row, 100)
-            self.status.emit(self.row, "Bong")
-            self.log.emit(f"[{self.row}] Retry recode OK")
-            self.done.emit(self.row, True, "")
-            return
-        except Exception as e4:
-            if _is_canceled(e4):
-                self.status.emit(self.row, "Canceled")
-                self.log.emit(f"[{self.row}] Canceled by user")
-                self.done.emit(self.row, False, "Canceled")
-                return
-            self.log.emit(f"[{self.row}] Recode retry failed: {e4!r}\n{traceback.format_exc()}")
+    def start(self):
+        self.pool.submit(self.job)
 
-        # Hết cách
-        self.status.emit(self.row, "Error")
-        self.log.emit(f"[{self.row}] ERROR: cannot download after retries")
-        self.done.emit(self.row, False, "Cannot download after retries")
 
 # ------------------------ Themes (rút gọn cho ngắn) ------------------------
 DARK_QSS = """
@@ -1337,7 +182,7 @@ QWidget#Root { background-color: #0b1220; }
 QTabBar::tab { background: #0f172a; color: #e5e7eb; padding: 6px 12px; border: 1px solid rgba(255,255,255,0.08); border-bottom: 0; border-top-left-radius: 8px; border-top-right-radius: 8px; margin-right: 4px; }
 QTabBar::tab:selected { background: #111827; }
 QTabWidget::pane { border: 1px solid rgba(255,255,255,0.08); top: -1px; border-radius: 10px; }
-QTableWidget { background: rgba(17,24,39,210); color: #e5e7eb; border: 1px solid rgba(255,255,255,0.06); border-radius: 10px; gridline-color: rgba(255,255,255,0.06); }
+QTableView { background: rgba(17,24,39,210); color: #e5e7eb; border: 1px solid rgba(255,255,255,0.06); border-radius: 10px; gridline-color: rgba(255,255,255,0.06); }
 QHeaderView::section { background: rgba(30,41,59,230); color: #e5e7eb; padding: 8px; border: 0; border-right: 1px solid rgba(255,255,255,0.06); }
 QLineEdit, QLabel { color: #e5e7eb; }
 QLineEdit { background: #0f172a; border: 1px solid rgba(255,255,255,0.12); border-radius: 8px; padding: 6px 10px; }
@@ -1386,7 +231,7 @@ QWidget#Root { background-color: #f5f7fb; }
 QTabBar::tab { background: #ffffff; color: #111827; padding: 6px 12px; border: 1px solid #e5e7eb; border-bottom: 0; border-top-left-radius: 8px; border-top-right-radius: 8px; margin-right: 4px; }
 QTabBar::tab:selected { background: #f8fafc; }
 QTabWidget::pane { border: 1px solid #e5e7eb; top: -1px; border-radius: 10px; }
-QTableWidget { background: #ffffff; color: #111827; border: 1px solid #e5e7eb; border-radius: 10px; gridline-color: #e5e7eb; }
+QTableView { background: #ffffff; color: #111827; border: 1px solid #e5e7eb; border-radius: 10px; gridline-color: #e5e7eb; }
 QHeaderView::section { background: #f3f4f6; color: #111827; padding: 8px; border: 0; border-right: 1px solid #e5e7eb; }
 QLineEdit, QLabel { color: #111827; }
 QLineEdit { background: #ffffff; border: 1px solid #d1d5db; border-radius: 8px; padding: 6px 10px; }
@@ -1574,16 +419,28 @@ class LicenseDialog(QDialog):
             else:
                 QMessageBox.critical(self, "Save failed", str(e))
 class QtLogHandler(logging.Handler):
-    """Đẩy log vào hàm append_fn (ví dụ: self._append_log)."""
-    def __init__(self, append_fn):
+    """
+    Log cho tab Logs: emit() (ở thread bất kỳ) chỉ cất record vào ring buffer có giới hạn;
+    GUI gọi drain() mỗi nhịp để format + append 1 lần. Record dưới level của handler
+    bị logger loại ngay tại thread gọi, không vào buffer.
+    """
+    def __init__(self, max_lines: int = 5000):
         super().__init__()
-        self.append_fn = append_fn
+        self.records = deque(maxlen=max_lines)
     def emit(self, record):
-        try:
-            msg = self.format(record)
-            self.append_fn(msg)
-        except Exception:
-            pass
+        self.records.append(record)
+    def drain(self) -> List[str]:
+        out = []
+        while self.records:
+            try:
+                rec = self.records.popleft()
+            except IndexError:
+                break
+            try:
+                out.append(self.format(rec))
+            except Exception:
+                pass
+        return out
 
 class StreamToLogger(io.TextIOBase):
     """Chuyển mọi print/traceback sang logging."""
@@ -1608,6 +465,14 @@ class StreamToLogger(io.TextIOBase):
 
 # ------------------------ MainWindow ------------------------
 class MainWindow(QMainWindow):
+    titleResolved = Signal(int, int, str, object)  # (thế hệ bảng, job id, url, title|None) từ thread nền
+    expandPage = Signal(int, object, object)       # (thế hệ bảng, ctx, list URL video) — 1 trang playlist/kênh
+    expandDone = Signal(int, object, int)          # (thế hệ bảng, ctx, số video)
+    sheetChunk = Signal(int, object)               # (lượt nhập sheet, list SheetRow) — 1 khúc hàng
+    sheetDone = Signal(int, object)                # (lượt nhập sheet, lỗi|None)
+    licenseChecked = Signal(object)                # LicenseStatus — kiểm tra ở thread nền lúc mở app
+    warmed = Signal(str)                           # version yt-dlp khi đã nạp xong ở nền
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Mỹ Duyên"); self.resize(820, 600)
@@ -1617,69 +482,157 @@ class MainWindow(QMainWindow):
         self.max_retries = 3  # Số lần retry mặc định
         self.out_dir = APP_DIR / "Output"; self.out_dir.mkdir(parents=True, exist_ok=True)
 
-        self.pending_rows = queue.Queue()
-        self.active = {}        # row -> worker
-        self.active_rows = set()
-        self.row_retries = {}   # row -> số lần đã retry
+        self.active = {}        # job id -> worker
+        self.pool: WorkerPool | ProcessPool | None = None   # tạo ở _ensure_pool theo worker_mode
+        self._pool_mode = ""
+        self.active_ids = set()  # job id đang tải (viền glow)
         self.max_workers = 5  # Giảm từ 10 xuống 5 để giảm lag UI
+        # Lấy title nền cho link lẻ: hàng hiện ngay, title điền sau
+        self.titles = TitlePrefetcher(max_workers=8, per_host=4)
+        self._title_gen = 0
+        self.titleResolved.connect(self._on_title_resolved)
         self.is_running = False
 
         self.settings = QSettings(str(APP_DIR / "ui_prefs.ini"), QSettings.IniFormat)
+        # Expand playlist/kênh nền theo trang, nhiều playlist song song (giới hạn expand_workers):
+        # hàng (và job khi đang chạy) vào bảng trước khi lấy hết kênh
+        self.expander = PlaylistExpander(max_workers=max(1, int(self.settings.value("expand_workers", 6))))
+        self._expand_gen = 0
+        self._expand_stats = [0, 0, 0]  # [playlist đã gửi, playlist xong, video mới thêm] của đợt hiện tại
+        self.expandPage.connect(self._on_expand_page)
+        self.expandDone.connect(self._on_expand_done)
+        # Nhập Google Sheet nền: lượt mới / Clear tăng _sheet_gen → lượt cũ dừng ở khúc kế tiếp
+        self._sheet_gen = 0
+        self._sheet_parser = SheetParser()
+        self._sheet_jobs: dict[tuple, int] = {}
+        self._sheet_stats = [0, 0]
+        self._sheet_key = ""
+        self._sheet_quiet = False
+        self._sheet_delta = False
+        self._sheet_busy = False
+        self._sheet_polls = 0
+        self.sheetChunk.connect(self._on_sheet_chunk)
+        self.sheetDone.connect(self._on_sheet_done)
         self.theme = self.settings.value("theme", "dark")
-        self.row_filename = {}
-        self.row_meta = {}  
-        self.row_url = {}  
+        self.max_log_lines = max(100, int(self.settings.value("log_max_lines", 5000)))
+        self.archive_mode = str(self.settings.value("archive_mode", "link"))
+        # Tổng băng thông cho mọi job (chia động giữa các job đang tải), lịch theo giờ nếu có
+        # (cấu hình trước _build_ui để ô băng thông hiện đúng; lỗi ghi log sau _setup_logging)
+        config_error = None
+        try:
+            BANDWIDTH.configure(parse_rate(self.settings.value("bandwidth_limit", "")),
+                                parse_schedule(self.settings.value("bandwidth_schedule", "")))
+        except ValueError as e:
+            config_error = e
+        # Hàng đợi / retry / nhóm preventive: dùng chung engine với chế độ headless;
+        # giới hạn theo nền tảng giãn theo số Threads, "platform_limits" (vd 'yt=12/6; ig=2') ghi đè
+        try:
+            platform_limits = parse_platform_limits(self.settings.value("platform_limits", ""))
+        except ValueError as e:
+            platform_limits, config_error = None, e
+        self.sched = Scheduler(max_workers=self.max_workers, max_retries=self.max_retries,
+                               budget=HostBudget(platform_limits, max_workers=self.max_workers))
+        # Trạng thái từng hàng nằm trong model (Job có id ổn định), không trong ô của bảng
+        self.jobs = JobTableModel(self, key_fn=identity_key)
+        # ✅ Nhật ký job trên đĩa: crash/đóng app → mở lại là có lại hàng đợi (xem _restore_journal)
+        self.journal = JobJournal(USER_DATA_DIR / "journal.sqlite3")
+        # Sheet đã nhập: watermark + hash từng hàng → Sync chỉ lấy hàng mới/đổi
+        self.sheet_state = SheetSyncState(USER_DATA_DIR / "sheet_sync.sqlite3")
+        # Ghi kết quả về sheet nguồn (tuỳ chọn, cần quyền ghi): gom theo timer → vài batchUpdate mỗi lượt
+        self.writeback = SheetWriteBack(
+            lambda: gs_service(str(self.settings.value("sheet_credentials", "") or ""), write=True),
+            column=str(self.settings.value("sheet_writeback_column", "G")))
+        self._writeback_busy = False
+        self.jobs.journal = self.journal
         self.is_paused = False
-        # ✅ Throttle progress updates để tăng performance
-        self._progress_cache = {}  # row -> (last_percent, last_update_time)
-        self._progress_throttle_ms = 1000  # Tăng để giảm lag hơn
+        # ✅ Worker ghi progress/status/log vào kênh chung; GUI gom lại vẽ 10 lần/giây
+        self.events = JobEvents()
+        self._event_timer = QTimer(self)
+        self._event_timer.setInterval(100)
+        self._event_timer.timeout.connect(self._drain_events)
+        self._event_timer.start()
+        # Lấp slot khi nền tảng có token lại (xem Scheduler.wake_in)
+        self._wake_timer = QTimer(self); self._wake_timer.setSingleShot(True)
+        self._wake_timer.timeout.connect(self._fill_slots)
         self._build_ui()
         self._setup_logging()
+        if config_error is not None:
+            self.logger.warning(f"⚠️ Bỏ qua cấu hình không hợp lệ: {config_error}")
         self.concurrency = self.spin_threads.value()
         self._apply_background()
         self.apply_theme(self.theme)
+        self._restore_journal()
+
+        # --- Kiểm tra license khi khởi động: verify RSA ở thread nền, cửa sổ hiện ngay ---
+        # (chưa xong thì chưa cho Start — xem start_all)
+        self._licensed = False
+        self._startup_pending = {"license", "yt-dlp"}
+        self.licenseChecked.connect(self._on_license_checked)
+        self.warmed.connect(self._on_warmed)
+        def _check(t=time.perf_counter()):
+            st = license_check.check_license()
+            STARTUP.mark("license (nền)", since=t)
+            self.licenseChecked.emit(st)
+        threading.Thread(target=_check, name="license-check", daemon=True).start()
+        STARTUP.mark("window")
+
+    def after_show(self):
+        """Gọi 1 nhịp sau show(): log mốc khởi động, nạp trước yt-dlp (và thư viện Google nếu có sync định kỳ)."""
+        STARTUP.mark("shown")
+        self.logger.info(STARTUP.line())
+        sync_on = self.spin_sheet_poll.value() > 0
+        def _warm(t=time.perf_counter()):
+            try:
+                ver = download_core.prewarm()
+            except Exception:
+                ver = "unknown"
+            STARTUP.mark("yt-dlp (nền)", since=t)
+            if sync_on:
+                try:
+                    gsheet.prewarm()
+                except Exception:
+                    pass
+            self.warmed.emit(ver)
+        threading.Thread(target=_warm, name="prewarm", daemon=True).start()
+
+    def _startup_done(self, what: str):
+        self._startup_pending.discard(what)
+        if not self._startup_pending:
+            self.logger.info(STARTUP.line())
 
+    def _on_warmed(self, ver: str):
         # ✅ NHẮC CẬP NHẬT yt-dlp (hữu ích khi dính nsig/SABR)
+        self.logger.info(f"yt-dlp version: {ver}")
         try:
-            import yt_dlp
-            # ✅ Fix: yt-dlp lưu version ở yt_dlp.version.__version__
-            try:
-                from yt_dlp import version as yt_ver
-                ver = yt_ver.__version__
-            except Exception:
-                ver = getattr(yt_dlp, "__version__", "unknown")
-            
-            self.logger.info(f"yt-dlp version: {ver}")
-            
-            try:
-                from packaging.version import Version
-                if ver != "unknown" and "nightly" not in ver and Version(ver) < Version("2024.12.1"):
-                    self._toast("Khuyên cập nhật yt-dlp: pip install -U yt-dlp", 3500)
-            except Exception:
-                # packaging có thể chưa có → bỏ qua yên lặng
-                pass
+            from packaging.version import Version
+            if ver != "unknown" and "nightly" not in ver and Version(ver) < Version("2024.12.1"):
+                self._toast("Khuyên cập nhật yt-dlp: pip install -U yt-dlp", 3500)
         except Exception:
+            # packaging có thể chưa có → bỏ qua yên lặng
             pass
+        self._startup_done("yt-dlp")
 
-        # --- Kiểm tra license khi khởi động ---
-        from license_check import check_license, APP_LICENSE_FILE
-        st = check_license()
+    def _on_license_checked(self, st):
         if not st.ok:
             # Cho phép người dùng dán token và lưu, sau đó kiểm tra lại 1 lần
             dlg = LicenseDialog(st.reason, self)
             if dlg.exec() != QDialog.Accepted:
                 self._show_message(QMessageBox.Critical, "License", "Ứng dụng cần license để chạy.")
-                sys.exit(1)
-            st2 = check_license()
+                QApplication.exit(1)  # đang trong event loop → thoát app.exec() với mã 1
+                return
+            st2 = license_check.check_license()
             if not st2.ok:
                 self._show_message(QMessageBox.Critical, "License", f"Token không hợp lệ:\n{st2.reason}")
-                sys.exit(1)
+                QApplication.exit(1)
+                return
 
         # Bạn có thể hiển thị chủ sở hữu & hạn dùng ở tiêu đề hoặc About
         try:
             self.setWindowTitle(f"Mỹ Duyên — Licensed to {st.owner} (exp {st.exp})")
         except Exception:
             pass
+        self._licensed = True
+        self._startup_done("license")
 
     # ===== Pause / Resume / Stop =====
     def pause_all(self):
@@ -1694,31 +647,33 @@ class MainWindow(QMainWindow):
         self._toast("Paused all", 1500)
     def remove_success(self):
         """Xoá tất cả hàng có trạng thái 'Bong' (đã tải xong)."""
-        removed = 0
-        for r in range(self.tbl.rowCount() - 1, -1, -1):
-            if r in self.active:
-                continue
-            st = self.tbl.item(r, 4).text() if self.tbl.item(r, 4) else ""
-            if st == "Bong":
-                self.tbl.removeRow(r)
-                self.active_rows.discard(r)
-                removed += 1
+        removed = self.jobs.remove_ids(
+            [j.id for j in self.jobs if j.status == "Bong" and j.id not in self.active])
         if removed:
-            self._reindex_after_row_change()
+            self._renumber()
+            self._update_stats()
             self._toast(f"Đã xoá {removed} hàng thành công.", 2200)
         else:
             self._toast("Không có hàng 'Bong' để xoá.", 1800)
 
+    def _selected_ids(self) -> List[int]:
+        rows = sorted({idx.row() for idx in self.tbl.selectionModel().selectedRows()})
+        return [self.jobs.job_at(r).id for r in rows]
+
     def remove_selected(self):
-        rows = sorted({idx.row() for idx in self.tbl.selectedIndexes()}, reverse=True)
-        if not rows: return
-        for r in rows:
-            if r in self.active: 
-                continue
-            self.tbl.removeRow(r)
-            self.active_rows.discard(r)
-        self._reindex_after_row_change()
+        ids = [j for j in self._selected_ids() if j not in self.active]
+        if not ids: return
+        self.sched.cancel(ids)
+        self.jobs.remove_ids(ids)
         self._renumber()
+        self._update_stats()
+
+    def pin_selected(self, pinned: bool = True):
+        """Ghim hàng chọn lên đầu hàng đợi (hoặc bỏ ghim) — đổi chỗ ngay cả khi đang chạy."""
+        ids = self._selected_ids()
+        if not ids: return
+        self.sched.pin(ids, pinned)
+        self._toast(f"{'Pinned' if pinned else 'Unpinned'} {len(ids)} row(s).", 1500)
 
     def resume_all(self):
         """Tiếp tục các job đang chạy và cho phép khởi động job mới từ hàng đợi."""
@@ -1729,13 +684,12 @@ class MainWindow(QMainWindow):
             try: w.resume()
             except Exception: pass
         # Lấp chỗ trống tiếp
-        for _ in range(max(1, self.max_workers - len(self.active))):
-            self._start_next()
+        self._fill_slots()
         self._toast("Resumed", 1500)
 
     def stop_selected(self):
         """Hủy các hàng đang được chọn: nếu đang chạy → stop; nếu đang đợi → xóa khỏi hàng đợi."""
-        rows = sorted({idx.row() for idx in self.tbl.selectedIndexes()})
+        rows = self._selected_ids()
         if not rows: 
             return
         # 1) Hủy các worker đang chạy
@@ -1748,8 +702,8 @@ class MainWindow(QMainWindow):
                     pass
                 continue
 
-        # 2) Loại khỏi hàng đợi
-        self._requeue_excluding(set(rows))
+        # 2) Loại khỏi hàng đợi (job đang chạy sẽ không bị auto-retry)
+        self.sched.cancel(rows)
 
         # 3) Cập nhật trạng thái hiển thị
         for r in rows:
@@ -1760,31 +714,31 @@ class MainWindow(QMainWindow):
         self._update_stats()
         # Nếu còn slot trống và không pause → tiếp tục
         if self.is_running and not self.is_paused:
-            for _ in range(max(1, self.max_workers - len(self.active))):
-                self._start_next()
+            self._fill_slots()
+
+    def kill_selected(self):
+        """Giết job đang chạy bị treo (chế độ process); chế độ thread thì tương đương Stop."""
+        rows = [r for r in self._selected_ids() if r in self.active]
+        if not rows:
+            return
+        self.sched.cancel(rows)
+        for r in rows:
+            try:
+                self.active[r].kill()
+            except Exception:
+                pass
+        self._toast(f"Killed {len(rows)} job(s).", 1500)
 
     def stop_all(self):
         """Hủy toàn bộ tải hiện tại và xóa sạch hàng đợi."""
         for r, w in list(self.active.items()):
             try: w.stop()
             except Exception: pass
-        self._requeue_excluding(set(range(self.tbl.rowCount())))
+        self.sched.cancel_all()
         self.is_running = False
         self.btn_start.setEnabled(True)
         self._toast("Stopped all", 1500)
 
-    def _requeue_excluding(self, banned_rows: set[int]):
-        """Tạo lại hàng đợi, bỏ các row trong banned_rows."""
-        try:
-            new_q = queue.Queue()
-            while True:
-                r = self.pending_rows.get_nowait()
-                if r not in banned_rows:
-                    new_q.put(r)
-        except queue.Empty:
-            pass
-        self.pending_rows = new_q
-
     def _toast(self, text: str, ms: int = 2500):
         try:
             QToolTip.showText(
@@ -1903,40 +857,33 @@ class MainWindow(QMainWindow):
     def retry_failed(self):
         """Retry all downloads with 'Error' status and start downloading immediately."""
         # Đếm số lượng downloads bị lỗi
-        retry_count = 0
-        for r in range(self.tbl.rowCount()):
-            st_item = self.tbl.item(r, 4)  # Status column
-            if st_item and st_item.text() == "Error":
-                retry_count += 1
+        failed = [j.id for j in self.jobs if j.status == "Error"]
+        retry_count = len(failed)
         
         if retry_count == 0:
             self._toast("No failed downloads to retry.", 2000)
             return
+        # bấm Retry = muốn kiểm tra lại cả link từng báo private/removed (dấu cache 12 h)
+        forget_unavailable(self.jobs.job(r).url for r in failed)
         
         # Nếu chưa chạy, khởi tạo và bắt đầu tải xuống ngay
         if not self.is_running:
             # Reset các downloads bị lỗi
-            for r in range(self.tbl.rowCount()):
-                st_item = self.tbl.item(r, 4)  # Status column
-                if st_item and st_item.text() == "Error":
-                    self._set_status(r, "Pending")
-                    self._set_progress(r, -1)
-                    self.row_retries.pop(r, None)  # Reset retry count
+            for r in failed:
+                self._set_status(r, "Pending")
+                self._set_progress(r, -1)
             
             # Tự động bắt đầu tải xuống
             self._toast(f"Retrying {retry_count} failed download(s)...", 3000)
             self.logger.info(f"Retry failed: starting {retry_count} downloads")
-            self.start_download()  # Bắt đầu tải xuống ngay
+            self.start_all()  # Bắt đầu tải xuống ngay
         else:
             # Nếu đang chạy, thêm các row error vào queue ngay
-            for r in range(self.tbl.rowCount()):
-                st_item = self.tbl.item(r, 4)  # Status column
-                if st_item and st_item.text() == "Error":
-                    # Reset status, retry count và thêm vào queue
-                    self._set_status(r, "Queued")
-                    self._set_progress(r, -1)
-                    self.row_retries.pop(r, None)  # Reset retry count
-                    self.pending_rows.put(r)
+            for r in failed:
+                # Reset status, retry count và thêm vào queue
+                self._set_status(r, "Queued")
+                self._set_progress(r, -1)
+                self.sched.requeue(r)
             
             # Cập nhật stats và bắt đầu download ngay các row retry
             self._update_stats()
@@ -2014,49 +961,43 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self._show_message(QMessageBox.Warning, "Open Guide", f"Cannot open guide:\n{e}")
     def _add_row(self, url, quality, filename_base=None, stt_text=None, from_collection=False):
-        r = self.tbl.rowCount()
-        self.tbl.insertRow(r)
-
-        # Cột 0: checkbox Sel
-        sel_item = QTableWidgetItem()
-        sel_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable | Qt.ItemIsSelectable)
-        sel_item.setCheckState(Qt.Checked)  # mặc định chọn để tải
-        self.tbl.setItem(r, 0, sel_item)
-
-        # Cột 1..5 như mô tả
-        stt_val = stt_text if stt_text else str(r + 1)
-        self.tbl.setItem(r, 1, QTableWidgetItem(stt_val))
-        self.tbl.setItem(r, 2, QTableWidgetItem(url))
-        self.tbl.setItem(r, 3, QTableWidgetItem(quality))
-        self.tbl.setItem(r, 4, QTableWidgetItem("Pending"))
-        # ✅ Dùng QLabel thay QProgressBar để tăng performance (không có animation)
-        lbl = QLabel("—"); lbl.setAlignment(Qt.AlignCenter); lbl.setFixedHeight(16)
-        self.tbl.setCellWidget(r, 5, lbl)
-
-        self.row_filename[r] = filename_base
-        self.row_url[r] = url
-
-        # phân loại main/preventive/sound theo STT
-        stt_lower = (stt_val or "").lower()
-        kind = "main"
-        if stt_lower.endswith("_preventive"):
-            kind = "preventive"
-        elif stt_lower.endswith("_sound"):
-            kind = "sound"
-
-        group = stt_lower
-        for suf in ("_preventive", "_sound"):
-            if group.endswith(suf):
-                group = group[: -len(suf)]
-        # Lưu metadata
-        self.row_meta[r] = {
-            "group": group, 
-            "kind": kind, 
-            "from_collection": bool(from_collection),
-            "url": url
-        }
-
+        """Thêm 1 hàng; trả về job id. Thêm nhiều hàng thì dùng _new_job + _append_jobs (1 lần báo view)."""
+        job = self._new_job(url, quality, filename_base, stt_text, from_collection)
+        self._append_jobs([job])
+        return job.id
+
+    def _new_job(self, url, quality, filename_base=None, stt_text=None, from_collection=False):
+        # STT trống → số thứ tự; kind main/preventive/sound + group tính từ STT (job_table.classify_stt)
+        return self.jobs.new_job(url, quality, stt_text or "", filename_base, from_collection)
+
+    def _append_jobs(self, jobs):
+        """Thêm lô job: bỏ link trùng (mọi cách viết, xem identity_key), đối chiếu kho đã tải, rồi append 1 lần."""
+        jobs = self.jobs.dedupe(jobs)
+        self._apply_archive(jobs)
+        self.jobs.append(jobs)
         self._update_stats()
+        return jobs
+
+    def _apply_archive(self, jobs):
+        """
+        Job mà media đã tải ở phiên trước (ARCHIVE, tra theo platform+id, không extract):
+        archive_mode "link" (mặc định) → hard-link vào thư mục Output, đánh dấu Bong;
+        "skip" → chỉ bỏ qua; "off" → tải lại như thường.
+        """
+        if self.archive_mode == "off" or not jobs:
+            return
+        found = find_archived(j.url for j in jobs)
+        for job in jobs:
+            entry = found.get(job.url)
+            if entry is None:
+                continue
+            path = None
+            if self.archive_mode == "link":
+                path = reuse_archived(entry, self.out_dir, safe_filename(job.filename) if job.filename else None)
+            job.checked = False
+            job.status, job.progress = ("Bong", 100) if path else ("Skipped (archived)", 0)
+            job.error = (f"Đã tải {time.strftime('%Y-%m-%d', time.localtime(entry.downloaded))}: "
+                         f"{path or entry.path}")
 
     def _import_gsheet(self):
         # Hỏi URL Google Sheet bằng dialog riêng có áp dụng theme
@@ -2081,123 +1022,155 @@ class MainWindow(QMainWindow):
                 return
             cred_path = path
 
-        try:
-            self._set_status_all("Reading Sheet…")
-            values = gs_get_values_from_url(sheet_url.strip(), cred_path)
-        except Exception as e:
-            self._show_message(QMessageBox.Critical, "Google Sheet", f"Lỗi đọc sheet:\n{e}")
-            return
+        # nhớ sheet cho nút Sync / sync định kỳ
+        self.settings.setValue("sheet_url", sheet_url)
+        self.settings.setValue("sheet_credentials", cred_path)
+        self._read_sheet(sheet_url, cred_path, start_row=2, changed_only=False, quiet=False)
+        self._toast("Đang đọc Google Sheet…", 2000)
 
-        if not values or len(values) < 2:
-            self._show_message(QMessageBox.Information, "Google Sheet", "Không có dữ liệu (cần >= 2 hàng).")
+    def _read_sheet(self, sheet_url: str, cred_path: str, start_row: int | None, changed_only: bool, quiet: bool):
+        """
+        Đọc sheet ở nền theo từng khúc; mỗi khúc vào bảng (và hàng đợi nếu đang chạy) ngay khi về.
+        Trạng thái sync (watermark + hash từng hàng) cập nhật mỗi lượt — xem gsheet.gs_sync_sheet_rows.
+        """
+        self._sheet_gen += 1
+        gen = self._sheet_gen
+        key = sheet_key(sheet_url)
+        if not changed_only or key != self._sheet_key:
+            # nhập lại cả sheet / sheet khác → gom STT lại từ đầu
+            self._sheet_parser = SheetParser()
+            self._sheet_jobs = {}   # key của SheetEntry -> job id (đổi STT khi khúc sau ghép thêm)
+        self._sheet_key = key
+        self._sheet_stats = [0, 0]  # [video đã thêm, playlist/kênh đang expand]
+        self._sheet_quiet = quiet
+        self._sheet_delta = changed_only
+        self._sheet_busy = True
+        cancelled = lambda: gen != self._sheet_gen
+        def _read():
+            try:
+                for rows in gs_sync_sheet_rows(sheet_url, cred_path, self.sheet_state, start_row=start_row,
+                                               changed_only=changed_only, cancelled=cancelled):
+                    self.sheetChunk.emit(gen, rows)
+                self.sheetDone.emit(gen, None)
+            except Exception as e:
+                self.sheetDone.emit(gen, e)
+        threading.Thread(target=_read, name="gsheet-import", daemon=True).start()
+
+    def sync_gsheet(self, full: bool = True):
+        """
+        Chỉ nhập hàng mới/đổi của sheet đã nhập gần nhất. full → quét lại 2 cột cả sheet (so hash),
+        không thì chỉ đọc phần đuôi từ watermark (sync định kỳ; cứ SHEET_FULL_EVERY lượt quét full 1 lần).
+        """
+        sheet_url = str(self.settings.value("sheet_url", "") or "")
+        cred_path = str(self.settings.value("sheet_credentials", "") or "")
+        if not sheet_url or not cred_path:
+            if full:
+                self._toast("Chưa nhập Google Sheet nào — bấm Sheet trước.", 2500)
             return
+        if self._sheet_busy:
+            return  # lượt trước chưa xong
+        self._sheet_polls = 0 if full else self._sheet_polls + 1
+        if self._sheet_polls >= self.SHEET_FULL_EVERY:
+            full, self._sheet_polls = True, 0
+        self._read_sheet(sheet_url, cred_path, start_row=2 if full else None, changed_only=True, quiet=not full)
+
+    SHEET_FULL_EVERY = 6
+
+    def _set_sheet_poll(self, minutes: int):
+        self.settings.setValue("sheet_poll_minutes", minutes)
+        if minutes > 0:
+            self._sheet_timer.start(minutes * 60 * 1000)
+        else:
+            self._sheet_timer.stop()
 
-        # ✅ Map URL -> dict với stt_list
-        url_stt_map: dict[str, dict] = {}
-        last_stt = ""
-
-        # Giả định: Cột F = STT (index 5), Cột C = link video (index 2)
-        for i in range(1, len(values)):
-            row = values[i]
-            stt = (row[5].strip() if len(row) > 5 and row[5] else "")  # F
-            link_cell = (row[2] if len(row) > 2 else "")               # C
-
-            if stt:
-                last_stt = stt
-            else:
-                stt = last_stt
-
-            reg, prev, snd = parse_cell_content(link_cell)
-
-            for u in reg:
-                if is_valid_video_url(u):
-                    # ✅ Sanitize URL để loại bỏ tham số thời gian
-                    u = _sanitize_yt_watch_url(u)
-                    if u not in url_stt_map:
-                        url_stt_map[u] = {"url": u, "stt_list": [], "kind": "main"}
-                    if stt and stt not in url_stt_map[u]["stt_list"]:
-                        url_stt_map[u]["stt_list"].append(stt)
-
-            for u in prev:
-                if is_valid_video_url(u):
-                    # ✅ Sanitize URL để loại bỏ tham số thời gian
-                    u = _sanitize_yt_watch_url(u)
-                    key = u + "_Preventive"
-                    if key not in url_stt_map:
-                        url_stt_map[key] = {"url": u, "stt_list": [], "kind": "preventive"}
-                    if stt and stt not in url_stt_map[key]["stt_list"]:
-                        url_stt_map[key]["stt_list"].append(stt)
-
-            for u in snd:
-                if is_valid_video_url(u):
-                    # ✅ Sanitize URL để loại bỏ tham số thời gian
-                    u = _sanitize_yt_watch_url(u)
-                    key = u + "_Sound"
-                    if key not in url_stt_map:
-                        url_stt_map[key] = {"url": u, "stt_list": [], "kind": "sound"}
-                    if stt and stt not in url_stt_map[key]["stt_list"]:
-                        url_stt_map[key]["stt_list"].append(stt)
-
-        # Đẩy vào bảng: mỗi URL = 1 hàng riêng
-        added = 0
+    def _on_sheet_chunk(self, gen: int, rows):
+        if gen != self._sheet_gen:
+            return  # bảng đã Clear / đã nhập sheet khác
         qual = self.cbo_quality.currentText()
-        for key, data in url_stt_map.items():
-            url = data.get("url", "")
-            stt_list = data.get("stt_list", [])
-            kind = data.get("kind", "main")
-
-            if not is_valid_video_url(url):
+        batch = []
+        for e in self._sheet_parser.feed(rows):
+            if not e.new:
+                # link lặp ở hàng sau → STT ghép thêm; chỉ đổi khi job chưa chạy
+                jid = self._sheet_jobs.get(e.key)
+                job = self.jobs.job(jid) if jid is not None else None
+                if job is not None:
+                    self.jobs.set_source(jid, (self._sheet_key, e.rows))
+                    if jid not in self.active and not is_finished(job.status):
+                        self.jobs.set_title(jid, e.stt)
                 continue
-
-            # STT hiển thị & tên file: lấy đúng từ cột F, ghép hậu tố lowercase nếu có
-            base_id = "_".join([s for s in stt_list if s]) if stt_list else f"{added + 1}"
-            stt_display = base_id
-            if kind == "preventive":
-                stt_display += "_preventive"
-            elif kind == "sound":
-                stt_display += "_sound"
-
-            # Nếu là playlist/kênh → explode như thường, nhưng vẫn giữ nguyên STT cho từng video
-            if looks_like_playlist_or_channel(url):
-                for v in expand_url_to_videos(url):
-                    self._add_row(v, qual, filename_base=stt_display, stt_text=stt_display)
-                    added += 1
-            else:
-                self._add_row(url, qual, filename_base=stt_display, stt_text=stt_display)
-                added += 1
-
-        if added:
+            # Nếu là playlist/kênh → explode nền, nhưng vẫn giữ nguyên STT cho từng video
+            if looks_like_playlist_or_channel(e.url):
+                self._expand_async(e.url, (qual, e.stt, False))
+                self._sheet_stats[1] += 1
+                continue
+            job = self._new_job(e.url, qual, filename_base=e.stt, stt_text=e.stt)
+            job.source = (self._sheet_key, e.rows)   # hàng sheet nhận kết quả khi bật write-back
+            self._sheet_jobs[e.key] = job.id
+            batch.append(job)
+        jobs = self._append_jobs(batch)
+        self._sheet_stats[0] += len(jobs)
+        if self.is_running and jobs:
+            self._queue_jobs(jobs)
+            self._fill_slots()
+
+    def _on_sheet_done(self, gen: int, err):
+        if gen != self._sheet_gen:
+            return
+        self._sheet_busy = False
+        added, expanding = self._sheet_stats
+        if self._sheet_quiet:
+            # sync định kỳ: không bật hộp thoại
+            if err is not None:
+                self.logger.warning(f"Sync Google Sheet lỗi: {err}")
+            elif added or expanding:
+                self._toast(f"Sync Sheet: +{added} video" + (f", {expanding} playlist/kênh" if expanding else ""), 2500)
+            return
+        if err is not None:
+            self._show_message(QMessageBox.Critical, "Google Sheet", f"Lỗi đọc sheet:\n{err}")
+            return
+        if added or expanding:
             # KHÔNG renumber để giữ nguyên STT (tên từ Sheet)
-            self._show_message(QMessageBox.Information, "Google Sheet", f"Đã nhập {added} video từ Sheet.")
-        else:
+            msg = f"Đã nhập {added} video từ Sheet."
+            if expanding:
+                msg += f"\nĐang expand {expanding} playlist/kênh ở nền — video sẽ tự thêm vào bảng."
+            self._show_message(QMessageBox.Information, "Google Sheet", msg)
+        elif self._sheet_delta:
+            self._show_message(QMessageBox.Information, "Google Sheet", "Sheet không có hàng mới hoặc hàng đã sửa.")
+        elif not len(self._sheet_parser):
             self._show_message(QMessageBox.Information, "Google Sheet", "Không tìm thấy URL hợp lệ.")
+        else:
+            self._show_message(QMessageBox.Information, "Google Sheet", "Các link trong Sheet đã có sẵn trong bảng.")
 
 
-    def _set_status_all(self, text: str):
-        for r in range(self.tbl.rowCount()):
-            self._set_status(r, text)
-    def _append_log(self, msg: str):
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.log_view.appendPlainText(f"[{ts}] {msg}")
+    def _append_logs(self, msgs: List[str]):
+        """Nhiều dòng log (đã format) → 1 lần appendPlainText."""
+        self.log_view.appendPlainText("\n".join(msgs))
 
     def _setup_logging(self):
-        # logger gốc
+        # logger gốc — level đặt ở logger: message bị lọc ngay tại thread gọi, không qua hàng đợi
+        level = logging.getLevelName(str(self.settings.value("log_level", "INFO")).upper())
+        if not isinstance(level, int):
+            level = logging.INFO
         self.logger = logging.getLogger("app")
-        self.logger.setLevel(logging.INFO)
+        self.logger.setLevel(level)
 
         # formatter chung
         fmt = logging.Formatter("%(asctime)s %(levelname)s: %(message)s", "%Y-%m-%d %H:%M:%S")
 
-        # ghi file
+        # ghi file: QueueHandler → thread QueueListener ghi, xoay vòng 5 MB x 3 file
         log_path = APP_DIR / "app.log"
-        fh = logging.FileHandler(log_path, encoding="utf-8")
-        fh.setLevel(logging.INFO); fh.setFormatter(fmt)
-        self.logger.addHandler(fh)
-
-        # đẩy vào UI
-        uh = QtLogHandler(self._append_log)
-        uh.setLevel(logging.INFO); uh.setFormatter(fmt)
-        self.logger.addHandler(uh)
+        fh = logging.handlers.RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024,
+                                                  backupCount=3, encoding="utf-8")
+        fh.setFormatter(fmt)
+        log_q = queue.SimpleQueue()
+        self._log_listener = logging.handlers.QueueListener(log_q, fh)
+        self._log_listener.start()  # main() dừng listener khi app thoát → ghi nốt log còn trong hàng đợi
+        self.logger.addHandler(logging.handlers.QueueHandler(log_q))
+
+        # đẩy vào UI: ring buffer, drain theo nhịp _drain_events
+        self.log_handler = QtLogHandler(self.max_log_lines)
+        self.log_handler.setFormatter(fmt)
+        self.logger.addHandler(self.log_handler)
 
         # ✅ Phát hiện nếu đang chạy trong IDLE/Python Shell
         running_in_idle = 'idlelib' in sys.modules or 'IDLE' in sys.executable
@@ -2262,6 +1235,17 @@ class MainWindow(QMainWindow):
         # Row A: Sheet / URL Input
         rowA = QHBoxLayout(); rowA.setSpacing(8)
         btn_gsheet = QPushButton("Sheet"); btn_gsheet.clicked.connect(self._import_gsheet); btn_gsheet.setProperty("kind", "info")
+        btn_sync = QPushButton("⟳"); btn_sync.setFixedWidth(36); btn_sync.setProperty("kind", "ghost")
+        btn_sync.setToolTip("Sync Google Sheet đã nhập: chỉ thêm hàng mới / hàng đã sửa")
+        btn_sync.clicked.connect(lambda: self.sync_gsheet(full=True))
+        self.spin_sheet_poll = QSpinBox(); self.spin_sheet_poll.setRange(0, 1440)
+        self.spin_sheet_poll.setPrefix("Sync: "); self.spin_sheet_poll.setSuffix(" phút")
+        self.spin_sheet_poll.setSpecialValueText("Sync: Off")
+        self.spin_sheet_poll.setToolTip("Tự sync Google Sheet đã nhập mỗi N phút (chỉ đọc phần đuôi sheet)")
+        self._sheet_timer = QTimer(self); self._sheet_timer.timeout.connect(lambda: self.sync_gsheet(full=False))
+        self.spin_sheet_poll.setValue(int(self.settings.value("sheet_poll_minutes", 0)))
+        self._set_sheet_poll(self.spin_sheet_poll.value())
+        self.spin_sheet_poll.valueChanged.connect(self._set_sheet_poll)
 
         self.edt_url = PasteOnClickLineEdit()
         self.edt_url.setPlaceholderText("Paste link video / playlist / channel… (click để paste từ Clipboard)")
@@ -2280,27 +1264,29 @@ class MainWindow(QMainWindow):
         act_toggle = QAction(self); act_toggle.setShortcut(QKeySequence("Ctrl+T"))
         act_toggle.triggered.connect(self.toggle_theme); self.addAction(act_toggle)
 
-        rowA.addWidget(btn_gsheet)
+        rowA.addWidget(btn_gsheet); rowA.addWidget(btn_sync); rowA.addWidget(self.spin_sheet_poll)
         rowA.addWidget(self.edt_url)
         rowA.addWidget(btn_add); rowA.addWidget(btn_import); rowA.addWidget(btn_cookie)
         rowA.addWidget(self.btn_theme)
         root.addLayout(rowA)
 
         # Table: 6 cột ["Sel","STT","URL","Quality","Status","Progress"]
-        self.tbl = QTableWidget(0, 6)
-        self.tbl.setHorizontalHeaderLabels(["Sel", "STT", "URL", "Quality", "Status", "Progress"])
+        self.tbl = QTableView()
+        self.tbl.setModel(self.jobs)
         hh = self.tbl.horizontalHeader()
-        hh.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # Sel
-        hh.setSectionResizeMode(1, QHeaderView.ResizeToContents)  # STT
+        # ✅ Không dùng ResizeToContents: mỗi lần progress/status đổi header sẽ đo lại cả nghìn ô
+        hh.setSectionResizeMode(QHeaderView.Interactive)
         hh.setSectionResizeMode(2, QHeaderView.Stretch)           # URL
-        hh.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # Quality
-        hh.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # Status
-        hh.setSectionResizeMode(5, QHeaderView.ResizeToContents)  # Progress
+        for col, width in ((0, 44), (1, 120), (3, 80), (4, 170), (5, 90)):
+            self.tbl.setColumnWidth(col, width)                   # Sel, STT, Quality, Status, Progress
         self.tbl.verticalHeader().setVisible(False)
+        # ✅ Hàng cao cố định → view không phải đo từng hàng (100k hàng vẫn cuộn mượt)
+        self.tbl.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tbl.verticalHeader().setDefaultSectionSize(26)
         self.tbl.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.tbl.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tbl.customContextMenuRequested.connect(self._table_menu)
-        self.tbl.setItemDelegate(GlowDelegate(self.tbl, lambda: self.active_rows))
+        self.tbl.setItemDelegate(GlowDelegate(self.tbl, lambda: self.active_ids))
         root.addWidget(self.tbl)
 
         # Row B: Output / Quality / Threads / Options
@@ -2325,12 +1311,37 @@ class MainWindow(QMainWindow):
         rowB.addWidget(QLabel("Auto Retry:"))
         self.spin_retries = QSpinBox(); self.spin_retries.setRange(0, 10)
         self.spin_retries.setValue(self.max_retries if hasattr(self, "max_retries") else 3)
-        self.spin_retries.valueChanged.connect(lambda v: setattr(self, "max_retries", v))
+        self.spin_retries.valueChanged.connect(lambda v: (setattr(self, "max_retries", v), setattr(self.sched, "max_retries", v)))
         self.spin_retries.setToolTip("Số lần tự động retry khi download lỗi (0 = không retry)")
         rowB.addWidget(self.spin_retries)
 
+        rowB.addWidget(QLabel("Limit:"))
+        self.spin_bandwidth = QSpinBox(); self.spin_bandwidth.setRange(0, 10000)
+        self.spin_bandwidth.setSuffix(" MB/s"); self.spin_bandwidth.setSpecialValueText("Unlimited")
+        self.spin_bandwidth.setValue(round(BANDWIDTH.rate / 1024 ** 2))
+        self.spin_bandwidth.valueChanged.connect(self._set_bandwidth_limit)
+        tip = "Tổng băng thông cho mọi job đang tải (chia đều, tự cân bằng lại khi job bắt đầu/xong)"
+        if BANDWIDTH.schedule:
+            tip += "\n⚠️ Đang có lịch bandwidth_schedule trong ui_prefs.ini — lịch ưu tiên trong khung giờ của nó"
+        self.spin_bandwidth.setToolTip(tip)
+        rowB.addWidget(self.spin_bandwidth)
+
         # Options
         self.chk_h264 = QCheckBox("H.264 (convert AV1)"); self.chk_h264.setChecked(False)
+        self.chk_process = QCheckBox("Process mode")
+        self.chk_process.setChecked(self.settings.value("worker_mode", "thread") == "process")
+        self.chk_process.setToolTip("Chạy mỗi job trong process riêng (không tranh GIL với giao diện, "
+                                    "job treo kill được). Áp dụng từ lần Start kế tiếp.")
+        self.chk_writeback = QCheckBox("Sheet write-back")
+        self.chk_writeback.setToolTip(
+            f"Ghi Status / File / Lỗi của job nhập từ Google Sheet về hàng nguồn "
+            f"(cột {self.writeback.column} trở đi), gửi gộp vài giây 1 lần.\n"
+            "⚠️ Cần quyền ghi Sheet: lần gửi đầu sẽ mở trình duyệt xin quyền.")
+        self._writeback_timer = QTimer(self); self._writeback_timer.setInterval(5000)
+        self._writeback_timer.timeout.connect(self._flush_writeback)
+        self.chk_writeback.setChecked(str(self.settings.value("sheet_writeback", "false")).lower() == "true")
+        self._set_writeback(self.chk_writeback.isChecked())
+        self.chk_writeback.toggled.connect(self._set_writeback)
 
         # NEW: CheckAll / UncheckAll button for "Sel" column
         btn_check_all = QPushButton("Check All"); btn_check_all.setProperty("kind","ghost")
@@ -2339,6 +1350,8 @@ class MainWindow(QMainWindow):
         btn_uncheck_all.clicked.connect(lambda: self._set_all_checked(False))
 
         rowB.addWidget(self.chk_h264)
+        rowB.addWidget(self.chk_process)
+        rowB.addWidget(self.chk_writeback)
         rowB.addSpacing(12)
         rowB.addWidget(btn_check_all)
         rowB.addWidget(btn_uncheck_all)
@@ -2376,11 +1389,20 @@ class MainWindow(QMainWindow):
         w_ok,    self.lbl_stat_ok    = _make_stat("Thành công:")
         w_fail,  self.lbl_stat_fail  = _make_stat("Thất bại:")
         w_act,   self.lbl_stat_active= _make_stat("Đang tải:")
+        # ✅ Gộp cập nhật thống kê: tối đa ~4 lần/giây dù status đổi liên tục
+        self._stats_timer = QTimer(self); self._stats_timer.setSingleShot(True)
+        self._stats_timer.setInterval(250)
+        self._stats_timer.timeout.connect(self._refresh_stats)
 
         rowD.addWidget(w_total); rowD.addSpacing(16)
         rowD.addWidget(w_ok);    rowD.addSpacing(16)
         rowD.addWidget(w_fail);  rowD.addSpacing(16)
         rowD.addWidget(w_act);   rowD.addStretch(1)
+        self.lbl_expand = QLabel(); self.lbl_expand.setVisible(False)
+        self.btn_expand_cancel = QPushButton("✖"); self.btn_expand_cancel.setProperty("kind", "ghost")
+        self.btn_expand_cancel.setToolTip("Dừng expand playlist/kênh (giữ các video đã thêm)")
+        self.btn_expand_cancel.clicked.connect(self._stop_expand); self.btn_expand_cancel.setVisible(False)
+        rowD.addWidget(self.lbl_expand); rowD.addWidget(self.btn_expand_cancel)
         root.addLayout(rowD)
 
         self.tabs.addTab(main_page, "Downloader")
@@ -2389,7 +1411,8 @@ class MainWindow(QMainWindow):
         logs_page = QWidget()
         logs_layout = QVBoxLayout(logs_page); logs_layout.setContentsMargins(10,10,10,10)
 
-        self.log_view = QPlainTextEdit(); self.log_view.setReadOnly(True); self.log_view.setMaximumBlockCount(8000)
+        self.log_view = QPlainTextEdit(); self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(self.max_log_lines)  # ✅ ring buffer: dòng cũ tự rơi
         logs_layout.addWidget(self.log_view)
 
         rowL = QHBoxLayout()
@@ -2401,43 +1424,29 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(logs_page, "Logs")
 
         for btn in (
-            btn_gsheet, btn_add, btn_import, btn_cookie, self.btn_theme,
+            btn_gsheet, btn_sync, btn_add, btn_import, btn_cookie, self.btn_theme,
             self.btn_start, self.btn_pause,
             btn_remove, btn_del_ok, btn_clear, btn_open, btn_browse,
-            btn_open_log, btn_clear_log
+            btn_open_log, btn_clear_log, self.btn_expand_cancel
         ):
             btn.style().unpolish(btn)
             btn.style().polish(btn)
 
-    def _update_stats(self):
-        """Cập nhật thống kê: Tổng, Thành công, Thất bại, Đang tải và hiển thị toast ngắn."""
-        total = self.tbl.rowCount()
-        ok = fail = downloading = 0
-        downloading_states = {
-            "Starting", "Downloading", "Merging",
-            "Retry(best)", "Retry(TikTok/best)",
-            "Retry(Reddit)", "Retry(YouTube-TV)",
-            "Retry(recode h264/aac)"
-        }
-
-        for r in range(total):
-            it = self.tbl.item(r, 4)   # <-- Status ở cột 4
-            st = it.text() if it else ""
-            if st == "Bong":
-                ok += 1
-            elif st == "Error":
-                fail += 1
-            if st in downloading_states:
-                downloading += 1
-
-        if hasattr(self, "lbl_stat_total"): self.lbl_stat_total.setText(str(total))
-        if hasattr(self, "lbl_stat_ok"):    self.lbl_stat_ok.setText(str(ok))
-        if hasattr(self, "lbl_stat_fail"):  self.lbl_stat_fail.setText(str(fail))
-        if hasattr(self, "lbl_stat_active"):self.lbl_stat_active.setText(str(downloading))
-
-        self._toast(f"Total: {total} | OK: {ok} | Fail: {fail} | Active: {downloading}", 1800)
-
+    # Status tính là "Đang tải" (gồm nhãn của các chiến lược retry trong download_core)
+    DOWNLOADING_STATES = ("Starting", "Downloading", "Merging") + tuple(s.label for s in RETRY_STRATEGIES)
 
+    def _update_stats(self):
+        """Hẹn cập nhật thống kê: nhiều lần gọi liên tiếp gộp thành 1 lần vẽ label (timer)."""
+        if hasattr(self, "_stats_timer") and not self._stats_timer.isActive():
+            self._stats_timer.start()
+
+    def _refresh_stats(self):
+        """Tổng, Thành công, Thất bại, Đang tải — đọc bộ đếm status của model, O(1)."""
+        jobs = self.jobs
+        self.lbl_stat_total.setText(str(len(jobs)))
+        self.lbl_stat_ok.setText(str(jobs.count("Bong")))
+        self.lbl_stat_fail.setText(str(jobs.count("Error")))
+        self.lbl_stat_active.setText(str(jobs.count(*self.DOWNLOADING_STATES)))
 
     def _apply_background(self):
         for p in (APP_DIR/"bg.jpg", APP_DIR/"bg.png"):
@@ -2449,6 +1458,11 @@ class MainWindow(QMainWindow):
                 self.findChild(QWidget, "Root").setStyleSheet(css); break
 
     # Theme
+    def _set_bandwidth_limit(self, mb_per_s: int):
+        """Đổi tổng băng thông ngay cho cả các job đang chạy và lưu vào QSettings."""
+        BANDWIDTH.configure(rate=mb_per_s * 1024 ** 2)
+        self.settings.setValue("bandwidth_limit", f"{mb_per_s}M" if mb_per_s else "")
+
     def apply_theme(self, name: str):
         """Đổi theme (light/dark), lưu vào QSettings và báo toast."""
         # chọn QSS
@@ -2532,24 +1546,26 @@ class MainWindow(QMainWindow):
 
         actExplode = QAction("Explode selected (playlist/channel → nhiều video)", self)
         def _explode_sel():
-            rows = sorted({idx.row() for idx in self.tbl.selectedIndexes()}, reverse=True)
+            # chỉ hàng là playlist/kênh; video đơn giữ nguyên
+            rows = [j for j in self._selected_ids()
+                    if j not in self.active and looks_like_playlist_or_channel(self.jobs.job(j).url)]
             if not rows: return
-            # lấy URL từ các hàng chọn (chỉ những hàng là video đơn/playlist/kênh)
-            srcs = [self.tbl.item(r,1).text() for r in rows]
-            vids = []
-            for u in srcs:
-                if looks_like_playlist_or_channel(u):
-                    vids.extend(expand_url_to_videos(u))
-                else:
-                    vids.append(u)
-            # thay các hàng cũ bằng list video
-            for r in rows:
-                self.tbl.removeRow(r)
-            self._add_many_rows(vids, self.cbo_quality.currentText())
+            srcs = [self.jobs.job(r).url for r in rows]
+            # thay các hàng cũ bằng list video (expand nền, song song)
+            self.sched.cancel(rows)
+            self.jobs.remove_ids(rows)
             self._renumber()
+            qual = self.cbo_quality.currentText()
+            for u in srcs:
+                self._expand_async(u, (qual, None, True))
         actExplode.triggered.connect(_explode_sel)
         menu.addAction(actExplode)
 
+        actPin = QAction("Download selected first (pin)", self); actPin.triggered.connect(self.pin_selected); menu.addAction(actPin)
+        actUnpin = QAction("Unpin selected", self); actUnpin.triggered.connect(lambda: self.pin_selected(False)); menu.addAction(actUnpin)
+
+        actKill = QAction("Kill selected (job treo)", self); actKill.triggered.connect(self.kill_selected); menu.addAction(actKill)
+
         actRemove = QAction("Remove selected", self); actRemove.triggered.connect(self.remove_selected); menu.addAction(actRemove)
         actToggle = QAction("Toggle Dark/Light  (Ctrl+T)", self); actToggle.triggered.connect(self.toggle_theme); menu.addAction(actToggle)
         menu.exec(QCursor.pos())
@@ -2568,86 +1584,107 @@ class MainWindow(QMainWindow):
 
     def _add_many_rows(self, urls: List[str], quality: str):
         if not urls: return
-        seen = {self.tbl.item(i,2).text() for i in range(self.tbl.rowCount()) if self.tbl.item(i,2)}
-        added = 0
-        for u in urls:
-            if u in seen: 
-                continue
-            seen.add(u)
-            r = self.tbl.rowCount(); self.tbl.insertRow(r)
-
-            # Sel
-            sel_item = QTableWidgetItem()
-            sel_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable | Qt.ItemIsSelectable)
-            sel_item.setCheckState(Qt.Checked)
-            self.tbl.setItem(r, 0, sel_item)
-
-            self.tbl.setItem(r, 1, QTableWidgetItem(str(r+1)))         # STT
-            self.tbl.setItem(r, 2, QTableWidgetItem(u))                 # URL
-            self.tbl.setItem(r, 3, QTableWidgetItem(quality))           # Quality
-            self.tbl.setItem(r, 4, QTableWidgetItem("Pending"))         # Status
-            pb = QProgressBar(); pb.setMinimum(0); pb.setMaximum(0); pb.setTextVisible(False); pb.setFixedHeight(16)
-            self.tbl.setCellWidget(r, 5, pb)                            # Progress
-            added += 1
-
-            # chống đơ UI khi add số lượng lớn
-            if (added % 20) == 0:
-                self._yield_ui()
-        self._update_stats()
+        # trùng lặp (với bảng hoặc trong lô) bị bỏ trong _append_jobs qua chỉ mục identity của model
+        self._append_jobs([self._new_job(u, quality) for u in urls])
 
 
     def _bulk_add_from_list(self, urls: List[str]):
         if not urls: return
         qual = self.cbo_quality.currentText()
-        added = 0
-        
-        # ✅ Batch lấy title để tránh lag khi import nhiều link
-        # Chỉ lấy title cho link lẻ (không phải playlist/channel)
-        single_urls = []
-        for u in urls:
-            u = _sanitize_yt_watch_url(u)
-            if not looks_like_playlist_or_channel(u):
-                single_urls.append(u)
-        
-        # Lấy title cho tất cả link lẻ cùng lúc (nhanh hơn)
-        titles_map = {}
-        if single_urls:
-            # ✅ Giới hạn số lượng link lấy title cùng lúc để tránh lag
-            batch_size = 5  # Giảm xuống 5 để nhanh hơn
-            for i in range(0, len(single_urls), batch_size):
-                batch = single_urls[i:i+batch_size]
-                for u in batch:
-                    try:
-                        title = get_video_title(u)
-                        if title:
-                            titles_map[u] = title
-                    except Exception:
-                        pass
-                # Bỏ yield UI trong batch để tránh lag
-        
-        # Thêm vào bảng
+        batch, titles, added = [], [], set()
+
+        # Thêm vào bảng NGAY; title (YouTube) lấy nền, hàng nào có title rồi thì được tải trước
         for u in urls:
             # ✅ Sanitize URL để loại bỏ tham số thời gian
             u = _sanitize_yt_watch_url(u)
             
             if looks_like_playlist_or_channel(u):
-                for v in expand_url_to_videos(u):
-                    self._add_row(v, qual, filename_base=None, stt_text=None, from_collection=True)
-                    added += 1
+                # ✅ Expand nền: video vào bảng theo từng trang, không chặn UI
+                self._expand_async(u, (qual, None, True))
             else:
-                # Lấy title từ map đã fetch
-                title = titles_map.get(u)
-                
-                # Dùng title làm filename_base và stt_text nếu có
-                filename_base = title
-                stt_text = title if title else None
-                self._add_row(u, qual, filename_base=filename_base, stt_text=stt_text, from_collection=False)
-                added += 1
-                
-                # ✅ Yield UI mỗi 10 link để tránh lag
-                if added % 10 == 0:
-                    self._yield_ui()
-        self._renumber()
+                forget_unavailable([u])   # thêm lại tay → kiểm tra lại, không tin dấu private/removed cũ
+                job = self._new_job(u, qual, filename_base=None, stt_text=None, from_collection=False)
+                batch.append(job)
+                if detect_platform(u) == "yt":
+                    titles.append(job)
+        added.update(j.id for j in self._append_jobs(batch))
+        for job in titles:
+            # bị bỏ vì trùng / đã có trong kho đã tải → không cần title
+            if job.id in added and job.status == "Pending":
+                self._fetch_title_async(job.id, job.url)
+
+    def _fetch_title_async(self, jid: int, url: str):
+        """Giữ hàng lại (chưa tải) tới khi có title để đặt tên file."""
+        self.sched.hold(jid)
+        self._set_status(jid, "Fetching title…")
+        gen = self._title_gen
+        self.titles.submit(url, lambda u, title, j=jid: self.titleResolved.emit(gen, j, u, title))
+
+    def _on_title_resolved(self, gen: int, jid: int, url: str, title):
+        if gen != self._title_gen:
+            return  # bảng đã Clear
+        job = self.jobs.job(jid)  # None nếu hàng đã bị xoá
+        if job is not None:
+            if title:
+                # Dùng title làm filename_base và STT
+                self.jobs.set_title(jid, title)
+            if job.status == "Fetching title…":
+                self._set_status(jid, "Pending")
+        if self.sched.release(jid) and self.is_running:
+            self._start_next()
+
+    def _expand_async(self, url: str, ctx: tuple):
+        """ctx = (quality, stt/filename_base|None, from_collection) áp cho mọi video của playlist/kênh."""
+        gen = self._expand_gen
+        self.expander.submit(url, lambda vids: self.expandPage.emit(gen, ctx, vids),
+                             lambda n: self.expandDone.emit(gen, ctx, n))
+        self._expand_stats[0] += 1
+        self._refresh_expand()
+
+    def _on_expand_page(self, gen: int, ctx, vids):
+        if gen != self._expand_gen:
+            return  # bảng đã Clear
+        qual, stt, from_collection = ctx
+        # video trùng giữa các playlist (hoặc với bảng) bị bỏ ở đây — chỉ mục identity của model
+        jobs = self._append_jobs([self._new_job(v, qual, filename_base=stt, stt_text=stt,
+                                                from_collection=from_collection) for v in vids])
+        self._expand_stats[2] += len(jobs)
+        self._refresh_expand()
+        if self.is_running and jobs:
+            # đang tải → video mới vào hàng đợi luôn, không đợi expand xong
+            self._queue_jobs(jobs)
+            self._fill_slots()
+
+    def _on_expand_done(self, gen: int, ctx, count: int):
+        if gen != self._expand_gen:
+            return
+        self._expand_stats[1] += 1
+        self._refresh_expand()
+        if self.is_running:
+            self._fill_slots()  # hết việc thì _start_next → _all_done
+
+    def _cancel_expand(self):
+        self.expander.cancel(); self._expand_gen += 1
+        self._expand_stats = [0, 0, 0]
+        self._refresh_expand()
+
+    def _stop_expand(self):
+        """Nút ✖ cạnh tiến độ expand: dừng expand, giữ các video đã thêm."""
+        self._cancel_expand()
+        if self.is_running:
+            self._fill_slots()
+
+    def _refresh_expand(self):
+        """Tiến độ expand ở hàng thống kê; ẩn khi không còn playlist nào đang chạy."""
+        sent, done, videos = self._expand_stats
+        busy = done < sent
+        if not busy:
+            self._expand_stats = [0, 0, 0]
+        if hasattr(self, "lbl_expand"):
+            self.lbl_expand.setText(f"Expand: {done}/{sent} playlist · {videos} video")
+            self.lbl_expand.setVisible(busy)
+            self.btn_expand_cancel.setVisible(busy)
+
     def _yield_ui(self, steps: int = 1):
         """Nhường CPU cho UI 'steps' lần để tránh cảm giác đơ khi add nhiều hàng."""
         for _ in range(max(1, steps)):
@@ -2656,16 +1693,9 @@ class MainWindow(QMainWindow):
 
     # ---------- Table ops ----------
     def _renumber(self):
-        for i in range(self.tbl.rowCount()):
-            it = self.tbl.item(i, 1)
-            if it:
-                it.setText(str(i+1))
+        self.jobs.renumber()
     def _set_all_checked(self, checked: bool):
-        state = Qt.Checked if checked else Qt.Unchecked
-        for r in range(self.tbl.rowCount()):
-            it = self.tbl.item(r, 0)
-            if it:
-                it.setCheckState(state)
+        self.jobs.set_all_checked(checked)
     def clear_all_force(self):
         """Dừng toàn bộ worker, huỷ hàng đợi và xoá sạch bảng (kể cả đang chạy)."""
         # 1) Dừng tất cả worker hiện tại
@@ -2678,116 +1708,131 @@ class MainWindow(QMainWindow):
         self._yield_ui(8)
         # 3) Reset tất cả
         self.is_running = False
-        self.pending_rows = queue.Queue()
+        self.sched.reset(); self.sched.held.clear(); self.sched.pinned.clear()
+        self.titles.cancel_pending(); self._title_gen += 1
+        self._cancel_expand(); self._sheet_gen += 1; self._sheet_busy = False
         self.active.clear()
-        self.active_rows.clear()
-        self.row_filename.clear()
-        self.row_meta.clear()
-        self.row_url.clear()
-        self.tbl.setRowCount(0)
+        self.active_ids.clear()
+        self.jobs.clear()
         self.btn_start.setEnabled(True)
         self._update_stats()
         self._toast("Cleared ALL (force).", 1800)
 
 
-    def _reindex_after_row_change(self):
-        """Sau khi xóa/di chuyển hàng: đánh lại số thứ tự + rebuild row_meta/row_filename từ cột STT."""
-        self._renumber()
-        new_row_meta = {}
-        new_row_filename = {}
-        new_row_url = {}
-
-        for i in range(self.tbl.rowCount()):
-            stt_val = self.tbl.item(i, 1).text() if self.tbl.item(i, 1) else ""
-            stt_lower = (stt_val or "").lower()
-
-            kind = "main"
-            if stt_lower.endswith("_preventive"):
-                kind = "preventive"
-            elif stt_lower.endswith("_sound"):
-                kind = "sound"
-
-            group = stt_lower
-            for suf in ("_preventive", "_sound"):
-                if group.endswith(suf):
-                    group = group[: -len(suf)]
-
-            url = self.row_meta.get(i, {}).get("url", "")
-            new_row_meta[i] = {"group": group, "kind": kind, "from_collection": False, "url": url}
-            new_row_filename[i] = stt_val if stt_val else None
-            new_row_url[i] = url
-
-        self.row_meta = new_row_meta
-        self.row_filename = new_row_filename
-        self.row_url = new_row_url
-        self._update_stats()
-
     def clear_all(self):
         if self.is_running:
             self._toast("Đang chạy — hãy dừng download trước khi Clear.", 2500)
             return
-        self.tbl.setRowCount(0)
-        self.pending_rows = queue.Queue()
+        self.jobs.clear()
+        self.sched.reset(); self.sched.held.clear(); self.sched.pinned.clear()
+        self.titles.cancel_pending(); self._title_gen += 1
+        self._cancel_expand(); self._sheet_gen += 1; self._sheet_busy = False
         self.active.clear()
-        self.active_rows.clear()
-        self.row_filename.clear()
-        self.row_meta.clear()
-        self.row_url.clear()
+        self.active_ids.clear()
         self._update_stats()
 
 
     # ---------- Start / Scheduler ----------
     def start_all(self):
-        if self.is_running or self.tbl.rowCount()==0:
+        if not self._licensed:
+            self._toast("Đang kiểm tra license…", 1500)
+            return
+        if self.is_running or (len(self.jobs)==0 and not self.expander.pending):
             return
-
-        if not hasattr(self, "row_meta"):
-            self.row_meta = {}
 
         self.is_running = True
         self.btn_start.setEnabled(False)
         # ✅ Giới hạn max_workers để tránh lag, nhưng vẫn cho phép nhiều link
         self.max_workers = min(int(self.concurrency), 20)  # Tối đa 20 workers
-        self.pending_rows = queue.Queue(); self.active.clear(); self.active_rows.clear()
-        self.row_retries.clear()  # Reset retry count khi bắt đầu mới
+        self.active.clear(); self.active_ids.clear()
+        self.sched.reset(max_workers=self.max_workers, max_retries=self.max_retries)
+        self.logger.info(f"Giới hạn song song theo nền tảng: {self.sched.budget.describe()}")
+        self._ensure_pool()
+        self.pool.resize(self.max_workers)
+
+        self._queue_jobs(self.jobs)
+        for _ in range(self.max_workers):
+            self._start_next()
 
+    def _queue_jobs(self, jobs):
         # chỉ queue những hàng: (được tick) và (không phải preventive)
-        for r in range(self.tbl.rowCount()):
-            sel = self.tbl.item(r, 0)
-            is_checked = (sel and sel.checkState() == Qt.Checked)
-            meta = self.row_meta.get(r, {"kind": "main"})
-            if not is_checked:
-                self._set_status(r, "Skipped (unchecked)")
-                self._set_progress(r, 0)
+        # ✅ Gom thay đổi rồi báo view 1 lần (không phát dataChanged từng hàng)
+        updates = []
+        for job in jobs:
+            if not job.checked:
+                if not is_finished(job.status):   # giữ nguyên hàng đã xong (vd: lấy từ kho đã tải)
+                    updates.append((job, "Skipped (unchecked)", 0))
                 continue
-            if meta.get("kind") == "preventive":
-                self._set_status(r, "Waiting (preventive)")
-                self._set_progress(r, 0)
-            else:
-                self._set_status(r, "Queued")
-                self._set_progress(r, -1)
-                self.pending_rows.put(r)
-
+            if not self.sched.add(job.id, job.kind, job.group, detect_platform(job.url)):
+                updates.append((job, "Waiting (preventive)", 0))
+            elif job.status != "Fetching title…":
+                updates.append((job, "Queued", -1))
+        self.jobs.set_states(updates)
         self._update_stats()
-        for _ in range(self.max_workers):
+
+    def _ensure_pool(self):
+        """
+        Pool chạy job theo QSettings "worker_mode": "thread" (mặc định — thread sống lâu) hoặc
+        "process" (process con, tránh GIL; job treo kill được). Đổi chế độ áp dụng từ lần Start sau.
+        """
+        mode = "process" if self.chk_process.isChecked() else "thread"
+        if self.pool is not None and self._pool_mode == mode:
+            return
+        if self.pool is not None:
+            self.pool.shutdown()
+        on_done = lambda job, ok, err: self.events.done(job.row, ok, err)
+        if mode == "process":
+            self.pool = ProcessPool(size=self.max_workers, on_done=on_done,
+                                    log_level=self.logger.getEffectiveLevel())
+        else:
+            self.pool = WorkerPool(size=self.max_workers, on_done=on_done)
+        self._pool_mode = mode
+        self.settings.setValue("worker_mode", mode)
+
+    def shutdown_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def on_quit(self):
+        """
+        aboutToQuit: dừng pool → xử lý nốt kết quả job (cả job bị dừng lúc thoát) → ghi journal,
+        gửi write-back → đóng kho dữ liệu. Thứ tự quan trọng: kết quả phải vào write-back trước khi gửi.
+        """
+        self.is_running = False   # _on_done không bắt đầu job mới
+        self.shutdown_pool()
+        self._drain_events()
+        self.journal.close()
+        self.sheet_state.close()
+        self.flush_writeback_now()
+        self._log_listener.stop()
+
+    def _fill_slots(self):
+        for _ in range(max(1, self.max_workers - len(self.active))):
             self._start_next()
 
     def _start_next(self):
         if not self.is_running or self.is_paused:
             return
-        if len(self.active) >= self.max_workers:
-            return
-        try:
-            r = self.pending_rows.get_nowait()
-        except queue.Empty:
-            if not self.active:
-                self._all_done()
+        r = self.sched.next()
+        if r is None:
+            if self.sched.idle:
+                if not self.expander.pending:   # playlist còn đang expand → còn job sắp vào
+                    self._all_done()
+            else:
+                # còn job đợi nhưng nền tảng của chúng đang hết token → hẹn lấp slot sau
+                wait = self.sched.wake_in()
+                if wait is not None and not self._wake_timer.isActive():
+                    self._wake_timer.start(int(wait * 1000) + 20)
             return
 
-        url_item  = self.tbl.item(r, 2)  # URL
-        qual_item = self.tbl.item(r, 3)  # Quality
-        url = self.row_meta.get(r, {}).get("url", url_item.text() if url_item else "")
-        qual = qual_item.text() if qual_item else self.quality
+        job = self.jobs.job(r)
+        if job is None:
+            # hàng đã bị xoá khỏi bảng → trả slot, lấy job khác
+            self.sched.cancel([r]); self.sched.done(r, False)
+            return self._start_next()
+        url = job.url
+        qual = job.quality or self.quality
 
         platform = detect_platform(url)
         if platform == "yt":
@@ -2795,133 +1840,160 @@ class MainWindow(QMainWindow):
 
         fmt = build_format(qual, platform)
 
-        fname = self.row_filename.get(r)
-        meta  = self.row_meta.get(r, {})
-        from_collection = bool(meta.get("from_collection", False))
+        fname = job.filename
+        from_collection = job.from_collection
 
         per_folder  = False
         convert_av1 = bool(self.chk_h264.isChecked())
-        audio_only  = (meta.get("kind") == "sound")
+        audio_only  = (job.kind == "sound")
 
         worker = DownloadWorker(
             row=r,
             url=url,
             out_dir=self.out_dir,
             fmt=fmt,
+            events=self.events,
+            pool=self.pool,
             filename_base=fname,
             per_folder=per_folder,
             from_collection=from_collection,
             audio_only=audio_only,
             convert_av1=convert_av1,
         )
-        worker.log.connect(self._append_log)
-        worker.progress.connect(self._on_progress)
-        worker.status.connect(self._on_status)
-        worker.done.connect(self._on_done)
-
         self.active[r] = worker
         self._set_status(r, "Starting")
-        self.active_rows.add(r)
+        self.active_ids.add(r)
         self._update_stats()
         worker.start()
 
 
-    def _on_progress(self, row, percent):
-        now = time.time() * 1000  # ms
-        last_pct, last_time = self._progress_cache.get(row, (None, 0))
-        if last_pct == percent and now - last_time < self._progress_throttle_ms:
-            return  # skip update
-        self._progress_cache[row] = (percent, now)
-        self._set_progress(row, percent)
-
-    def _on_status(self, row, text):
-        self._set_status(row, text)
-        if text in ("Starting", "Downloading", "Merging", "Retry(best)", "Retry(TikTok/best)"):
-            self.active_rows.add(row)
-        else:
-            self.active_rows.discard(row)
-        self._update_stats()
-
+    def _drain_events(self):
+        """1 nhịp (10 Hz): log + mọi progress/status dồn từ worker → 1 lần cập nhật, rồi xử lý job xong."""
+        progress, status, done = self.events.drain()
+        logs = self.log_handler.drain()
+        if logs:
+            self._append_logs(logs)
+        if progress or status:
+            self.jobs.apply_events(progress, status)
+        if status:
+            for row, text in status.items():
+                if text in self.DOWNLOADING_STATES:
+                    self.active_ids.add(row)
+                else:
+                    self.active_ids.discard(row)
+            self._update_stats()
+        for row, ok, err in done:
+            self._on_done(row, ok, err)
+        self.journal.flush()
 
     def _on_done(self, row, ok, err):
-        self.active.pop(row, None)
-
-        meta = self.row_meta.get(row, {})
-        kind = meta.get("kind")
-        group = meta.get("group")
+        w = self.active.pop(row, None)
+        job = getattr(w, "job", None)
+        err_cls = getattr(job, "error_class", "")
+        out = self.sched.done(row, ok, retryable=err_cls not in PERMANENT_ERRORS,
+                              throttled=getattr(job, "throttled", False))
 
         if ok:
             self._set_status(row, "Bong"); self._set_progress(row, 100)
-            # Reset retry count khi thành công
-            self.row_retries.pop(row, None)
-            if kind == "main" and group:
-                # bỏ qua các preventive cùng nhóm
-                for r2, m2 in self.row_meta.items():
-                    if m2.get("group") == group and m2.get("kind") == "preventive":
-                        self._set_status(r2, "Skipped (main OK)")
-                        self._set_progress(r2, 0)
+            # bỏ qua các preventive cùng nhóm
+            for r2 in out.skipped:
+                self._set_status(r2, "Skipped (main OK)")
+                self._set_progress(r2, 0)
+        elif out.canceled:
+            self._set_status(row, "Canceled")
+            self._set_progress(row, 0)
         else:
-            # ✅ Auto-retry logic
-            current_retries = self.row_retries.get(row, 0)
-            
             # Lưu lỗi vào tooltip của cột Quality (cột 3)
-            qual_item = self.tbl.item(row, 3)
-            if qual_item:
-                qual_item.setToolTip(err)
-            
-            if current_retries < self.max_retries:
-                # Còn retry, tự động thêm lại vào queue
-                self.row_retries[row] = current_retries + 1
-                self._set_status(row, f"Retry {current_retries + 1}/{self.max_retries}")
+            self.jobs.set_error(row, err)
+
+            if out.retry:
+                # ✅ Auto-retry: Scheduler đã đưa lại vào hàng đợi
+                self._set_status(row, f"Retry {out.retry}/{self.max_retries}")
                 self._set_progress(row, -1)
-                self.pending_rows.put(row)
                 try:
-                    self.logger.info(f"[{row}] Auto-retry {current_retries + 1}/{self.max_retries}: {err[:100]}")
+                    self.logger.info(f"[{row}] Auto-retry {out.retry}/{self.max_retries}: {err[:100]}")
                 except Exception:
                     pass
             else:
                 # Hết retry, set Error
                 self._set_status(row, "Error")
                 self._set_progress(row, 0)
-                self.row_retries.pop(row, None)  # Reset count
-                
-                # Queue preventive nếu main fail (logic cũ)
-                if kind == "main" and group:
-                    for r2, m2 in self.row_meta.items():
-                        if m2.get("group") == group and m2.get("kind") == "preventive":
-                            st_item = self.tbl.item(r2, 4)
-                            st = st_item.text() if st_item else ""
-                            if st.startswith("Waiting") or st == "Pending" or st == "Error":
-                                self._set_status(r2, "Queued (preventive)")
-                                self._set_progress(r2, -1)
-                                self.pending_rows.put(r2)
-                                try:
-                                    self.logger.info(f"[{r2}] Main URL failed → Auto-queue preventive URL")
-                                except Exception:
-                                    pass
-
-        self.active_rows.discard(row)
+
+                # Main fail → preventive cùng nhóm đã được queue
+                for r2 in out.promoted:
+                    self._set_status(r2, "Queued (preventive)")
+                    self._set_progress(r2, -1)
+                    try:
+                        self.logger.info(f"[{r2}] Main URL failed → Auto-queue preventive URL")
+                    except Exception:
+                        pass
+
+        if ok or out.canceled or not out.retry:
+            files = getattr(job, "output_files", None)
+            self._report_sheet(row, files[-1] if files else "", "" if ok else err_cls)
+            for r2 in out.skipped:
+                self._report_sheet(r2)
+
+        self.active_ids.discard(row)
         self._update_stats()
         self._start_next()
-        
+
+    def _report_sheet(self, jid: int, path: str = "", error_class: str = ""):
+        """Job nhập từ Sheet đã có kết quả cuối → chờ ghi về hàng nguồn (nếu bật write-back)."""
+        job = self.jobs.job(jid)
+        if job is None or job.source is None or not self.chk_writeback.isChecked():
+            return
+        sheet, rows = job.source
+        self.writeback.add(sheet, rows, job.status, path, error_class)
+
+    def _flush_writeback(self):
+        """Timer: gửi kết quả đang chờ ở thread nền (1 lượt mỗi lúc)."""
+        if self._writeback_busy or not self.writeback.pending:
+            return
+        self._writeback_busy = True
+        def _send():
+            try:
+                n = self.writeback.flush()
+                self.logger.info(f"Sheet write-back: {n} hàng")
+            except Exception as e:
+                self.logger.warning(f"Sheet write-back lỗi (sẽ gửi lại): {e}")
+            finally:
+                self._writeback_busy = False
+        threading.Thread(target=_send, name="gsheet-writeback", daemon=True).start()
+
+    def flush_writeback_now(self):
+        """Thoát app: gửi nốt kết quả còn chờ (chặn tới khi xong) — chỉ khi đã có token, không mở trình duyệt."""
+        n = self.writeback.pending
+        if not n:
+            return
+        try:
+            gs_service(str(self.settings.value("sheet_credentials", "") or ""), write=True, interactive=False)
+        except Exception as e:
+            self.logger.warning(f"Sheet write-back: bỏ {n} hàng chưa gửi khi thoát — {e}")
+            return
+        try:
+            self.writeback.flush()
+        except Exception as e:
+            self.logger.warning(f"Sheet write-back lỗi: {e}")
+
+    def _set_writeback(self, on: bool):
+        self.settings.setValue("sheet_writeback", bool(on))
+        if on:
+            self._writeback_timer.start()
+        else:
+            self._writeback_timer.stop()
+
     def _all_done(self):
         self.is_running = False
         self.btn_start.setEnabled(True)
 
     # ---------- Small setters ----------
     def _set_status(self, row, text):
-        it = self.tbl.item(row, 4)
-        if it: it.setText(text)
+        self.jobs.set_status(row, text)
 
     def _set_progress(self, row, percent):
-        # ✅ Dùng QLabel thay QProgressBar - chỉ hiển thị text % (không animation)
-        lbl = self.tbl.cellWidget(row, 5)
-        if not lbl: return
-        if percent < 0:
-            lbl.setText("—")  # Indeterminate
-        else:
-            pct = max(0, min(100, percent))
-            lbl.setText(f"{pct}%")
+        # ✅ Model giữ %, GlowDelegate vẽ thanh + text (không widget trong ô)
+        self.jobs.set_progress(row, percent)
 
 
     # ---------- Misc ----------
@@ -2930,6 +2002,40 @@ class MainWindow(QMainWindow):
         if not path: return
         self.out_dir = Path(path); self.out_dir.mkdir(parents=True, exist_ok=True)
         self.lbl_out.setText(str(self.out_dir))
+        self.journal.set_meta("out_dir", str(self.out_dir))
+
+    def _restore_journal(self):
+        """
+        Khôi phục job chưa xong của phiên trước (kể cả job đang tải dở lúc crash) vào bảng.
+        Cùng thư mục + tên file → yt-dlp tải tiếp file .part thay vì tải lại từ đầu.
+        """
+        records = [r for r in self.journal.load() if not is_finished(r.status)]
+        if not records:
+            self.journal.clear()
+            self.journal.set_meta("out_dir", str(self.out_dir))
+            return
+        out_dir = self.journal.get_meta("out_dir")
+        if out_dir and Path(out_dir).is_dir():
+            self.out_dir = Path(out_dir)
+            self.lbl_out.setText(str(self.out_dir))
+        jobs = []
+        for r in records:
+            job = self.jobs.new_job(r.url, r.quality, r.stt, r.filename, r.from_collection)
+            job.checked = r.checked
+            job.error = r.error
+            job.source = r.source
+            job.status = "Queued (restored)"
+            jobs.append(job)
+        # id trong phiên mới khác phiên cũ → thay cả nhật ký trong 1 transaction
+        # (chỉ các job thật sự vào bảng: hàng trùng bị _append_jobs bỏ thì cũng bỏ khỏi nhật ký)
+        self.jobs.journal = None
+        try:
+            jobs = self._append_jobs(jobs)
+        finally:
+            self.jobs.journal = self.journal
+        self.journal.reset(jobs)
+        self.logger.info(f"♻️ Khôi phục {len(jobs)} job chưa xong từ phiên trước — bấm Start để tải tiếp.")
+        self._toast(f"Khôi phục {len(jobs)} job từ phiên trước.", 3000)
 
     def _open_out(self):
         p = str(self.out_dir)
@@ -2951,7 +2057,12 @@ def main():
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(resource_path("icon.ico")))
     w = MainWindow(); w.show()
+    QTimer.singleShot(0, w.after_show)  # chạy khi event loop đã vẽ cửa sổ
+    app.aboutToQuit.connect(w.on_quit)
+    FFMPEG.warm()  # probe ffmpeg nền, worker dùng lại kết quả
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # bản đóng gói: process con của ProcessPool chạy từ exe
     main()
@@ -0,0 +1,117 @@
+# ==== download_archive.py (kho đã tải giữa các phiên: (platform, id) → file trên đĩa) ====
+from __future__ import annotations
+import os, shutil, sqlite3, threading, time, pathlib, typing as _t
+
+
+class ArchiveEntry(_t.NamedTuple):
+    platform: str
+    mid: str
+    path: pathlib.Path
+    size: int
+    downloaded: float
+
+
+class DownloadArchive:
+    """
+    Ghi nhớ media đã tải xong: (platform, id) → đường dẫn, kích thước, thời điểm (SQLite, PK là index).
+    - lookup_many(): tra cả lô khi thêm job vào hàng đợi — không cần extract lại.
+    - Bản ghi chỉ dùng được khi file vẫn còn và đúng kích thước; file đã bị xoá/sửa → tự bỏ bản ghi.
+    - Thread-safe (1 connection + lock); lỗi SQLite đều nuốt như MetaCache.
+    """
+
+    _CHUNK = 400   # số key mỗi câu SELECT (2 biến/key, SQLite cũ giới hạn 999 biến)
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                " platform TEXT NOT NULL, mid TEXT NOT NULL, path TEXT NOT NULL,"
+                " size INTEGER NOT NULL, downloaded REAL NOT NULL,"
+                " PRIMARY KEY (platform, mid))")
+            self._conn = conn
+        return self._conn
+
+    def record(self, platform: str, mid: str, path: pathlib.Path | str):
+        try:
+            path = pathlib.Path(path)
+            size = path.stat().st_size
+            with self._lock:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO archive(platform, mid, path, size, downloaded) VALUES (?,?,?,?,?)",
+                    (platform, mid, str(path), size, time.time()))
+        except Exception:
+            pass
+
+    def forget(self, platform: str, mid: str):
+        try:
+            with self._lock:
+                self._db().execute("DELETE FROM archive WHERE platform=? AND mid=?", (platform, mid))
+        except Exception:
+            pass
+
+    def lookup(self, platform: str, mid: str) -> ArchiveEntry | None:
+        return self.lookup_many([(platform, mid)]).get((platform, mid))
+
+    def lookup_many(self, keys: _t.Iterable[tuple[str, str]]) -> dict[tuple[str, str], ArchiveEntry]:
+        """Các key đã tải và file vẫn còn nguyên trên đĩa."""
+        keys = list(dict.fromkeys(k for k in keys if k))
+        rows = []
+        try:
+            with self._lock:
+                db = self._db()
+                for i in range(0, len(keys), self._CHUNK):
+                    chunk = keys[i:i + self._CHUNK]
+                    where = " OR ".join(["(platform=? AND mid=?)"] * len(chunk))
+                    rows += db.execute(
+                        f"SELECT platform, mid, path, size, downloaded FROM archive WHERE {where}",
+                        [x for k in chunk for x in k]).fetchall()
+        except Exception:
+            return {}
+        out = {}
+        for platform, mid, path, size, downloaded in rows:
+            p = pathlib.Path(path)
+            try:
+                ok = p.stat().st_size == size
+            except OSError:
+                ok = False
+            if ok:
+                out[(platform, mid)] = ArchiveEntry(platform, mid, p, size, downloaded)
+            else:
+                self.forget(platform, mid)
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def reuse_archived(entry: ArchiveEntry, out_dir: pathlib.Path, filename_base: str | None = None) -> pathlib.Path | None:
+    """
+    Đưa file đã tải vào `out_dir` mà không tải lại: đã nằm đúng chỗ → trả luôn; khác thư mục → hard-link
+    (khác ổ đĩa không link được → copy). `filename_base` phải là tên đã làm sạch. Không làm được → None.
+    """
+    src = entry.path
+    name = f"{filename_base}{src.suffix}" if filename_base else src.name
+    dst = pathlib.Path(out_dir) / name
+    try:
+        if dst.exists():
+            return dst if dst.stat().st_size == entry.size else None
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+        return dst
+    except OSError:
+        return None
@@ -0,0 +1,3027 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ==== download_core.py (engine tải không phụ thuộc Qt: dùng chung cho GUI + headless) ====
+import sys, os, re, json, copy, math, atexit, logging, argparse, traceback
+import threading, time, heapq, itertools
+
+from collections import deque
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, NamedTuple, TextIO
+
+from meta_cache import MetaCache
+from download_archive import DownloadArchive, ArchiveEntry, reuse_archived
+
+APP_DIR = Path(__file__).resolve().parent
+USER_DATA_DIR = Path.home() / ".myduyen"
+USER_DATA_DIR.mkdir(parents=True, exist_ok=True)
+COOKIE_FILE = APP_DIR / "cookies.txt"  # Cookie file for YouTube
+INSTAGRAM_COOKIE_FILE = APP_DIR / "instagram_cookies.txt"  # Cookie file for Instagram
+
+def _ydl(params: dict) -> Any:
+    """YoutubeDL(params) — yt_dlp nạp lười ở lần dùng đầu (~0.25 s import), mở app không phải đợi."""
+    from yt_dlp import YoutubeDL
+    return YoutubeDL(params)
+
+def prewarm() -> str:
+    """Nạp yt_dlp trước (gọi ở thread nền sau khi hiện cửa sổ). Trả version yt-dlp."""
+    import yt_dlp
+    try:
+        from yt_dlp import version as yt_ver
+        return yt_ver.__version__
+    except Exception:
+        return getattr(yt_dlp, "__version__", "unknown")
+
+# ------------------------ Helpers ------------------------
+
+# === NEW: helpers dọn .part khi dính 416 ===
+def _delete_part_files_by_id(out_dir: Path, video_id: str):
+    """
+    Xóa mọi file *.part ứng với mẫu [<id>] để tránh resume sai → 416.
+    (Tên chuẩn từ _ydl_opts: ... [%(id)s].%(ext)s)
+    """
+    if not video_id:
+        return
+    patt = f"*[{video_id}].*.part"
+    for p in out_dir.glob(patt):
+        try:
+            p.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+def _is_valid_netscape_cookie(p: Path) -> bool:
+    """Kiểm tra xem file có đúng định dạng Netscape cookie hay không."""
+    if not p or not p.exists() or not p.is_file():
+        return False
+    try:
+        if p.stat().st_size == 0:
+            return False
+        with open(p, "r", encoding="utf-8", errors="ignore") as f:
+            first_line = f.readline()
+            # File Netscape cookie chuẩn luôn bắt đầu bằng # Netscape HTTP Cookie File
+            return "# Netscape HTTP Cookie File" in first_line
+    except Exception:
+        return False
+
+def _sanitize_yt_watch_url(u: str) -> str:
+    """
+    Làm sạch tham số thời gian (&t=, ?t=, &start=, &time_continue=, &si=...) khỏi URL YouTube.
+    Giữ nguyên các tham số còn lại.
+    """
+    if not u:
+        return u
+    try:
+        from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+        p = urlparse(u)
+        host = (p.netloc or "").lower()
+        path = p.path or ""
+
+        # Chỉ xử lý YouTube
+        if ("youtube.com" in host and "/watch" in path) or ("youtu.be" in host):
+            # youtu.be/<id>?t=123  → đổi sang dạng /watch?v=<id>
+            if "youtu.be" in host:
+                video_id = path.strip("/").split("/")[0] if path.strip("/") else ""
+                if video_id:
+                    # chuyển sang watch URL chuẩn
+                    q = dict(parse_qsl(p.query, keep_blank_values=True))
+                    q["v"] = video_id
+                    # bỏ các tham số thời gian
+                    for k in ("t", "start", "time_continue", "si"):
+                        q.pop(k, None)
+                    new_query = urlencode(q, doseq=True)
+                    return urlunparse(("https", "www.youtube.com", "/watch", "", new_query, ""))
+
+            # youtube.com/watch?...  → giữ lại mọi tham số trừ thời gian
+            q = dict(parse_qsl(p.query, keep_blank_values=True))
+            for k in ("t", "start", "time_continue", "si"):
+                q.pop(k, None)
+            new_query = urlencode(q, doseq=True)
+            return urlunparse((p.scheme or "https", p.netloc, p.path, p.params, new_query, p.fragment))
+    except Exception:
+        # có lỗi thì trả về nguyên URL
+        return u
+    return u
+
+QUALITY_OPTIONS = ["1080p", "720p", "480p", "360p"]
+
+def detect_platform(url: str) -> str:
+    u = (url or "").lower()
+    if "tiktok.com" in u: return "tt"
+    if "instagram.com" in u: return "ig"
+    if "facebook.com" in u or "fb.watch" in u: return "fb"
+    if "youtube.com" in u or "youtu.be" in u: return "yt"
+    if "dailymotion.com" in u or "dai.ly" in u: return "dm"
+    if ("reddit.com" in u) or ("v.redd.it" in u) or ("old.reddit.com" in u) or ("redd.it" in u): return "rd"
+    return "other"
+
+def build_format(quality: str, platform: str = "any") -> str:
+    """
+    Chọn format linh hoạt với fallback để tránh lỗi "format not available".
+    """
+    if quality == "Best":
+        return (
+            "bestvideo+bestaudio[acodec^=mp4a]/"
+            "bestvideo+bestaudio/"
+            "best"
+        )
+
+    h = {"1080p": 1080, "720p": 720, "480p": 480, "360p": 360}.get(quality, 0)
+    if h:
+        # ✅ Flexible format with fallbacks - tránh fail khi không có đúng độ phân giải
+        return (
+            f"bv[height<={h}]+ba/"
+            f"bv*[height<={h}]+ba/"
+            "bestvideo+bestaudio/"
+            "best"
+        )
+
+    return "bestvideo+bestaudio/best"
+
+
+
+def split_urls(text: str):
+    urls = []
+    for line in re.split(r"[\r\n\s]+", (text or "").strip()):
+        if line and line.startswith("http"):
+            urls.append(line)
+    return urls
+
+# ---- Nhận diện/mở rộng kênh/playlist thành danh sách video (explode) ----
+_YDL_EXPAND_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "extract_flat": True,      # lấy danh sách nhanh, không tải metadata nặng
+    "noplaylist": False,
+    "lazy_playlist": True,     # entries là generator: trang kế tiếp chỉ tải khi duyệt tới
+    # ✅ TV Embedded không cần PO Token
+    "extractor_args": {
+        "youtube": {
+            "player_client": ["tv_embedded", "android_vr", "mweb"],
+            "player_skip": ["android", "ios", "web_creator", "mediaconnect", "tv", "web"]
+        }
+    }
+}
+
+YOUTUBE_WATCH = "https://www.youtube.com/watch?v="
+
+PLAYLIST_ID_RE = re.compile(r"[?&]list=([A-Za-z0-9_\-]+)")
+
+def canonicalize_playlist_url(u: str) -> str:
+    """Chuẩn hoá URL playlist YouTube. Nền tảng khác trả nguyên."""
+    if not u:
+        return u
+    lu = u.lower()
+    if ("youtube.com" in lu) or ("youtu.be" in lu):
+        m = PLAYLIST_ID_RE.search(u)
+        if m:
+            pid = m.group(1)
+            return f"https://www.youtube.com/playlist?list={pid}"
+    return u
+
+def canonicalize_channel_url(u: str) -> str:
+    """
+    Đưa link kênh YouTube về tab /videos; KHÔNG đụng vào URL video
+    và KHÔNG áp dụng cho TikTok/Instagram/Facebook.
+    """
+    if not u:
+        return u
+    lu = u.lower()
+
+    # Chỉ xử lý YouTube
+    if ("youtube.com" in lu) or ("youtu.be" in lu):
+        # Nếu là video watch thì giữ nguyên
+        if "/watch" in lu:
+            return u
+        # Nếu là dạng kênh/slug thì thêm /videos
+        if ("/channel/" in lu) or ("/user/" in lu) or ("/c/" in lu) or ("/@" in lu):
+            return u.rstrip("/") + "/videos"
+    return u
+
+def _normalize_video_url(entry: Dict[str, Any]) -> str:
+    if not entry: return ""
+    u = entry.get("url") or ""
+    vid = entry.get("id") or ""
+    if u.startswith("http"): return u
+    if vid: return f"{YOUTUBE_WATCH}{vid}"
+    return u
+
+def _flatten_entries(node: Dict[str, Any]) -> List[str]:
+    out = []
+    if not node: return out
+    if "entries" in node and isinstance(node["entries"], list):
+        for e in node["entries"]:
+            if isinstance(e, dict) and "entries" in e:
+                out.extend(_flatten_entries(e))
+            elif isinstance(e, dict):
+                u = _normalize_video_url(e)
+                if u: out.append(u)
+    else:
+        u = _normalize_video_url(node)
+        if u: out.append(u)
+    return out
+
+def looks_like_playlist_or_channel(u: str) -> bool:
+    """Chỉ coi là playlist/kênh nếu là YouTube."""
+    if not u:
+        return False
+    lu = u.lower()
+    if ("youtube.com" in lu) or ("youtu.be" in lu):
+        # playlist id
+        if "list=" in lu or "/playlist" in lu:
+            return True
+        # các kiểu kênh/slug YouTube
+        if ("/channel/" in lu) or ("/user/" in lu) or ("/c/" in lu) or ("/@" in lu):
+            # đừng nhầm video YouTube (/watch?v=) là kênh
+            if "/watch" in lu:
+                return False
+            return True
+    # TikTok/IG/FB/...: KHÔNG explode
+    return False
+
+# ---- Key (platform, id) offline: cache metadata, kho đã tải, chống trùng hàng đợi ----
+_YT_VIDEO_ID_RE = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/|/e/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])")
+_TT_VIDEO_ID_RE = re.compile(r"/(?:video|photo|v)/(\d+)")
+_IG_SHORTCODE_RE = re.compile(r"instagram\.com/(?:[^/]+/)?(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)")
+_FB_VIDEO_ID_RE = re.compile(r"(?:/videos/(?:[^/?#]+/)?|/reel/|[?&]v=|fb\.watch/)([A-Za-z0-9_-]+)")
+_DM_VIDEO_ID_RE = re.compile(r"(?:/video/|dai\.ly/)([a-zA-Z0-9]+)")
+_RD_POST_ID_RE = re.compile(r"(?:/comments/|v\.redd\.it/|redd\.it/)([a-z0-9]+)", re.I)
+_MEDIA_ID_RES = {"yt": _YT_VIDEO_ID_RE, "tt": _TT_VIDEO_ID_RE, "ig": _IG_SHORTCODE_RE,
+                 "fb": _FB_VIDEO_ID_RE, "dm": _DM_VIDEO_ID_RE, "rd": _RD_POST_ID_RE}
+
+# tham số chỉ để theo dõi/chia sẻ — bỏ khi chuẩn hoá URL
+_TRACKING_PARAMS = frozenset({
+    "si", "feature", "pp", "ab_channel", "fbclid", "gclid", "igshid", "igsh", "mibextid",
+    "ref_src", "share_id", "is_from_webapp", "sender_device", "sender_web_id",
+})
+
+
+def canonical_url(url: str) -> str:
+    """
+    URL chuẩn hoá offline: https, host thường (bỏ www./m.), bỏ fragment + tham số theo dõi
+    (utm_*, si, fbclid...), sắp xếp tham số còn lại → mọi cách viết của 1 link ra cùng chuỗi.
+    """
+    from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+    try:
+        p = urlsplit((url or "").strip())
+    except ValueError:
+        return (url or "").strip()
+    host = (p.hostname or "").lower()
+    for pre in ("www.", "m.", "mobile."):
+        if host.startswith(pre):
+            host = host[len(pre):]
+            break
+    query = sorted((k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+                   if k not in _TRACKING_PARAMS and not k.startswith("utm_"))
+    path = p.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def media_key(url: str) -> tuple[str, str] | None:
+    """
+    (platform, id) của 1 video, suy ra từ URL không cần mạng — youtu.be/ID, watch?v=ID&si=...,
+    /shorts/ID, /embed/ID... đều ra ("yt", ID). Không nhận ra id → (platform, canonical_url).
+    """
+    if not url:
+        return None
+    platform = detect_platform(url)
+    rx = _MEDIA_ID_RES.get(platform)
+    m = rx.search(url) if rx else None
+    return (platform, m.group(1)) if m else (platform, canonical_url(url))
+
+
+def identity_key(url: str) -> tuple[str, str] | None:
+    """Khoá chống trùng trong hàng đợi: playlist/kênh theo collection_key, video theo media_key."""
+    return collection_key(url) or media_key(url)
+
+def collection_key(url: str) -> tuple[str, str] | None:
+    """(platform, id) của playlist/kênh YouTube (list=<id> hoặc đường dẫn kênh)."""
+    if not looks_like_playlist_or_channel(url):
+        return None
+    m = PLAYLIST_ID_RE.search(url)
+    if m:
+        return ("yt", f"list:{m.group(1)}")
+    from urllib.parse import urlparse
+    path = (urlparse(url).path or "").rstrip("/").lower()
+    return ("yt", f"channel:{path}") if path else None
+
+METADATA = MetaCache(USER_DATA_DIR / "metadata.sqlite3")
+ARCHIVE = DownloadArchive(USER_DATA_DIR / "archive.sqlite3")
+
+
+def find_archived(urls: Iterable[str]) -> Dict[str, ArchiveEntry]:
+    """URL → bản đã tải ở phiên trước (ARCHIVE), tra cả lô theo media_key — không gọi mạng."""
+    keys = {u: media_key(u) for u in urls}
+    found = ARCHIVE.lookup_many(k for k in keys.values() if k)
+    return {u: found[k] for u, k in keys.items() if k in found}
+
+
+def forget_unavailable(urls: Iterable[str]):
+    """Xoá dấu 'unavailable' (METADATA) của các URL → lần tải sau gọi mạng kiểm tra lại (Retry Fail / thêm lại)."""
+    for u in urls:
+        key = media_key(u)
+        if key:
+            METADATA.delete(*key, "unavailable")
+
+
+def safe_filename(base: str) -> str:
+    return re.sub(r'[\\/:*?"<>|]+', "_", base)
+
+def get_video_title(url: str) -> str | None:
+    """
+    Lấy title từ YouTube video URL. Trả về None nếu không lấy được.
+    """
+    try:
+        from urllib.parse import urlparse
+        host = (urlparse(url or "").netloc or "").lower()
+        is_yt = ("youtube.com" in host) or ("youtu.be" in host)
+        if not is_yt:
+            return None
+        
+        # Sanitize URL trước khi lấy title
+        url = _sanitize_yt_watch_url(url)
+
+        # ✅ Cache trên đĩa: import lại cùng Sheet/list → không cần gọi mạng
+        key = media_key(url)
+        if key:
+            cached = METADATA.get(*key, "title")
+            if cached:
+                return cached
+        
+        opts = {
+            "quiet": True,
+            "skip_download": True,
+            "extractor_args": {
+                "youtube": {
+                    "player_client": ["tv_embedded", "android_vr", "mweb"],
+                    "player_skip": ["android", "ios", "web_creator", "tv", "web", "mediaconnect"]
+                }
+            }
+        }
+        with _ydl(opts) as ydl:
+            # process=False: chỉ cần metadata, bỏ bước chọn format
+            info = ydl.extract_info(url, download=False, process=False)
+            if info and isinstance(info, dict):
+                if key:
+                    METADATA.put_info(*key, info)
+                return info.get("title")
+    except Exception:
+        pass
+    return None
+
+def _iter_entry_urls(node: Dict[str, Any], cancelled: Callable[[], bool]) -> Iterator[str]:
+    """Như _flatten_entries nhưng duyệt lười: entries của yt-dlp (process=False) tải từng trang khi lặp tới."""
+    if not node:
+        return
+    entries = node.get("entries")
+    if entries is None:
+        u = _normalize_video_url(node)
+        if u: yield u
+        return
+    for e in entries:
+        if cancelled():
+            return
+        if isinstance(e, dict) and "entries" in e:
+            yield from _iter_entry_urls(e, cancelled)
+        elif isinstance(e, dict):
+            u = _normalize_video_url(e)
+            if u: yield u
+
+def iter_collection_videos(u: str, cancelled: Callable[[], bool] | None = None,
+                           page_size: int = 30) -> Iterator[List[str]]:
+    """
+    Expand playlist/kênh YouTube theo từng trang: yield list URL video (đã bỏ trùng) ngay khi có,
+    không đợi tải hết kênh. Nền tảng khác / Mix / lỗi trước khi có video → yield [u].
+    cancelled() trả True → dừng ở entry kế tiếp. Chỉ lưu cache khi đã duyệt hết danh sách.
+    """
+    cancelled = cancelled or (lambda: False)
+    if not looks_like_playlist_or_channel(u):
+        yield [u]
+        return
+
+    # ✅ Skip YouTube Mix/Radio playlists (RD..., RDMM..., RDAO..., etc.)
+    # Những playlist này do YouTube tạo tự động và không thể expand → trả về URL gốc
+    if "list=" in u and re.search(r"[?&]list=(RD[A-Za-z0-9_\-]+)", u):
+        yield [u]
+        return
+
+    # Lúc này chắc chắn là YouTube
+    if "list=" in u or "/playlist" in u:
+        u = canonicalize_playlist_url(u)
+    else:
+        u = canonicalize_channel_url(u)
+
+    key = collection_key(u)
+    if key:
+        cached = METADATA.get(*key, "playlist")
+        if cached:
+            yield cached
+            return
+
+    seen: List[str] = []
+    seen_set, page = set(), []
+    done = False
+    try:
+        with _ydl(_YDL_EXPAND_OPTS) as ydl:
+            info = ydl.extract_info(u, download=False, process=False)
+            if info:
+                for v in _iter_entry_urls(info, cancelled):
+                    if v in seen_set:
+                        continue
+                    seen_set.add(v); seen.append(v); page.append(v)
+                    if len(page) >= page_size:
+                        yield page
+                        page = []
+                done = not cancelled()
+    except Exception:
+        pass
+    if page:
+        yield page
+    if not seen:
+        if not cancelled():
+            yield [u]
+    elif done and key:
+        METADATA.put(*key, "playlist", seen)
+
+def expand_url_to_videos(u: str) -> List[str]:
+    """
+    Chỉ expand playlist/kênh cho YouTube. Nền tảng khác trả [u].
+    Chặn tới khi có đủ danh sách — cần video sớm thì dùng iter_collection_videos.
+    """
+    try:
+        return [v for page in iter_collection_videos(u) for v in page]
+    except Exception:
+        return [u]
+def extract_urls_from_text(text: str) -> list[str]:
+    if not text: return []
+    urls = []
+    for part in re.split(r"[ \t]+", text.strip()):
+        if part.startswith("http://") or part.startswith("https://"):
+            urls.append(part)
+    return urls
+
+def parse_cell_content(cell: str):
+    """
+    Trả về (regular_urls, preventive_urls, sound_urls).
+    Nhận diện 'link dự phòng', 'original_sound'/'original sound'.
+    """
+    regular, preventive, sound = [], [], []
+    if not cell: return regular, preventive, sound
+    lines = [ln.strip() for ln in re.split(r"[\r\n]+", cell) if ln.strip()]
+    in_prev = in_sound = False
+    for ln in lines:
+        lower = ln.lower()
+        if "link dự phòng" in lower:
+            in_prev, in_sound = True, False
+            preventive += extract_urls_from_text(ln)
+            continue
+        if "original_sound" in lower or "original sound" in lower:
+            in_sound, in_prev = True, False
+            sound += extract_urls_from_text(ln)
+            continue
+
+        urls = extract_urls_from_text(ln)
+        if in_prev: preventive += urls
+        elif in_sound: sound += urls
+        else: regular += urls
+    return regular, preventive, sound
+
+_SUPPORTED = (
+    "youtube.com","youtu.be",
+    "instagram.com",
+    "facebook.com","fb.watch",
+    "tiktok.com",
+    "x.com","twitter.com",
+    "dailymotion.com","dai.ly",
+    "reddit.com","v.redd.it","old.reddit.com","redd.it"
+)
+def is_valid_video_url(u: str) -> bool:
+    if not u or not (u.startswith("http://") or u.startswith("https://")): return False
+    return any(dom in u.lower() for dom in _SUPPORTED)
+
+# ------------------------ Title prefetch nền (giới hạn theo host) ------------------------
+class TitlePrefetcher:
+    """
+    Lấy title cho nhiều URL ở nền: tối đa `max_workers` thread, mỗi host (mã detect_platform)
+    tối đa `per_host` request cùng lúc. Task của host đã đủ slot được bỏ qua để thread lấy task
+    host khác, không chặn cả hàng. Kết quả trả qua callback on_done(url, title|None) — gọi từ thread nền.
+    """
+
+    def __init__(self, max_workers: int = 8, per_host: int = 4,
+                 resolver: Callable[[str], str | None] | None = None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.resolver = resolver or get_video_title
+        self._cond = threading.Condition()
+        self._tasks: deque = deque()               # (host, url, on_done)
+        self._busy: Dict[str, int] = {}            # host -> số request đang chạy
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+
+    def submit(self, url: str, on_done: Callable[[str, str | None], None]):
+        with self._cond:
+            self._tasks.append((detect_platform(url), url, on_done))
+            if len(self._tasks) > self._idle and len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._loop, name=f"title-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+
+    def cancel_pending(self):
+        """Bỏ các URL chưa bắt đầu lấy (vd: bảng vừa bị Clear)."""
+        with self._cond:
+            self._tasks.clear()
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._tasks) + sum(self._busy.values())
+
+    def _take(self):
+        for i, (host, url, cb) in enumerate(self._tasks):
+            if self._busy.get(host, 0) < self.per_host:
+                del self._tasks[i]
+                self._busy[host] = self._busy.get(host, 0) + 1
+                return host, url, cb
+        return None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                task = self._take()
+                while task is None:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    task = self._take()
+            host, url, cb = task
+            try:
+                title = self.resolver(url)
+            except Exception:
+                title = None
+            with self._cond:
+                self._busy[host] -= 1
+                self._cond.notify_all()
+            try:
+                cb(url, title)
+            except Exception:
+                pass
+
+# ------------------------ Expand playlist/kênh nền (từng trang) ------------------------
+class PlaylistExpander:
+    """
+    Expand playlist/kênh ở nền bằng iter_collection_videos: tối đa `max_workers` URL cùng lúc.
+    Mỗi trang video trả qua on_page(urls) ngay khi có, xong cả URL gọi on_done(số video) —
+    cả hai gọi từ thread nền. cancel() bỏ hàng đợi và dừng các URL đang expand ở entry kế tiếp.
+    """
+
+    def __init__(self, max_workers: int = 1, page_size: int = 30):
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self._cond = threading.Condition()
+        self._tasks: deque = deque()               # (gen, url, on_page, on_done)
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+        self._running = 0
+        self._gen = 0                              # tăng khi cancel() → task cũ tự dừng
+
+    def submit(self, url: str, on_page: Callable[[List[str]], None],
+               on_done: Callable[[int], None] | None = None):
+        with self._cond:
+            self._tasks.append((self._gen, url, on_page, on_done))
+            if len(self._tasks) > self._idle and len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._loop, name=f"expand-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._gen += 1
+            self._tasks.clear()
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._tasks) + self._running
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                gen, url, on_page, on_done = self._tasks.popleft()
+                self._running += 1
+            cancelled = lambda: gen != self._gen
+            count = 0
+            try:
+                for page in iter_collection_videos(url, cancelled, self.page_size):
+                    if cancelled():
+                        break
+                    count += len(page)
+                    on_page(page)
+            except Exception:
+                pass
+            with self._cond:
+                self._running -= 1
+            if on_done is not None and not cancelled():
+                try:
+                    on_done(count)
+                except Exception:
+                    pass
+
+# ------------------------ FFmpeg capability registry ------------------------
+def _which_ffmpeg() -> str | None:
+    # ✅ Tìm ffmpeg ở nhiều vị trí, bao gồm subdirectory ffmpeg/
+    from shutil import which
+    search_paths = [
+        APP_DIR / "ffmpeg.exe",                    # ffmpeg.exe trong APP_DIR
+        APP_DIR / "ffmpeg",                         # ffmpeg trong APP_DIR
+        APP_DIR / "ffmpeg" / "ffmpeg.exe",          # ffmpeg.exe trong APP_DIR/ffmpeg/
+        APP_DIR / "ffmpeg" / "ffmpeg",              # ffmpeg trong APP_DIR/ffmpeg/
+        Path(sys.executable).parent / "ffmpeg.exe", # ffmpeg.exe trong thư mục Python
+        Path(sys.executable).parent / "ffmpeg",     # ffmpeg trong thư mục Python
+    ]
+    for p in search_paths:
+        if Path(p).exists():
+            return str(p)
+    # Cuối cùng, thử tìm trong PATH
+    return which("ffmpeg")
+
+def _resolve_ffmpeg_exe(path: str | None) -> str | None:
+    """Đưa path (file / thư mục / thiếu .exe trên Windows) về file thực thi ffmpeg, hoặc None."""
+    if not path:
+        return None
+    p = Path(path)
+    if p.is_dir():
+        for exe_name in ("ffmpeg.exe", "ffmpeg"):
+            exe_path = p / exe_name
+            if exe_path.exists() and exe_path.is_file():
+                return str(exe_path)
+        return None
+    if not p.is_file():
+        return None
+    # Trên Windows, nếu không có extension, thử thêm .exe
+    if sys.platform == "win32" and not path.lower().endswith((".exe", ".bat", ".cmd")):
+        exe_path = p.parent / f"{p.name}.exe"
+        return str(exe_path) if exe_path.exists() else None
+    return str(p)
+
+def _run_quiet(args: List[str], timeout: float = 10) -> str | None:
+    """Chạy lệnh ngắn, trả stdout (None nếu lỗi). Không bật cửa sổ console trên Windows."""
+    import subprocess
+    try:
+        result = subprocess.run(
+            args,
+            capture_output=True,
+            text=True,
+            errors="ignore",
+            timeout=timeout,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        )
+        return result.stdout if result.returncode == 0 else None
+    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+        return None
+
+def _parse_ffmpeg_list(text: str, flag_cols: int) -> frozenset:
+    """Parse output `ffmpeg -encoders` / `-muxers`: dòng ' <cờ> <tên> <mô tả>' sau dấu ' --'."""
+    names, started = set(), False
+    for line in (text or "").splitlines():
+        if not started:
+            started = line.strip().startswith("--")
+            continue
+        parts = line.split()
+        if len(parts) > flag_cols:
+            # muxers có thể là "mov,mp4,m4a,3gp" → tách từng tên
+            names.update(parts[flag_cols].split(","))
+    return frozenset(names)
+
+
+class FFmpegCaps(NamedTuple):
+    path: str | None
+    ok: bool
+    version: str = ""
+    ffprobe: str | None = None
+    encoders: frozenset = frozenset()
+    muxers: frozenset = frozenset()
+    mtime: float = 0.0
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+
+class FFmpegRegistry:
+    """
+    Probe ffmpeg/ffprobe MỘT lần cho cả process (thay vì mỗi lần _ydl_opts → which + `ffmpeg -version`).
+    - warm(): probe nền lúc khởi động; get() chờ probe đang chạy rồi trả kết quả cache.
+    - Tự probe lại khi mtime file ffmpeg đổi / file biến mất; nếu chưa tìm thấy thì
+      thử tìm lại tối đa mỗi `rescan_s` giây (để copy ffmpeg vào là dùng được, không cần mở lại app).
+    """
+
+    def __init__(self, rescan_s: float = 60.0):
+        self.rescan_s = rescan_s
+        self._lock = threading.Lock()
+        self._caps: FFmpegCaps | None = None
+        self._checked_at = 0.0
+
+    def warm(self):
+        threading.Thread(target=self.get, name="ffmpeg-probe", daemon=True).start()
+
+    def invalidate(self):
+        with self._lock:
+            self._caps = None
+
+    def _stale(self, caps: FFmpegCaps) -> bool:
+        if not caps.ok:
+            return (time.time() - self._checked_at) > self.rescan_s
+        try:
+            return os.stat(caps.path).st_mtime != caps.mtime
+        except OSError:
+            return True
+
+    def get(self) -> FFmpegCaps:
+        with self._lock:
+            if self._caps is None or self._stale(self._caps):
+                self._caps = self._probe()
+                self._checked_at = time.time()
+            return self._caps
+
+    @staticmethod
+    def _probe() -> FFmpegCaps:
+        exe = _resolve_ffmpeg_exe(_which_ffmpeg())
+        out = _run_quiet([exe, "-hide_banner", "-version"]) if exe else None
+        if out is None:
+            logging.getLogger("app").warning("FFmpeg not found/not runnable → merge/convert disabled")
+            return FFmpegCaps(exe, False)
+        first = out.splitlines()[0] if out else ""
+        m = re.search(r"ffmpeg version (\S+)", first)
+        version = m.group(1) if m else first.strip()
+        encoders = _parse_ffmpeg_list(_run_quiet([exe, "-hide_banner", "-encoders"]) or "", 1)
+        muxers = _parse_ffmpeg_list(_run_quiet([exe, "-hide_banner", "-muxers"]) or "", 1)
+
+        from shutil import which
+        ffprobe = None
+        for name in ("ffprobe.exe", "ffprobe"):
+            cand = Path(exe).parent / name
+            if cand.is_file():
+                ffprobe = str(cand); break
+        ffprobe = ffprobe or which("ffprobe")
+
+        try: mtime = os.stat(exe).st_mtime
+        except OSError: mtime = 0.0
+        logging.getLogger("app").info(
+            f"🔍 FFmpeg {version}: {exe} (ffprobe: {ffprobe or 'none'}, "
+            f"{len(encoders)} encoders, {len(muxers)} muxers)")
+        return FFmpegCaps(exe, True, version, ffprobe, encoders, muxers, mtime)
+
+
+FFMPEG = FFmpegRegistry()
+
+# ------------------------ Cache extract_info theo URL ------------------------
+def _is_media_url_error(err: Exception) -> bool:
+    """403/404/410 khi tải thường là link media trong info đã chết → cần extract lại."""
+    msg = repr(err).lower()
+    return any(k in msg for k in ("http error 403", "http error 404", "http error 410", "forbidden"))
+
+
+class InfoCache:
+    """
+    Cache info dict (extract_info(process=False)) theo (URL, cấu hình extract) cho cả process.
+    Lần tải chính + các nhánh retry + auto-retry của Scheduler dùng lại trong khi link media
+    còn hạn (tham số `expire=` của YouTube, nếu không có thì `default_ttl`).
+    Nhánh retry đổi extractor_args/cookie/generic → key khác → extract lại.
+    """
+
+    # các option ảnh hưởng tới kết quả extract (format/outtmpl/postprocessor thì không)
+    _KEY_OPTS = ("extractor_args", "cookiefile", "force_generic_extractor", "http_headers", "geo_bypass_country")
+
+    def __init__(self, default_ttl: float = 300.0, margin: float = 60.0, max_items: int = 512):
+        from collections import OrderedDict
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+
+    @classmethod
+    def _key(cls, url: str, opts: dict) -> tuple:
+        cfg = json.dumps({k: opts.get(k) for k in cls._KEY_OPTS}, sort_keys=True, default=str)
+        return (url, cfg)
+
+    def _expires_at(self, info: dict) -> float:
+        from urllib.parse import urlparse, parse_qs
+        now = time.time()
+        exp = None
+        for f in (info.get("formats") or []):
+            q = parse_qs(urlparse(f.get("url") or "").query)
+            try:
+                v = int((q.get("expire") or [0])[0])
+            except ValueError:
+                v = 0
+            if v and (exp is None or v < exp):
+                exp = v
+        return (exp - self.margin) if exp else (now + self.default_ttl)
+
+    def get(self, url: str, opts: dict) -> dict | None:
+        key = self._key(url, opts)
+        with self._lock:
+            item = self._items.get(key)
+            if not item:
+                return None
+            if item[0] <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, url: str, opts: dict, info: dict):
+        exp = self._expires_at(info)
+        if exp <= time.time():
+            return
+        with self._lock:
+            self._items[self._key(url, opts)] = (exp, info)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def drop(self, url: str):
+        with self._lock:
+            for k in [k for k in self._items if k[0] == url]:
+                del self._items[k]
+
+
+INFO_CACHE = InfoCache()
+
+# ------------------------ Ngân sách băng thông chung ------------------------
+_RATE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_rate(text: str | float | None) -> float:
+    """'5M' / '800k' / '1.5m' / 2000000 → bytes/s. Rỗng, '0', 'off' → 0 (không giới hạn)."""
+    if text is None:
+        return 0.0
+    if isinstance(text, (int, float)):
+        return max(0.0, float(text))
+    t = str(text).strip().lower().removesuffix("/s").removesuffix("b")
+    if t in ("", "0", "off", "none", "unlimited"):
+        return 0.0
+    m = re.fullmatch(r"([\d.]+)\s*([kmg]?)", t)
+    if not m:
+        raise ValueError(f"Bad rate: {text!r}")
+    return float(m.group(1)) * _RATE_UNITS[m.group(2)]
+
+
+def parse_schedule(text: str | None) -> list[tuple[int, int, float]]:
+    """
+    '08:00-18:00=2M; 18:00-08:00=0' → [(480, 1080, 2097152.0), (1080, 480, 0.0)]
+    (phút trong ngày; khoảng qua nửa đêm được phép, rate 0 = không giới hạn).
+    """
+    out = []
+    for part in re.split(r"[;,\n]+", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        m = re.fullmatch(r"(\d{1,2})(?::(\d\d))?\s*-\s*(\d{1,2})(?::(\d\d))?\s*=\s*(\S+)", part)
+        if not m:
+            raise ValueError(f"Bad schedule entry: {part!r}")
+        h1, m1, h2, m2, rate = m.groups()
+        out.append(((int(h1) * 60 + int(m1 or 0)) % 1440,
+                    (int(h2) * 60 + int(m2 or 0)) % 1440,
+                    parse_rate(rate)))
+    return out
+
+
+class BandwidthGovernor:
+    """
+    Giới hạn tổng bytes/s cho MỌI job đang tải (không phải ratelimit tĩnh từng job).
+    - Một token bucket dùng chung: hook tiến độ của mỗi job báo số byte vừa nhận (consume),
+      job nào vượt ngân sách thì ngủ trong hook → TCP tự chậm lại.
+    - Nợ token chia theo thứ tự đến → các job đang tải chia đều băng thông; chỉ còn 1 job
+      thì nó dùng hết, job mới vào/ra là tự cân bằng lại, không để thừa băng thông.
+    - Lịch theo giờ (schedule) ưu tiên hơn `rate`; ngoài mọi khung giờ thì dùng `rate`.
+    - ProcessPool: bucket nằm trong shared memory (to_shared/attach) → vẫn 1 ngân sách cho mọi process.
+    ⚠️ Không đặt params['ratelimit'] của yt-dlp: slow_down() tính theo tốc độ trung bình
+       từ đầu file → hạ limit giữa chừng có thể làm job đứng im vài phút.
+    """
+
+    BURST_S = 1.0   # tối đa tích luỹ 1 giây token khi rảnh
+
+    def __init__(self, rate: float = 0.0, schedule: list[tuple[int, int, float]] | None = None):
+        self.schedule = schedule or []
+        self._lock = threading.Lock()
+        self._cell = [0.0, time.monotonic(), float(rate)]   # tokens, stamp, rate
+        self._active = 0
+
+    @property
+    def rate(self) -> float:
+        return self._cell[2]
+
+    def configure(self, rate: float | None = None, schedule: list[tuple[int, int, float]] | None = None):
+        with self._lock:
+            if rate is not None:
+                self._cell[2] = max(0.0, float(rate))
+            if schedule is not None:
+                self.schedule = list(schedule)
+            self._cell[0] = min(self._cell[0], 0.0)
+
+    def to_shared(self, ctx) -> tuple:
+        """Chuyển bucket vào shared memory của multiprocessing context `ctx`; trả state cho attach()."""
+        with self._lock:
+            lock = ctx.Lock()
+            cell = ctx.Array("d", list(self._cell), lock=False)
+            self._lock, self._cell = lock, cell
+        return lock, cell, self.schedule
+
+    def attach(self, state: tuple):
+        """(process con) dùng chung bucket đã to_shared() ở process cha."""
+        self._lock, self._cell, self.schedule = state[0], state[1], list(state[2])
+
+    def current_rate(self, now: float | None = None) -> float:
+        """bytes/s đang áp dụng (0 = không giới hạn)."""
+        if self.schedule:
+            lt = time.localtime(now)
+            minute = lt.tm_hour * 60 + lt.tm_min
+            for start, end, rate in self.schedule:
+                inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+                if inside:
+                    return rate
+        return self.rate
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def register(self):
+        with self._lock:
+            self._active += 1
+
+    def unregister(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    def share(self) -> float:
+        """Phần trung bình của mỗi job đang tải (bytes/s, 0 = không giới hạn) — để hiển thị."""
+        rate = self.current_rate()
+        return rate / max(1, self._active) if rate > 0 else 0.0
+
+    def consume(self, nbytes: int, cancelled: Callable[[], bool] | None = None):
+        """Trừ nbytes khỏi ngân sách chung; ngủ cho tới khi trả hết nợ (thoát sớm nếu cancelled())."""
+        rate = self.current_rate()
+        if rate <= 0 or nbytes <= 0:
+            return
+        with self._lock:
+            cell = self._cell
+            now = time.monotonic()
+            tokens = min(rate * self.BURST_S, cell[0] + (now - cell[1]) * rate) - nbytes
+            cell[0], cell[1] = tokens, now
+            wait = -tokens / rate if tokens < 0 else 0.0
+        deadline = time.monotonic() + wait
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0 or (cancelled and cancelled()):
+                return
+            time.sleep(min(left, 0.2))
+
+
+BANDWIDTH = BandwidthGovernor()
+
+# ------------------------ Job tải đơn (không Qt) ------------------------
+class DownloadJob:
+    """
+    Một lượt tải (gồm cả chuỗi retry) cho 1 URL. Không phụ thuộc Qt:
+    tiến độ/trạng thái/log đẩy ra qua callback, kết quả trả về từ run().
+    GUI chạy job trên WorkerPool/ProcessPool (qua DownloadWorker); headless gọi trực tiếp.
+    """
+
+    def __init__(self, row: int, url: str, out_dir: Path, fmt: str,
+                 filename_base: str | None = None,
+                 per_folder: bool = False,
+                 from_collection: bool = False,
+                 audio_only: bool = False,
+                 convert_av1: bool = False,
+                 on_progress: Callable[[int], None] | None = None,
+                 on_status: Callable[[str], None] | None = None,
+                 on_log: Callable[[str], None] | None = None):
+        self.row = row
+        self.url = url
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.filename_base = filename_base
+        self.per_folder = per_folder
+        self.from_collection = from_collection
+        self.audio_only = audio_only
+        self.convert_av1 = convert_av1
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_log = on_log
+        self.last_status = ""
+        self.error_class = ""   # loại lỗi cuối (classify_error) khi job thất bại
+        self.throttled = False  # có lần nào bị host chặn/giới hạn (429/403) → Scheduler giảm nhịp
+        self.video_id = ""
+        self.output_files: List[str] = []   # file yt-dlp đã ghi xong (post_hooks)
+        self._pause_evt = threading.Event(); self._pause_evt.set()
+        self._stop_flag = False
+        self._was_paused = False
+        self.warm: WarmState | None = None   # WorkerPool gắn vào khi job chạy trên thread sống lâu
+        self._bw_registered = False
+        self._bw_seen: tuple[str | None, int] = (None, 0)
+
+    # ---- callback ra ngoài (GUI: emit signal; headless: ghi log/JSONL) ----
+    def _progress(self, pct: int):
+        if self.on_progress:
+            self.on_progress(pct)
+
+    def _status(self, text: str):
+        self.last_status = text
+        if self.on_status:
+            self.on_status(text)
+
+    def _log(self, msg: str):
+        if self.on_log:
+            self.on_log(msg)
+
+    def pause(self):
+        """Tạm dừng tiến trình tải (giữ kết nối, đứng trong hook)."""
+        self._pause_evt.clear()
+        try:
+            self._status("Paused")
+        except Exception:
+            pass
+
+    def resume(self):
+        """Tiếp tục sau khi pause."""
+        self._pause_evt.set()
+        try:
+            self._status("Downloading")
+        except Exception:
+            pass
+
+    def stop(self):
+        """Hủy job đang chạy (sẽ raise trong hook)."""
+        self._stop_flag = True
+        # nếu đang pause, cho thoát khỏi vòng chờ ngay
+        self._pause_evt.set()
+        try:
+            self._status("Canceling…")
+        except Exception:
+            pass
+
+    class _YTDLPLogger:
+        # có logger thì yt-dlp đẩy mọi dòng to_screen vào debug kể cả khi quiet → bỏ, giữ warning/error
+        def __init__(self, outer): self.outer = outer
+        def debug(self, msg):  pass
+        def warning(self, msg): self.outer._log(f"[{self.outer.row}] WARNING: {msg}")
+        def error(self, msg):  self.outer._log(f"[{self.outer.row}] {msg}")   # yt-dlp đã có "ERROR: "
+    UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+          "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+
+    def _ydl_opts(self):
+        """
+        - per_folder=True: ghi vào subfolder cho từng item (video + thumbnail cùng chỗ)
+        - convert_av1=True: re-encode video → H.264 (libx264). Tắt → giữ nguyên video (copy).
+        - Luôn remux MP4; ép audio → AAC để tương thích.
+        - ✅ YouTube: dùng ios/android client + cookies.txt (bypass SABR, nsig, age-restrict).
+        - ✅ Instagram: dùng instagram_cookies.txt (bypass login required & rate-limit).
+        - ✅ Các nền tảng khác: không dùng cookies để tránh lỗi.
+        """
+        from urllib.parse import urlparse
+
+        host = (urlparse(self.url or "").netloc or "").lower()
+        is_yt = ("youtube.com" in host) or ("youtu.be" in host)
+        is_ig = "instagram.com" in host
+        is_tt = "tiktok.com" in host
+        is_fb = ("facebook.com" in host) or ("fb.watch" in host)
+        is_dm = ("dailymotion.com" in host) or ("dai.ly" in host)
+        is_rd = ("reddit.com" in host) or ("v.redd.it" in host) or ("old.reddit.com" in host) or ("redd.it" in host)
+        is_tg = ("t.me" in host) or ("telegram.org" in host)
+
+        # ---- ffmpeg (probe 1 lần cho cả process, xem FFMPEG) ----
+        caps = FFMPEG.get()
+        ffmpeg_path = caps.path
+        have_ffmpeg = caps.ok
+
+        # ✅ Đã loại bỏ hoàn toàn cookie - không cần thiết
+
+        # ---- Headers / extractor args ----
+        headers = {"User-Agent": self.UA}
+        referer = (
+            "https://www.instagram.com/"   if is_ig else
+            "https://www.facebook.com/"    if is_fb else
+            "https://www.tiktok.com/"      if is_tt else
+            "https://www.dailymotion.com/" if is_dm else
+            "https://www.reddit.com/"      if is_rd else
+            "https://t.me/"                if is_tg else
+            None
+        )
+        if referer:
+            headers["Referer"] = referer
+
+        # ✅ Tối ưu extractor_args cho tất cả nền tảng - không cần cookies
+        extractor_args = {}
+        
+        # YouTube: Strategy - Cookies vs No-Cookies (Fixed)
+        if is_yt:
+            has_valid_cookie = _is_valid_netscape_cookie(COOKIE_FILE)
+            
+            if has_valid_cookie:
+                # ⚠️ TV Embedded + Cookies = HTTP 400
+                # → Dùng mweb (mobile web) - ít bị chặn và hỗ trợ cookies
+                extractor_args["youtube"] = {
+                    "player_client": ["mweb", "web"],
+                    "player_skip": ["android", "ios", "tv_embedded", "android_vr", "web_creator", "tv", "mediaconnect"]
+                }
+                self._log(f"[{self.row}] 🍪 YouTube: Using cookies with mweb client.")
+            else:
+                # Không cookies: Dùng tv_embedded (bypass tốt, không cần PO Token)
+                extractor_args["youtube"] = {
+                    "player_client": ["tv_embedded", "android_vr", "mweb"],
+                    "player_skip": ["android", "ios", "web", "web_creator", "tv", "mediaconnect"]
+                }
+                self._log(f"[{self.row}] ℹ️ YouTube: Using tv_embedded (no cookies).")
+        
+        # TikTok: không cần extractor_args đặc biệt, để yt-dlp tự động xử lý
+        if is_tt:
+            extractor_args["tiktok"] = {
+                "webpage_download": ["1"]
+            }
+        
+        # Facebook: bật HD
+        if is_fb:
+            extractor_args["facebook"] = {"hd": ["1"]}
+        
+        # Instagram: không cần extractor_args đặc biệt
+        # Telegram: không cần extractor_args đặc biệt
+        # Reddit: không cần extractor_args đặc biệt
+        # Dailymotion: không cần extractor_args đặc biệt
+
+        # ---- Chọn format ----
+        desired_fmt = self.fmt
+        if not have_ffmpeg and ("+" in desired_fmt) and not self.audio_only:
+            desired_fmt = "best[ext=mp4][height<=720]/best"
+        if self.audio_only:
+            desired_fmt = "bestaudio/best"
+        
+        # ✅ TikTok & Facebook: dùng format linh hoạt hơn
+        if is_tt or is_fb:
+            if not self.audio_only:
+                desired_fmt = "bv*+ba/b"  # Flexible best video + audio
+
+        # ---- Thư mục output + mẫu tên file ----
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+        except Exception:
+            pass
+
+        safe_base = None
+        if getattr(self, "filename_base", None):
+            safe_base = safe_filename(self.filename_base)
+
+        target_dir = self.out_dir
+        subdir_tpl = None
+        if self.per_folder:
+            subdir_tpl = safe_base if safe_base else "%(title).190B [%(id)s]"
+        if subdir_tpl:
+            target_dir = self.out_dir / subdir_tpl
+            try:
+                target_dir.mkdir(parents=True, exist_ok=True)
+            except Exception:
+                target_dir = self.out_dir
+
+        if safe_base:
+            outtmpl = str(target_dir / f"{safe_base}.%(ext)s")
+        else:
+            base_tpl = "%(title).190B [%(id)s]" if self.per_folder else "%(title)s"
+            outtmpl = str(target_dir / f"{base_tpl}.%(ext)s")
+
+        # ✅ TẮT HOÀN TOÀN tính năng impersonate vì gây lỗi trên một số máy
+        # Ngay cả khi có curl-cffi, yt-dlp có thể không tương thích
+        has_impersonate = False
+
+        # ---- yt-dlp options core ----
+        opts: dict[str, Any] = {
+            "outtmpl": outtmpl,
+            "format": desired_fmt,
+            "quiet": True,
+            "noprogress": True,
+            "logger": self._YTDLPLogger(self),  # warning/error của yt-dlp → log của job (WarmState đổi theo job)
+            "ignoreerrors": True, # Tiếp tục tải nếu có 1 video trong danh sách bị lỗi
+
+            # Network / độ ổn định / Tối ưu né chặn
+            "retries": 15,
+            "fragment_retries": 15,
+            "concurrent_fragment_downloads": 2 if is_yt else 5, 
+            "socket_timeout": 30, # Chờ lâu hơn một chút để tránh rớt mạng
+            "file_access_retries": 5,
+
+            "geo_bypass": True,
+            "geo_bypass_country": "US",
+            "http_headers": headers,
+            "extractor_args": extractor_args,
+            # ✅ TẮT impersonate vì gây lỗi 100% trên một số máy
+            # "impersonate": "chrome" if (has_impersonate and (is_yt or is_tt)) else None,
+            "windowsfilenames": True,
+            "trim_file_name": 180,
+            "format_sort": ["res:2160,1440,1080,720,480,360", "fps", "hdr:12", "codec:avc1,h264,vp9,av01"],
+            "format_sort_force": True,
+            "prefer_ffmpeg": True,
+
+            "progress_hooks": [self._hook],
+            "post_hooks": [self.output_files.append],   # file cuối (sau merge/convert) → ARCHIVE
+        }
+
+        # ✅ Cookie handling: Chỉ dùng nếu file hợp lệ (Netscape format)
+        # YouTube: cookies.txt file (for SABR, nsig, age-restricted videos)
+        if is_yt and _is_valid_netscape_cookie(COOKIE_FILE):
+            try:
+                opts["cookiefile"] = str(COOKIE_FILE)
+            except Exception:
+                pass
+        
+        # Instagram: instagram_cookies.txt file (for login required & rate-limit)
+        if is_ig and _is_valid_netscape_cookie(INSTAGRAM_COOKIE_FILE):
+            try:
+                opts["cookiefile"] = str(INSTAGRAM_COOKIE_FILE)
+                self._log(f"[{self.row}] 🍪 Instagram: Using validated cookies.")
+            except Exception:
+                pass
+        elif is_ig and INSTAGRAM_COOKIE_FILE.exists():
+            self._log(f"[{self.row}] ⚠️ Instagram: cookies invalid format, ignoring.")
+
+        # ---- FFmpeg & postprocessors ----
+        if have_ffmpeg:
+            if self.audio_only:
+                opts.setdefault("postprocessors", []).append({
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "0",
+                })
+            else:
+                opts["merge_output_format"] = "mp4"
+                opts["ffmpeg_location"] = ffmpeg_path
+
+                # Remux nhanh
+                opts.setdefault("postprocessors", []).append({
+                    "key": "FFmpegVideoRemuxer",
+                    "preferedformat": "mp4",
+                })
+
+                # Convert có điều kiện (bản ffmpeg thiếu libx264 → giữ nguyên video):
+                can_x264 = caps.has_encoder("libx264") or not caps.encoders
+                if self.convert_av1 and not can_x264:
+                    self._log(f"[{self.row}] ⚠️ FFmpeg {caps.version} không có libx264 → bỏ convert H.264, giữ nguyên video.")
+                if self.convert_av1 and can_x264:
+                    # Ép H.264 + AAC (bắt buộc khi cắt video)
+                    opts.setdefault("postprocessors", []).append({
+                        "key": "FFmpegVideoConvertor",
+                        "preferedformat": "mp4",
+                    })
+                    opts.setdefault("postprocessor_args", []).extend([
+                        "-c:v", "libx264",
+                        "-pix_fmt", "yuv420p",
+                        "-c:a", "aac",
+                        "-b:a", "192k",
+                        "-ar", "48000",
+                        "-movflags", "+faststart",
+                    ])
+                else:
+                    # Copy video stream; chỉ ép audio → AAC để tương thích MP4
+                    opts.setdefault("postprocessors", []).append({
+                        "key": "FFmpegVideoConvertor",
+                        "preferedformat": "mp4",
+                    })
+                    opts.setdefault("postprocessor_args", []).extend([
+                        "-c:v", "copy",
+                        "-c:a", "aac",
+                        "-b:a", "192k",
+                        "-ar", "48000",
+                        "-movflags", "+faststart",
+                    ])
+
+        # ---- Thumbnail + folder riêng (nếu bật) ----
+        if self.per_folder and not self.audio_only:
+            opts["writethumbnail"] = True
+            if have_ffmpeg:
+                opts.setdefault("postprocessors", []).append({
+                    "key": "FFmpegThumbnailsConvertor",
+                    "format": "jpg",
+                })
+
+        return opts
+
+
+    def _extract(self, opts: dict) -> dict | None:
+        """extract_info (process=False) có cache theo URL + cấu hình extract (xem INFO_CACHE)."""
+        info = INFO_CACHE.get(self.url, opts)
+        if info is not None:
+            return info
+        try:
+            if self.warm is not None:
+                from yt_dlp.utils import DownloadError
+                try:
+                    info = self.warm.extractor(opts).extract_info(
+                        self.url, download=False, process=False,
+                        force_generic_extractor=opts.get("force_generic_extractor", False))
+                except DownloadError:
+                    raise   # lỗi của URL, extractor vẫn dùng tiếp được
+                except BaseException:
+                    self.warm.discard(opts)
+                    raise
+            else:
+                with _ydl({**opts, "skip_download": True, "ignoreerrors": False}) as ydl:
+                    info = ydl.extract_info(
+                        self.url, download=False, process=False,
+                        force_generic_extractor=opts.get("force_generic_extractor", False))
+        except Exception as e:
+            e._extract_error = True   # classify_error: 404/410 ở bước này = video đã mất
+            raise
+        if isinstance(info, dict):
+            INFO_CACHE.put(self.url, opts, info)
+            key = media_key(self.url)
+            if key:
+                METADATA.put_info(*key, info)
+        return info
+
+    def _download(self, opts: dict):
+        """
+        Tải bằng info đã extract (process_ie_result) thay vì ydl.download() extract lại từ đầu.
+        Video đơn: tắt ignoreerrors để lỗi thật (416/403/private...) nổi lên cho chuỗi retry.
+        """
+        from yt_dlp.utils import DownloadError, ReExtractInfo
+        try:
+            info = self._extract(opts)
+        except Exception:
+            INFO_CACHE.drop(self.url)
+            raise
+        if not isinstance(info, dict):
+            raise DownloadError(f"Cannot extract info: {self.url}")
+        is_multi = info.get("_type") in ("playlist", "multi_video")
+        try:
+            with _ydl({**opts, "ignoreerrors": bool(opts.get("ignoreerrors")) and is_multi}) as ydl:
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+                retcode = getattr(ydl, "_download_retcode", 0)
+        except ReExtractInfo:
+            # link media trong info đã hết hạn → extract lại như cũ
+            INFO_CACHE.drop(self.url)
+            with _ydl(opts) as ydl:
+                retcode = ydl.download([self.url])
+        except Exception as e:
+            if _is_media_url_error(e):
+                INFO_CACHE.drop(self.url)
+            raise
+        if retcode:
+            raise DownloadError(f"Some entries failed to download: {self.url}")
+
+    def _hook(self, d):
+        # Chặn khi người dùng Pause
+        while not self._pause_evt.is_set() and not self._stop_flag:
+            if not self._was_paused:
+                # cập nhật trạng thái một lần khi vừa vào pause
+                self._status("Paused")
+                self._was_paused = True
+            time.sleep(0.2)
+        if self._was_paused and self._pause_evt.is_set() and not self._stop_flag:
+            # vừa resume
+            self._was_paused = False
+            self._status("Downloading")
+
+        # Nếu user bấm Stop → hủy ngay
+        if self._stop_flag:
+            raise KeyboardInterrupt("UserCanceled")
+
+        st = d.get("status")
+        st = d.get("status")
+        if st == "downloading":
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            downloaded = d.get("downloaded_bytes", 0)
+            self._meter(d.get("filename"), downloaded)
+            if total:
+                pct = int(downloaded * 100 / max(1, total))
+                if pct != getattr(self, '_last_pct', -1):
+                    self._progress(max(0, min(100, pct)))
+                    self._last_pct = pct
+            else:
+                if not hasattr(self, '_sent_indeterminate'):
+                    self._progress(-1)
+                    self._sent_indeterminate = True
+            if not hasattr(self, '_sent_downloading'):
+                self._status("Downloading")
+                self._sent_downloading = True
+        elif st == "finished":
+            if not hasattr(self, '_sent_merging'):
+                self._status("Merging")
+                self._sent_merging = True
+
+    def _meter(self, filename: str | None, downloaded: int):
+        """Báo số byte mới nhận cho BANDWIDTH (downloaded_bytes là luỹ kế theo từng file)."""
+        if not self._bw_registered:
+            BANDWIDTH.register()
+            self._bw_registered = True
+        last_file, last_bytes = self._bw_seen
+        if filename != last_file or downloaded < last_bytes:
+            last_bytes = 0   # file mới / tải lại từ đầu
+        self._bw_seen = (filename, downloaded)
+        BANDWIDTH.consume(downloaded - last_bytes, lambda: self._stop_flag)
+        if self._stop_flag:
+            raise KeyboardInterrupt("UserCanceled")
+
+    def run(self) -> tuple[bool, str]:
+        """Chạy job (xem _run); luôn trả suất băng thông khi kết thúc."""
+        try:
+            return self._run()
+        finally:
+            if self._bw_registered:
+                BANDWIDTH.unregister()
+                self._bw_registered = False
+
+    def _run(self) -> tuple[bool, str]:
+        """
+        Chạy job tới khi xong: tải chính, rồi các chiến lược trong RETRY_STRATEGIES
+        theo phân loại lỗi (lỗi vĩnh viễn → dừng ngay). Trả về (ok, lỗi).
+        """
+        self._status("Starting")
+        self._progress(-1)
+        self._log(f"[{self.row}] Start download: {self.url}")
+        platform = detect_platform(self.url)
+        self.error_class = ""
+        self.throttled = False
+        self.output_files = []
+
+        # Lần trước đã biết là private/removed (cache trên đĩa) → fail ngay, không gọi mạng
+        key = media_key(self.url)
+        gone = METADATA.get(*key, "unavailable") if key else None
+        if gone:
+            self._log(f"[{self.row}] (cache) video không còn khả dụng — Retry Fail / thêm lại link"
+                      f" (CLI: --recheck-unavailable) để kiểm tra lại")
+            return self._failed(RuntimeError(gone), "unavailable")
+
+        # Chuẩn bị opts + lấy trước metadata (để biết id cho việc xoá .part khi cần)
+        # (kết quả extract được cache → lần tải chính + các nhánh retry dùng lại, không extract lại)
+        opts = self._ydl_opts()
+        try:
+            self.video_id = (self._extract(opts) or {}).get("id") or ""
+        except Exception as e:
+            cls = classify_error(e)
+            if cls == "canceled":
+                return self._canceled()
+            self.throttled |= cls in THROTTLE_ERRORS
+            if cls in PERMANENT_ERRORS:
+                return self._failed(e, cls)
+
+        # --- Attempt 1: tải bình thường ---
+        try:
+            self._download(opts)
+            return self._succeeded("Done")
+        except Exception as e:
+            last = e
+        cls = classify_error(last)
+        if cls == "canceled":
+            return self._canceled()
+        self.throttled |= cls in THROTTLE_ERRORS
+        self._log(f"[{self.row}] First attempt failed [{cls}]: {last!r}")
+        self._log_error_hints(last)
+
+        # --- Các chiến lược retry: chọn theo (nền tảng, loại lỗi), ưu tiên chiến lược hay thắng ---
+        tried: set = set()
+        while cls not in PERMANENT_ERRORS:
+            cands = [st for st in RETRY_STRATEGIES if st.name not in tried and st.applies(self, platform, cls)]
+            if not cands:
+                break
+            st = STRATEGY_STATS.rank(platform, cands)[0]
+            tried.add(st.name)
+            self._status(st.label)
+            try:
+                st.run(self, self._ydl_opts())
+            except Exception as e:
+                cls2 = classify_error(e)
+                if cls2 == "canceled":
+                    return self._canceled()
+                self.throttled |= cls2 in THROTTLE_ERRORS
+                STRATEGY_STATS.record(platform, st.name, False)
+                self._log(f"[{self.row}] {st.label} failed [{cls2}]: {e!r}")
+                cls, last = cls2, e
+                continue
+            STRATEGY_STATS.record(platform, st.name, True)
+            return self._succeeded(f"{st.label} OK")
+
+        # Hết cách
+        return self._failed(last, cls)
+
+    # ---- kết thúc job ----
+    def _succeeded(self, msg: str) -> tuple[bool, str]:
+        key = media_key(self.url)
+        files = set(self.output_files)
+        if key and len(files) == 1:     # 1 video → 1 file; playlist/nhiều file thì không ghi
+            ARCHIVE.record(*key, files.pop())
+        self._progress(100)
+        self._status("Bong")
+        self._log(f"[{self.row}] {msg}")
+        return True, ""
+
+    def _canceled(self) -> tuple[bool, str]:
+        self.error_class = "canceled"
+        self._status("Canceled")
+        self._log(f"[{self.row}] Canceled by user")
+        return False, "Canceled"
+
+    def _failed(self, err: Exception, cls: str) -> tuple[bool, str]:
+        self.error_class = cls
+        self._status("Error")
+        if _is_gone_for_good(err):
+            key = media_key(self.url)
+            if key:
+                METADATA.put(*key, "unavailable", str(err)[:300])
+        if cls in PERMANENT_ERRORS:
+            self._log(f"[{self.row}] ⛔ Lỗi vĩnh viễn [{cls}] → bỏ qua retry: {err!r}")
+        else:
+            self._log(f"[{self.row}] ERROR: cannot download after retries [{cls}]")
+        return False, f"[{cls}] {str(err)[:300]}"
+
+    def _log_error_hints(self, e: Exception):
+        """✅ Thông báo rõ ràng khi gặp lỗi phổ biến."""
+        msg = (repr(e) or "").lower()
+        try:
+            # Instagram: Login required / Rate-limit / Chrome permission
+            if "instagram" in self.url.lower():
+                has_ig_cookie = INSTAGRAM_COOKIE_FILE.exists()
+                if ("could not copy chrome cookie" in msg) or ("permission denied" in msg and "chrome" in msg):
+                    self._log(f"[{self.row}] ⚠️ Instagram: Chrome cookie error → App sẽ thử instaloader/gallery-dl")
+                elif ("login required" in msg or "login_required" in msg or "checkpoint_required" in msg or "rate" in msg):
+                    if not has_ig_cookie:
+                        self._log(f"[{self.row}] ⚠️ Instagram: Login required → Click '🍪 Import Cookie' chọn Instagram và import cookies!")
+                    else:
+                        self._log(f"[{self.row}] ⚠️ Instagram: Video có thể bị private hoặc cookies hết hạn")
+                elif ("429" in msg):
+                    self._log(f"[{self.row}] ⚠️ Instagram: Rate-limit (429) → Đợi vài phút hoặc import cookies mới")
+
+            # YouTube: Members-only
+            if ("members-only" in msg or "member" in msg or "error 153" in msg or "player configuration error" in msg):
+                self._status("Members-only")
+                self._log(f"[{self.row}] ⚠️ YouTube: Members-only → Import cookies từ tài khoản có membership")
+
+            # YouTube: nsig/SABR/PO Token errors
+            if ("nsig extraction failed" in msg) or ("sabr streaming" in msg) or ("n challenge" in msg) or ("po token" in msg):
+                self._log(f"[{self.row}] ⚠️ YouTube: nsig/SABR/PO Token error → Giải pháp: 1) Import cookies (🍪) 2) Cài Node.js 3) pip install -U yt-dlp")
+
+            # YouTube: 403 Forbidden
+            if "403" in msg and "forbidden" in msg:
+                self._log(f"[{self.row}] ⚠️ YouTube: 403 Forbidden → Giải pháp: 1) Import cookies (🍪) 2) pip install -U yt-dlp")
+
+            # Impersonate error
+            if "impersonate target" in msg:
+                self._log(f"[{self.row}] ⚠️ Lỗi giả lập trình duyệt (impersonate đang tắt trong _ydl_opts).")
+
+            # Format not available
+            if ("only images are available" in msg) or ("format is not available" in msg):
+                cookie_exists = COOKIE_FILE.exists()
+                if not cookie_exists:
+                    self._log(f"[{self.row}] ⚠️ Format not available → Click '🍪 Import Cookie' để mở khóa formats!")
+                else:
+                    self._log(f"[{self.row}] ⚠️ Format not available → Thử giảm quality (720p/480p) hoặc pip install -U yt-dlp")
+
+            # FFmpeg missing
+            if ("ffmpeg" in msg or "ffprobe" in msg) and ("not found" in msg or "could not be found" in msg):
+                self._log(f"[{self.row}] ⚠️ FFmpeg not found → Download FFmpeg và thêm vào PATH: https://ffmpeg.org/download.html")
+
+            # TikTok: Impersonation
+            if "tiktok" in self.url.lower() and ("impersonat" in msg or "not available" in msg):
+                self._log(f"[{self.row}] ⚠️ TikTok: Video not available → Thử: pip install 'yt-dlp[default]' hoặc pip install -U yt-dlp")
+        except Exception:
+            pass
+
+
+# ------------------------ Phân loại lỗi + bảng chiến lược retry ------------------------
+# Thứ tự quan trọng: mẫu đầu tiên khớp quyết định loại lỗi.
+_ERROR_PATTERNS: List[tuple[str, tuple[str, ...]]] = [
+    ("http416",     ("requested range not satisfiable", "http error 416")),
+    ("unsupported", ("unsupported url",)),
+    ("unavailable", ("private video", "video is private", "video unavailable", "has been removed",
+                     "no longer available", "been terminated", "content isn't available",
+                     "post isn't available")),
+    ("members",     ("members-only", "members only", "join this channel")),
+    ("login",       ("login required", "login_required", "checkpoint_required", "sign in to confirm",
+                     "use --cookies")),
+    ("rate_limit",  ("http error 429", "too many requests", "rate-limit", "rate limit")),
+    ("forbidden",   ("http error 403", "forbidden")),
+    ("format",      ("format is not available", "only images are available", "no video formats")),
+    ("extractor",   ("nsig", "sabr", "n challenge", "po token", "signature", "unable to extract",
+                     "impersonat")),
+    ("postprocess", ("postprocessing", "ffmpeg", "ffprobe", "conversion failed")),
+    ("network",     ("timed out", "timeout", "connection reset", "connection refused", "remote end closed",
+                     "incompleteread", "temporary failure", "failed to resolve", "getaddrinfo",
+                     "unable to download webpage", "http error 404", "http error 410")),
+]
+
+# 404/410/"does not exist" chỉ vĩnh viễn khi trang video trả về lúc extract (_extract gắn cờ lỗi);
+# lúc tải thì thường là link media/fragment hết hạn → network: retry, extract lại (_is_media_url_error)
+_EXTRACT_GONE = ("http error 404", "http error 410", "does not exist")
+
+# Lỗi vĩnh viễn: không thử chiến lược khác, Scheduler cũng không auto-retry
+PERMANENT_ERRORS = frozenset({"unavailable", "unsupported"})
+# Host đang chặn/giới hạn mình → HostBudget giảm số job song song + nhịp cho nền tảng đó
+THROTTLE_ERRORS = frozenset({"rate_limit", "forbidden"})
+
+def classify_error(err: BaseException) -> str:
+    """Map exception → loại lỗi (xem _ERROR_PATTERNS). 'canceled' khi user bấm Stop."""
+    if isinstance(err, KeyboardInterrupt) or "UserCanceled" in repr(err):
+        return "canceled"
+    msg = repr(err).lower()
+    if getattr(err, "_extract_error", False) and any(n in msg for n in _EXTRACT_GONE):
+        return "unavailable"
+    for cls, needles in _ERROR_PATTERNS:
+        if any(n in msg for n in needles):
+            return cls
+    return "unknown"
+
+
+def _is_gone_for_good(err: BaseException) -> bool:
+    """Extractor báo rõ private/đã gỡ (không phải 404 chung chung) → đáng ghi dấu 'unavailable' 12 h."""
+    if not getattr(err, "_extract_error", False):
+        return False
+    msg = repr(err).lower()
+    return any(n in msg for n in dict(_ERROR_PATTERNS)["unavailable"])
+
+
+def _st_fresh_416(job: "DownloadJob", opts: dict):
+    # 416 → dọn .part và thử lại fresh (tắt resume)
+    _delete_part_files_by_id(job.out_dir, job.video_id)
+    opts["continuedl"] = False
+    opts["http_chunk_size"] = 0
+    opts["concurrent_fragment_downloads"] = 1
+    job._download(opts)
+
+def _st_tt_simple(job: "DownloadJob", opts: dict):
+    # ✅ Dùng format đơn giản nhất, bỏ extractor_args phức tạp
+    opts["format"] = "best"
+    opts.pop("extractor_args", None)
+    opts["force_generic_extractor"] = False
+    job._download(opts)
+
+def _st_fb_simple(job: "DownloadJob", opts: dict):
+    opts["format"] = "best"
+    # Loại bỏ HD requirement
+    if "extractor_args" in opts and "facebook" in opts["extractor_args"]:
+        opts["extractor_args"].pop("facebook", None)
+    job._download(opts)
+
+def _st_rd_generic(job: "DownloadJob", opts: dict):
+    opts["format"] = "bv*+ba/best"
+    hdrs = (opts.get("http_headers") or {}).copy()
+    hdrs["Referer"] = "https://www.reddit.com/"
+    opts["http_headers"] = hdrs
+    opts["force_generic_extractor"] = True
+    job._download(opts)
+
+def _run_tool(job: "DownloadJob", cmd: List[str], name: str):
+    """Chạy tool ngoài (instaloader/gallery-dl) 1 lần; raise nếu thất bại."""
+    import subprocess
+    # Add cookies if available
+    if COOKIE_FILE.exists():
+        cmd.extend(["--cookies", str(COOKIE_FILE)])
+    job._log(f"[{job.row}] Trying {name} for Instagram...")
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        timeout=300,
+        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    )
+    if job._stop_flag:
+        raise KeyboardInterrupt("UserCanceled")
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed: {result.stderr}")
+
+def _st_ig_instaloader(job: "DownloadJob", opts: dict):
+    # Parse Instagram URL to get shortcode
+    m = re.search(r'instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)', job.url)
+    if not m:
+        raise RuntimeError("Could not extract shortcode from Instagram URL")
+    _run_tool(job, [
+        sys.executable, "-m", "instaloader",
+        "--no-captions", "--no-metadata-json",
+        "--dirname-pattern", str(job.out_dir),
+        "--filename-pattern", "{shortcode}",
+        f"--post={m.group(1)}"
+    ], "instaloader")
+
+def _st_ig_gallery_dl(job: "DownloadJob", opts: dict):
+    _run_tool(job, [
+        sys.executable, "-m", "gallery_dl",
+        "--dest", str(job.out_dir),
+        "--filename", "{category}_{post_shortcode}.{extension}",
+        job.url
+    ], "gallery-dl")
+
+def _st_yt_ios_cookie(job: "DownloadJob", opts: dict):
+    # ✅ Có cookie: thử ios/android client (bypass nsig/SABR tốt hơn)
+    opts["format"] = "best"
+    opts["extractor_args"] = {
+        "youtube": {
+            "player_client": ["android", "ios"],
+            "player_skip": ["web", "web_creator", "web_embedded", "tv", "tv_embedded", "mediaconnect"]
+        }
+    }
+    job._download(opts)
+
+def _st_yt_simple(job: "DownloadJob", opts: dict):
+    opts["format"] = "best"
+    job._download(opts)
+
+def _st_recode(job: "DownloadJob", opts: dict):
+    # TẮT thumbnail ở nhánh retry để tránh lỗi convert
+    opts.pop("writethumbnail", None)
+    # đảm bảo có convert
+    opts.setdefault("postprocessors", []).append({"key": "FFmpegVideoConvertor", "preferedformat": "mp4"})
+    opts.setdefault("postprocessor_args", []).extend([
+        "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-movflags", "+faststart"
+    ])
+    job._download(opts)
+
+
+class RetryStrategy(NamedTuple):
+    name: str
+    label: str                 # trạng thái hiển thị trên bảng
+    platforms: frozenset       # mã detect_platform(); rỗng = mọi nền tảng
+    classes: frozenset         # loại lỗi mà chiến lược này có thể cứu
+    run: Callable[["DownloadJob", dict], None]
+    when: Callable[["DownloadJob"], bool] | None = None
+
+    def applies(self, job: "DownloadJob", platform: str, cls: str) -> bool:
+        if self.platforms and platform not in self.platforms:
+            return False
+        if cls not in self.classes:
+            return False
+        return self.when(job) if self.when else True
+
+
+_GENERIC = frozenset({"forbidden", "extractor", "format", "network", "unknown"})
+
+# Thứ tự khai báo = thứ tự mặc định khi chưa có thống kê
+RETRY_STRATEGIES: List[RetryStrategy] = [
+    RetryStrategy("fresh_416",      "Retry(fresh/416)",            frozenset(),       frozenset({"http416"}), _st_fresh_416),
+    RetryStrategy("tt_simple",      "Retry(TikTok/simple)",        frozenset({"tt"}), _GENERIC | {"postprocess"}, _st_tt_simple),
+    RetryStrategy("fb_simple",      "Retry(Facebook/simple)",      frozenset({"fb"}), _GENERIC, _st_fb_simple),
+    RetryStrategy("rd_generic",     "Retry(Reddit)",               frozenset({"rd"}), _GENERIC, _st_rd_generic),
+    RetryStrategy("ig_instaloader", "Retry(Instagram/instaloader)", frozenset({"ig"}), _GENERIC | {"login", "rate_limit"}, _st_ig_instaloader),
+    RetryStrategy("ig_gallery_dl",  "Retry(Instagram/gallery-dl)", frozenset({"ig"}), _GENERIC | {"login", "rate_limit"}, _st_ig_gallery_dl),
+    RetryStrategy("yt_ios_cookie",  "Retry(YouTube/ios+cookie)",   frozenset({"yt"}), _GENERIC | {"login", "members"}, _st_yt_ios_cookie,
+                  when=lambda job: COOKIE_FILE.exists()),
+    RetryStrategy("yt_simple",      "Retry(YouTube/simple)",       frozenset({"yt"}), _GENERIC, _st_yt_simple),
+    RetryStrategy("recode",         "Retry(recode h264/aac)",      frozenset(),       frozenset({"postprocess", "unknown"}), _st_recode),
+]
+
+
+class StrategyStats:
+    """
+    Thống kê thành công theo (nền tảng, chiến lược), lưu ở USER_DATA_DIR để dùng lại giữa các phiên.
+    rank(): xếp chiến lược theo tỉ lệ thắng (làm mượt Laplace), hoà thì giữ thứ tự khai báo.
+    Process con (ProcessPool) gọi detach(): không ghi file, chỉ gom phần tăng → take_delta() gửi về
+    process cha qua pipe, cha merge() và là nơi duy nhất lưu file.
+    """
+
+    def __init__(self, path: Path, save_every_s: float = 10.0):
+        self.path: Path | None = path
+        self.save_every_s = save_every_s
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self._delta: Dict[str, Dict[str, list]] | None = None
+        try:
+            self._data: Dict[str, Dict[str, list]] = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            self._data = {}
+
+    def _score(self, platform: str, name: str) -> float:
+        ok, tries = self._data.get(platform, {}).get(name, (0, 0))
+        return (ok + 1) / (tries + 2)
+
+    def rank(self, platform: str, strategies: List[RetryStrategy]) -> List[RetryStrategy]:
+        with self._lock:
+            return sorted(strategies, key=lambda st: -self._score(platform, st.name))
+
+    def record(self, platform: str, name: str, ok: bool):
+        with self._lock:
+            self._add_locked(platform, name, int(ok), 1)
+            if self._delta is not None:
+                cell = self._delta.setdefault(platform, {}).setdefault(name, [0, 0])
+                cell[0] += int(ok); cell[1] += 1
+
+    def merge(self, delta: Dict[str, Dict[str, list]]):
+        """Cộng phần tăng từ process con (take_delta)."""
+        with self._lock:
+            for platform, cells in delta.items():
+                for name, (ok, tries) in cells.items():
+                    self._add_locked(platform, name, ok, tries)
+
+    def _add_locked(self, platform: str, name: str, ok: int, tries: int):
+        cell = self._data.setdefault(platform, {}).setdefault(name, [0, 0])
+        cell[0] += ok; cell[1] += tries
+        self._dirty = True
+        if time.time() - self._last_save >= self.save_every_s:
+            self._save_locked()
+
+    def detach(self):
+        """Process con: thôi ghi file (nhiều process ghi đè lẫn nhau), bắt đầu gom phần tăng."""
+        with self._lock:
+            self.path = None
+            self._delta = {}
+
+    def take_delta(self) -> Dict[str, Dict[str, list]]:
+        with self._lock:
+            delta = self._delta or {}
+            if self._delta is not None:
+                self._delta = {}
+            return delta
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _save_locked(self):
+        if self.path is None:
+            return
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._data), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception:
+            pass
+        self._last_save = time.time()
+
+
+STRATEGY_STATS = StrategyStats(USER_DATA_DIR / "retry_stats.json")
+atexit.register(STRATEGY_STATS.save)
+
+
+# ------------------------ Scheduler (không Qt) ------------------------
+class DoneOutcome(NamedTuple):
+    """Kết quả Scheduler.done(): retry lần thứ mấy (0 = không retry), preventive bị bỏ / được đưa vào hàng đợi."""
+    retry: int
+    failed: bool
+    skipped: List[Any]
+    promoted: List[Any]
+    canceled: bool = False
+
+
+# Lớp ưu tiên của hàng đợi (số nhỏ chạy trước); cùng lớp thì vào trước ra trước
+PRIO_PINNED, PRIO_SOUND, PRIO_MAIN, PRIO_PREVENTIVE, PRIO_RETRY = range(5)
+_KIND_PRIO = {"sound": PRIO_SOUND, "main": PRIO_MAIN, "preventive": PRIO_PREVENTIVE}
+
+
+class JobQueue:
+    """
+    Hàng đợi ưu tiên có index theo key (heapq + dict key → entry).
+    push/pop O(log n); remove O(1) (đánh dấu entry, bỏ qua khi pop);
+    đổi ưu tiên = remove + push. Entry chết nhiều quá thì dựng lại heap.
+    seq: bộ đếm thứ tự FIFO — truyền chung cho nhiều queue (HostQueues) thì seq so sánh được giữa các queue.
+    """
+    _REMOVED = object()
+
+    def __init__(self, seq: "itertools.count | None" = None):
+        self._heap: list = []
+        self._entries: Dict[Any, list] = {}
+        self._seq = seq if seq is not None else itertools.count()
+        self._dead = 0
+
+    def push(self, key, prio: int):
+        """Thêm key (đã có thì chuyển sang ưu tiên mới, xếp cuối lớp đó)."""
+        self.remove(key)
+        entry = [prio, next(self._seq), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, key) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[2] = self._REMOVED
+        self._dead += 1
+        if self._dead > 1024 and self._dead > len(self._entries):
+            self._heap = [e for e in self._heap if e[2] is not self._REMOVED]
+            heapq.heapify(self._heap)
+            self._dead = 0
+        return True
+
+    def pop(self):
+        """Lấy key ưu tiên cao nhất, hoặc None nếu rỗng."""
+        while self._heap:
+            prio, _, key = heapq.heappop(self._heap)
+            if key is self._REMOVED:
+                self._dead -= 1
+                continue
+            del self._entries[key]
+            return key
+        return None
+
+    def peek(self):
+        """Entry [prio, seq, key] đứng đầu (không lấy ra), hoặc None."""
+        heap = self._heap
+        while heap and heap[0][2] is self._REMOVED:
+            heapq.heappop(heap)
+            self._dead -= 1
+        return heap[0] if heap else None
+
+    def priority(self, key):
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def clear(self):
+        self._heap.clear(); self._entries.clear(); self._dead = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        """Key theo thứ tự sẽ được chạy (O(n log n) — chỉ để xem/debug)."""
+        return (e[2] for e in sorted(self._entries.values()))
+
+
+class HostQueues:
+    """
+    Mỗi nền tảng 1 JobQueue. pop(ready) lấy job ưu tiên cao nhất trong các nền tảng
+    còn ngân sách (ready(host) True) — host đang bị chặn không làm kẹt đầu hàng đợi.
+    Mọi JobQueue dùng chung 1 bộ đếm seq → cùng ưu tiên thì FIFO giữa các nền tảng.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, JobQueue] = {}
+        self._host: Dict[Any, str] = {}
+        self._seq = itertools.count()
+
+    def push(self, key, prio: int, host: str = "other"):
+        if self._host.get(key, host) != host:
+            self.remove(key)
+        q = self._queues.get(host)
+        if q is None:
+            q = self._queues[host] = JobQueue(self._seq)
+        q.push(key, prio)
+        self._host[key] = host
+
+    def remove(self, key) -> bool:
+        host = self._host.pop(key, None)
+        return host is not None and self._queues[host].remove(key)
+
+    def pop(self, ready: Callable[[str], bool] | None = None):
+        best = None
+        for host, q in self._queues.items():
+            head = q.peek()
+            if head is None or (ready is not None and not ready(host)):
+                continue
+            if best is None or head[:2] < best[0][:2]:
+                best = (head, host)
+        if best is None:
+            return None
+        key = self._queues[best[1]].pop()
+        del self._host[key]
+        return key
+
+    def hosts(self) -> List[str]:
+        """Nền tảng đang có job đợi."""
+        return [h for h, q in self._queues.items() if q]
+
+    def priority(self, key):
+        host = self._host.get(key)
+        return None if host is None else self._queues[host].priority(key)
+
+    def clear(self):
+        self._queues.clear(); self._host.clear()
+
+    def __len__(self):
+        return len(self._host)
+
+    def __contains__(self, key):
+        return key in self._host
+
+
+# Ngân sách mặc định theo nền tảng: (số job song song tối đa, số job được bắt đầu mỗi giây)
+PLATFORM_LIMITS: Dict[str, tuple[int, float]] = {
+    "yt": (8, 4.0),
+    "tt": (4, 2.0),
+    "ig": (2, 0.5),
+    "fb": (3, 1.0),
+    "rd": (3, 1.0),
+    "other": (4, 2.0),
+}
+PLATFORM_LIMITS_WORKERS = 8   # số worker mà bảng trên được chỉnh cho; chọn nhiều hơn → mặc định giãn theo
+PLATFORM_CODES = ("yt", "tt", "ig", "fb", "dm", "rd", "other")
+
+
+def parse_platform_limits(text: str | None) -> Dict[str, tuple[int, float | None]]:
+    """
+    'yt=12/6; ig=2' → {"yt": (12, 6.0), "ig": (2, None)}
+    (số job song song / số job bắt đầu mỗi giây; bỏ nhịp → giữ nhịp mặc định của nền tảng).
+    """
+    out = {}
+    for part in re.split(r"[;,\n]+", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        m = re.fullmatch(r"(\w+)\s*=\s*(\d+)\s*(?:/\s*([\d.]+))?", part)
+        if not m or m.group(1).lower() not in PLATFORM_CODES or int(m.group(2)) < 1:
+            raise ValueError(f"Bad platform limit: {part!r}")
+        rate = float(m.group(3)) if m.group(3) else None
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Bad platform limit: {part!r}")
+        out[m.group(1).lower()] = (int(m.group(2)), rate)
+    return out
+
+
+class _HostState:
+    __slots__ = ("cap", "base_rate", "window", "rate", "tokens", "stamp", "active")
+
+    def __init__(self, cap: int, rate: float):
+        self.cap, self.base_rate = cap, rate
+        self.window, self.rate = float(cap), rate
+        self.tokens, self.stamp, self.active = float(cap), time.monotonic(), 0
+
+
+class HostBudget:
+    """
+    Giới hạn theo nền tảng (detect_platform): số job chạy song song + token bucket cho nhịp bắt đầu job.
+    AIMD: job bị 429/403 → cửa sổ song song và nhịp giảm một nửa; mỗi job OK → tăng dần lại
+    (cửa sổ +1/cửa sổ, nhịp +10% mức gốc) tới mức cấu hình.
+    Mức mặc định (PLATFORM_LIMITS) giãn theo `max_workers` người dùng chọn; `limits` (QSettings
+    "platform_limits" / --platform-limits) thì giữ nguyên như cấu hình.
+    """
+
+    def __init__(self, limits: Dict[str, tuple[int, float | None]] | None = None, max_workers: int | None = None):
+        self.overrides = dict(limits or {})
+        self._hosts: Dict[str, _HostState] = {}
+        self.rescale(max_workers)
+
+    def rescale(self, max_workers: int | None):
+        """Tính lại mức mỗi nền tảng cho số worker mới (trạng thái AIMD bắt đầu lại)."""
+        self.max_workers = max_workers
+        scale = max(1.0, (max_workers or 0) / PLATFORM_LIMITS_WORKERS)
+        self.limits = {h: (math.ceil(cap * scale), rate * scale) for h, (cap, rate) in PLATFORM_LIMITS.items()}
+        for h, (cap, rate) in self.overrides.items():
+            self.limits[h] = (cap, rate or (self.limits.get(h) or self.limits["other"])[1])
+        self._hosts.clear()
+
+    def describe(self) -> str:
+        return ", ".join(f"{h} {cap}" for h, (cap, _) in self.limits.items())
+
+    def _state(self, host: str) -> _HostState:
+        st = self._hosts.get(host)
+        if st is None:
+            cap, rate = self.limits.get(host) or self.limits["other"]
+            st = self._hosts[host] = _HostState(cap, rate)
+        return st
+
+    def _refill(self, st: _HostState, now: float):
+        st.tokens = min(st.window, st.tokens + (now - st.stamp) * st.rate)
+        st.stamp = now
+
+    def ready(self, host: str) -> bool:
+        st = self._state(host)
+        if st.active >= int(st.window):
+            return False
+        self._refill(st, time.monotonic())
+        return st.tokens >= 1.0
+
+    def acquire(self, host: str):
+        st = self._state(host)
+        self._refill(st, time.monotonic())
+        st.tokens -= 1.0
+        st.active += 1
+
+    def release(self, host: str, throttled: bool = False):
+        st = self._state(host)
+        st.active = max(0, st.active - 1)
+        if throttled:
+            st.window = max(1.0, st.window / 2)
+            st.rate = max(st.base_rate / 16, st.rate / 2)
+            st.tokens = min(st.tokens, 0.0)
+            logging.getLogger("app").info(
+                f"[{host}] bị giới hạn (429/403) → còn {int(st.window)} job song song, {st.rate:.2f} job/s")
+        else:
+            st.window = min(float(st.cap), st.window + 1.0 / st.window)
+            st.rate = min(st.base_rate, st.rate + st.base_rate * 0.1)
+
+    def wait_time(self, host: str) -> float | None:
+        """Bao lâu nữa host có token (None = đang hết slot, phải đợi job xong)."""
+        st = self._state(host)
+        if st.active >= int(st.window):
+            return None
+        self._refill(st, time.monotonic())
+        return max(0.0, (1.0 - st.tokens) / st.rate)
+
+    def reset_active(self):
+        for st in self._hosts.values():
+            st.active = 0
+
+
+class Scheduler:
+    """
+    Hàng đợi job + giới hạn số worker + auto-retry + nhóm main/preventive.
+    Hàng đợi là JobQueue theo lớp ưu tiên: ghim > sound > main > preventive > retry,
+    tách theo nền tảng (HostQueues) và chỉ lấy job của nền tảng còn ngân sách (HostBudget).
+    Chỉ giữ trạng thái, KHÔNG tự tạo thread: MainWindow (GUI) và run_batch (headless)
+    tự quyết định chạy job bằng gì. Key là định danh job (GUI: Job.id trong bảng).
+    """
+
+    def __init__(self, max_workers: int = 5, max_retries: int = 3, budget: HostBudget | None = None):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.budget = budget or HostBudget(max_workers=max_workers)
+        self.pending = HostQueues()
+        self.host: Dict[Any, str] = {}                # key -> nền tảng (detect_platform)
+        self.active: set = set()
+        self.retries: Dict[Any, int] = {}
+        self.meta: Dict[Any, tuple[str, str]] = {}   # key -> (kind, group)
+        self.waiting: set = set()                    # preventive đang chờ main
+        self.by_group: Dict[str, Dict[Any, None]] = {}  # nhóm -> preventive đang chờ (theo thứ tự add)
+        self.canceled: set = set()                   # job đang chạy đã bị hủy → không retry
+        self.held: set = set()                       # job chưa được chạy (vd: đang chờ lấy title)
+        self.parked: set = set()                     # job đã add nhưng đang bị hold
+        self.pinned: set = set()                     # job người dùng ghim "tải trước"
+
+    def reset(self, max_workers: int | None = None, max_retries: int | None = None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+            if self.budget.max_workers is not None and self.budget.max_workers != max_workers:
+                self.budget.rescale(max_workers)
+        if max_retries is not None:
+            self.max_retries = max_retries
+        self.pending.clear(); self.active.clear(); self.retries.clear()
+        self.meta.clear(); self.host.clear(); self.waiting.clear(); self.by_group.clear(); self.canceled.clear()
+        self.budget.reset_active()
+        self.parked.clear()  # held/pinned giữ nguyên: do bên ngoài quản lý (title đang resolve...)
+
+    def add(self, key, kind: str = "main", group: str = "", host: str = "other") -> bool:
+        """Đăng ký job. preventive → chờ main của nhóm fail; còn lại → vào hàng đợi. Trả về True nếu đã queue."""
+        self._unwait((key,))
+        self.meta[key] = (kind, group)
+        self.host[key] = host
+        if kind == "preventive":
+            self.waiting.add(key)
+            self.by_group.setdefault(group, {})[key] = None
+            return False
+        self._enqueue(key)
+        return True
+
+    def _unwait(self, keys: Iterable):
+        for key in keys:
+            if key in self.waiting:
+                self.waiting.discard(key)
+                group = self.meta[key][1]
+                waiting = self.by_group.get(group)
+                if waiting is not None:
+                    waiting.pop(key, None)
+                    if not waiting:
+                        del self.by_group[group]
+
+    def _take_group(self, group: str) -> List:
+        """Lấy hết preventive đang chờ của nhóm (O(số job trong nhóm), không quét cả hàng đợi)."""
+        keys = list(self.by_group.pop(group, ()))
+        self.waiting.difference_update(keys)
+        return keys
+
+    def _priority(self, key) -> int:
+        if key in self.pinned:
+            return PRIO_PINNED
+        if self.retries.get(key):
+            return PRIO_RETRY
+        return _KIND_PRIO.get(self.meta.get(key, ("main", ""))[0], PRIO_MAIN)
+
+    def _enqueue(self, key):
+        if key in self.held:
+            self.parked.add(key)
+        else:
+            self.pending.push(key, self._priority(key), self.host.get(key, "other"))
+
+    def pin(self, keys: Iterable, pinned: bool = True):
+        """Ghim/bỏ ghim: job đang đợi được đổi chỗ ngay (O(log n)/job), không dựng lại hàng đợi."""
+        for key in keys:
+            if pinned:
+                self.pinned.add(key)
+            else:
+                self.pinned.discard(key)
+            if key in self.pending:
+                self.pending.push(key, self._priority(key), self.host.get(key, "other"))
+
+    def hold(self, key):
+        """Chưa cho job chạy (vẫn được add/queue bình thường) cho tới khi release()."""
+        self.held.add(key)
+
+    def release(self, key) -> bool:
+        """Bỏ hold; nếu job đang chờ thì đưa vào hàng đợi. Trả về True nếu vừa queue."""
+        self.held.discard(key)
+        if key in self.parked:
+            self.parked.discard(key)
+            self.pending.push(key, self._priority(key), self.host.get(key, "other"))
+            return True
+        return False
+
+    def requeue(self, key, reset_retries: bool = True):
+        """Đưa lại 1 job vào hàng đợi (vd: Retry Fail)."""
+        if reset_retries:
+            self.retries.pop(key, None)
+        self._unwait((key,))
+        self._enqueue(key)
+
+    def cancel(self, keys: Iterable) -> None:
+        """Bỏ job khỏi hàng đợi; job đang chạy (bên gọi tự stop) sẽ không bị auto-retry."""
+        banned = set(keys)
+        for k in banned:
+            self.pending.remove(k)
+        self._unwait(banned)
+        self.parked -= banned
+        self.canceled |= (banned & self.active)
+
+    def cancel_all(self):
+        self.pending.clear(); self.waiting.clear(); self.by_group.clear(); self.parked.clear()
+        self.canceled |= self.active
+
+    def next(self):
+        """Lấy job kế tiếp nếu còn slot. Trả về None nếu hết slot / hết job / mọi nền tảng đang hết ngân sách."""
+        if len(self.active) >= self.max_workers or not self.pending:
+            return None
+        key = self.pending.pop(self.budget.ready)
+        if key is None:
+            return None
+        self.budget.acquire(self.host.get(key, "other"))
+        self.active.add(key)
+        return key
+
+    def wake_in(self) -> float | None:
+        """next() trả None dù còn job đợi: bao nhiêu giây nữa nên thử lại (None = đợi job đang chạy xong)."""
+        if len(self.active) >= self.max_workers:
+            return None
+        waits = [w for w in map(self.budget.wait_time, self.pending.hosts()) if w is not None]
+        return min(waits) if waits else None
+
+    @property
+    def idle(self) -> bool:
+        return not self.pending and not self.active and not self.parked
+
+    def done(self, key, ok: bool, retryable: bool = True, throttled: bool = False) -> DoneOutcome:
+        """
+        Ghi nhận job kết thúc, tự quyết định retry và xử lý preventive cùng nhóm.
+        retryable=False (lỗi vĩnh viễn, xem PERMANENT_ERRORS) → fail luôn, không auto-retry.
+        throttled=True (job dính 429/403) → HostBudget giảm nhịp cho nền tảng của job.
+        """
+        if key in self.active:
+            self.budget.release(self.host.get(key, "other"), throttled)
+        if key not in self.active or key in self.canceled:
+            # job đã bị hủy / scheduler đã reset trong lúc job chạy
+            self.active.discard(key); self.canceled.discard(key)
+            return DoneOutcome(0, not ok, [], [], canceled=True)
+        self.active.discard(key)
+        kind, group = self.meta.get(key, ("main", ""))
+        skipped, promoted = [], []
+        main_of_group = kind == "main" and bool(group)
+
+        if ok:
+            self.retries.pop(key, None)
+            if main_of_group:
+                skipped = self._take_group(group)
+            return DoneOutcome(0, False, skipped, promoted)
+
+        current = self.retries.get(key, 0)
+        if retryable and current < self.max_retries:
+            self.retries[key] = current + 1
+            self._enqueue(key)
+            return DoneOutcome(current + 1, False, skipped, promoted)
+
+        self.retries.pop(key, None)
+        if main_of_group:
+            promoted = self._take_group(group)
+            for k in promoted:
+                self._enqueue(k)
+        return DoneOutcome(0, True, skipped, promoted)
+
+
+# ------------------------ Pool worker sống lâu ------------------------
+class WarmState:
+    """
+    Trạng thái "ấm" của 1 thread tải sống lâu: YoutubeDL dùng cho extract, theo nền tảng +
+    cấu hình extract. Extractor giữ cache player JS/nsig, cookie, session HTTP giữa các job
+    → job sau cùng nền tảng không phải dựng lại. Tối đa `max_items` bản (LRU), đóng khi teardown.
+    """
+
+    def __init__(self, max_items: int = 4):
+        from collections import OrderedDict
+        self.max_items = max_items
+        self._ydls: "OrderedDict[str, Any]" = OrderedDict()
+
+    def extractor(self, opts: dict) -> Any:
+        key = InfoCache._key("", opts)[1]
+        ydl = self._ydls.get(key)
+        if ydl is None:
+            ydl = _ydl({**opts, "skip_download": True, "ignoreerrors": False})
+            self._ydls[key] = ydl
+            while len(self._ydls) > self.max_items:
+                self._close(self._ydls.popitem(last=False)[1])
+        else:
+            self._ydls.move_to_end(key)
+            ydl.params["logger"] = opts.get("logger")  # log về job hiện tại
+        return ydl
+
+    def discard(self, opts: dict):
+        """Bỏ bản ấm của cấu hình này (extract hỏng bất thường → lần sau dựng mới)."""
+        ydl = self._ydls.pop(InfoCache._key("", opts)[1], None)
+        if ydl is not None:
+            self._close(ydl)
+
+    @staticmethod
+    def _close(ydl: Any):
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
+    def close(self):
+        while self._ydls:
+            self._close(self._ydls.popitem()[1])
+
+
+class WorkerPool:
+    """
+    Tối đa `size` thread sống lâu lấy DownloadJob từ hàng đợi và chạy job.run().
+    - Thread tạo dần khi cần (job chờ nhiều hơn thread rảnh), mỗi thread giữ 1 WarmState riêng;
+      sau `recycle_after` job thì dựng state mới → bộ nhớ không phình theo phiên 10k job.
+    - Kết quả trả qua on_done(job, ok, err) — gọi từ thread tải.
+    - shutdown(): stop job đang chạy, bỏ hàng đợi, join thread và đóng WarmState.
+    """
+
+    def __init__(self, size: int, on_done: Callable[["DownloadJob", bool, str], None],
+                 recycle_after: int = 200, name: str = "dl"):
+        self.size = max(1, int(size))
+        self.on_done = on_done
+        self.recycle_after = recycle_after
+        self.name = name
+        self._cond = threading.Condition()
+        self._tasks: deque = deque()
+        self._threads: List[threading.Thread] = []
+        self._running: set = set()
+        self._idle = 0
+        self._closed = False
+
+    def submit(self, job: "DownloadJob"):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WorkerPool is shut down")
+            self._tasks.append(job)
+            if len(self._tasks) > self._idle and len(self._threads) < self.size:
+                t = threading.Thread(target=self._loop, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+
+    def new_job(self, **kwargs) -> "DownloadJob":
+        return DownloadJob(**kwargs)
+
+    def resize(self, size: int):
+        """Đổi số thread tối đa; thread thừa tự thoát khi rảnh."""
+        with self._cond:
+            self.size = max(1, int(size))
+            self._cond.notify_all()
+
+    @property
+    def threads(self) -> int:
+        with self._cond:
+            return len(self._threads)
+
+    def _take(self) -> "DownloadJob | None":
+        with self._cond:
+            while True:
+                if self._closed or len(self._threads) > self.size:
+                    self._threads.remove(threading.current_thread())
+                    return None
+                if self._tasks:
+                    job = self._tasks.popleft()
+                    self._running.add(job)
+                    return job
+                self._idle += 1
+                self._cond.wait()
+                self._idle -= 1
+
+    def _loop(self):
+        warm, served = WarmState(), 0
+        try:
+            while True:
+                job = self._take()
+                if job is None:
+                    return
+                if served >= self.recycle_after:
+                    warm.close()
+                    warm, served = WarmState(), 0
+                served += 1
+                job.warm = warm
+                try:
+                    ok, err = job.run()
+                except Exception as e:
+                    ok, err = False, f"{e!r}"
+                    logging.getLogger("app").error(f"[{job.row}] Worker crashed: {e!r}\n{traceback.format_exc()}")
+                finally:
+                    job.warm = None
+                    with self._cond:
+                        self._running.discard(job)
+                try:
+                    self.on_done(job, ok, err)
+                except Exception:
+                    logging.getLogger("app").error(f"[{job.row}] on_done failed\n{traceback.format_exc()}")
+        finally:
+            warm.close()
+
+    def shutdown(self, timeout: float = 5.0) -> bool:
+        """Dừng hẳn pool. Trả về False nếu còn thread chưa thoát sau `timeout` giây (thread daemon)."""
+        with self._cond:
+            self._closed = True
+            self._tasks.clear()
+            running = list(self._running)
+            threads = list(self._threads)
+            self._cond.notify_all()
+        for job in running:
+            job.stop()
+        deadline = time.monotonic() + timeout
+        for t in threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in threads)
+
+
+# ------------------------ Pool process (tránh GIL) ------------------------
+class RemoteJob:
+    """
+    Phía process cha của 1 DownloadJob chạy trong ProcessPool: cùng giao diện với DownloadJob
+    (pause/resume/stop, last_status/error_class/throttled/output_files sau khi xong) + kill().
+    Callback on_progress/on_status/on_log được gọi từ thread bơm sự kiện của pool.
+    """
+
+    def __init__(self, pool: "ProcessPool", row: int, url: str, out_dir: Path, fmt: str,
+                 on_progress: Callable[[int], None] | None = None,
+                 on_status: Callable[[str], None] | None = None,
+                 on_log: Callable[[str], None] | None = None,
+                 **kwargs):
+        self.pool = pool
+        self.row = row
+        self.url = url
+        self.kwargs = dict(row=row, url=url, out_dir=out_dir, fmt=fmt, **kwargs)  # gửi sang process con
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_log = on_log
+        self.last_status = ""
+        self.error_class = ""
+        self.throttled = False
+        self.output_files: List[str] = []
+        self.tid = 0            # mã lượt chạy trong pool (0 = chưa gửi đi)
+        self.stopped = False
+
+    def pause(self):
+        self.pool._control(self, "pause")
+
+    def resume(self):
+        self.pool._control(self, "resume")
+
+    def stop(self):
+        """Hủy mềm; nếu process không nhả job sau `stop_grace` giây thì pool tự kill."""
+        self.stopped = True
+        self.pool._control(self, "stop")
+
+    def kill(self):
+        """Giết process đang chạy job (job treo) — pool dựng process mới cho job sau."""
+        self.stopped = True
+        self.pool.kill(self)
+
+
+class _ProcSlot:
+    __slots__ = ("proc", "ctl", "ev", "job", "stop_at", "killed")
+
+    def __init__(self, proc, ctl, ev):
+        self.proc, self.ctl, self.ev = proc, ctl, ev
+        self.job: RemoteJob | None = None
+        self.stop_at = 0.0
+        self.killed = False
+
+
+def _proc_main(ctl, ev, bandwidth: tuple, log_level: int):
+    """
+    Vòng lặp của 1 process con: nhận ("job", tid, kwargs) từ `ctl`, chạy DownloadJob, đẩy sự kiện
+    gọn ("p"|"s"|"l"|"d", tid, ...) qua `ev`. Thread phụ đọc lệnh pause/resume/stop khi job đang chạy.
+    """
+    import queue
+    send_lock = threading.Lock()
+
+    def send(*msg):
+        with send_lock:
+            try:
+                ev.send(msg)
+            except (OSError, EOFError, ValueError):
+                pass
+
+    class _Forward(logging.Handler):
+        def emit(self, record):
+            send("l", 0, record.levelno, self.format(record))
+
+    log = logging.getLogger("app")
+    log.setLevel(log_level)
+    log.addHandler(_Forward())
+    BANDWIDTH.attach(bandwidth)
+    STRATEGY_STATS.detach()   # chỉ process cha lưu retry_stats.json (phần tăng gửi kèm "d")
+
+    tasks: "queue.Queue[tuple | None]" = queue.Queue()
+    current: Dict[int, DownloadJob] = {}
+    cancelled: set = set()
+
+    def _reader():
+        while True:
+            try:
+                msg = ctl.recv()
+            except (EOFError, OSError):
+                msg = ("quit",)
+            if msg[0] == "job":
+                tasks.put(msg[1:])
+            elif msg[0] == "quit":
+                tasks.put(None)
+                return
+            else:
+                job = current.get(msg[1])
+                if job is not None:
+                    getattr(job, msg[0])()
+                elif msg[0] == "stop":
+                    cancelled.add(msg[1])
+
+    threading.Thread(target=_reader, name="ctl", daemon=True).start()
+    warm = WarmState()
+    log_info = log_level <= logging.INFO
+    try:
+        while True:
+            item = tasks.get()
+            if item is None:
+                return
+            tid, kwargs = item
+            job = DownloadJob(
+                **kwargs,
+                on_progress=lambda pct, t=tid: send("p", t, pct),
+                on_status=lambda text, t=tid: send("s", t, text),
+                on_log=(lambda msg, t=tid: send("l", t, msg)) if log_info else None,
+            )
+            job.warm = warm
+            current[tid] = job
+            if tid in cancelled:
+                job.stop()
+            try:
+                ok, err = job.run()
+            except Exception as e:
+                ok, err = False, f"{e!r}"
+                log.error(f"[{job.row}] Worker crashed: {e!r}\n{traceback.format_exc()}")
+            current.pop(tid, None)
+            cancelled.discard(tid)
+            send("d", tid, ok, err, job.error_class, job.throttled, job.last_status, job.output_files,
+                 STRATEGY_STATS.take_delta())
+    finally:
+        warm.close()
+
+
+class ProcessPool:
+    """
+    Chế độ chạy job trong tối đa `size` process con (spawn 1 lần, dùng lại; mỗi process 1 job
+    và giữ WarmState riêng) → extract/xử lý fragment không tranh GIL với event loop của GUI.
+    - Cùng giao diện với WorkerPool: new_job(...) → RemoteJob, submit(job), resize, shutdown,
+      kết quả qua on_done(job, ok, err) — gọi từ thread bơm sự kiện.
+    - Mỗi process 2 pipe riêng (lệnh / sự kiện) → kill 1 process không làm hỏng kênh của process khác.
+    - Job treo: kill(job) hoặc stop() quá `stop_grace` giây → kill process, báo lỗi "killed",
+      process mới được spawn khi cần. BANDWIDTH dùng chung qua shared memory.
+    """
+
+    def __init__(self, size: int, on_done: Callable[[RemoteJob, bool, str], None],
+                 log_level: int = logging.INFO, stop_grace: float = 15.0):
+        import multiprocessing
+        self.size = max(1, int(size))
+        self.on_done = on_done
+        self.log_level = log_level
+        self.stop_grace = stop_grace
+        self._ctx = multiprocessing.get_context("spawn")
+        self._bandwidth = BANDWIDTH.to_shared(self._ctx)
+        self._lock = threading.Lock()
+        self._tasks: deque = deque()
+        self._slots: List[_ProcSlot] = []
+        self._jobs: Dict[int, RemoteJob] = {}
+        self._tids = itertools.count(1)
+        self._closed = False
+        self._pump_thread: threading.Thread | None = None
+
+    def new_job(self, **kwargs) -> RemoteJob:
+        return RemoteJob(self, **kwargs)
+
+    def submit(self, job: RemoteJob):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ProcessPool is shut down")
+            self._tasks.append(job)
+            self._dispatch_locked()
+            if self._pump_thread is None:
+                self._pump_thread = threading.Thread(target=self._pump, name="proc-pump", daemon=True)
+                self._pump_thread.start()
+
+    def resize(self, size: int):
+        """Đổi số process tối đa; process rảnh thừa được cho thoát ở nhịp bơm kế tiếp."""
+        with self._lock:
+            self.size = max(1, int(size))
+
+    @property
+    def processes(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    # ---- điều khiển ----
+    def _slot_of(self, job: RemoteJob) -> _ProcSlot | None:
+        for s in self._slots:
+            if s.job is job:
+                return s
+        return None
+
+    def _control(self, job: RemoteJob, cmd: str):
+        with self._lock:
+            s = self._slot_of(job)
+            if s is None:
+                return      # chưa gửi đi: stop được áp khi dispatch (job.stopped)
+            if cmd == "stop" and not s.stop_at:
+                s.stop_at = time.monotonic() + self.stop_grace
+            try:
+                s.ctl.send((cmd, job.tid))
+            except (OSError, EOFError, ValueError):
+                pass
+
+    def kill(self, job: RemoteJob):
+        with self._lock:
+            if job in self._tasks:
+                self._tasks.remove(job)
+                queued = True
+            else:
+                queued = False
+                s = self._slot_of(job)
+                if s is not None:
+                    s.killed = True
+                    s.proc.kill()
+        if queued:
+            self._finish(job, False, "Killed", "killed")
+
+    # ---- process ----
+    def _spawn_locked(self) -> _ProcSlot:
+        ctl_r, ctl_w = self._ctx.Pipe(duplex=False)
+        ev_r, ev_w = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(
+            target=_proc_main, args=(ctl_r, ev_w, self._bandwidth, self.log_level),
+            name=f"dl-proc-{len(self._slots)}", daemon=True)
+        proc.start()
+        ctl_r.close(); ev_w.close()
+        slot = _ProcSlot(proc, ctl_w, ev_r)
+        self._slots.append(slot)
+        return slot
+
+    def _dispatch_locked(self):
+        while self._tasks and not self._closed:
+            slot = next((s for s in self._slots if s.job is None and not s.killed), None)
+            if slot is None:
+                if len(self._slots) >= self.size:
+                    return
+                slot = self._spawn_locked()
+            job = self._tasks.popleft()
+            job.tid = next(self._tids)
+            try:
+                slot.ctl.send(("job", job.tid, job.kwargs))
+                if job.stopped:
+                    slot.ctl.send(("stop", job.tid))
+                    slot.stop_at = time.monotonic() + self.stop_grace
+            except (OSError, EOFError, ValueError):
+                self._tasks.appendleft(job)
+                slot.killed = True      # process đã chết → _reap dọn, spawn bản khác
+                return
+            slot.job = job
+            self._jobs[job.tid] = job
+
+    def _finish(self, job: RemoteJob, ok: bool, err: str, error_class: str = ""):
+        if error_class:
+            job.error_class = error_class
+        try:
+            self.on_done(job, ok, err)
+        except Exception:
+            logging.getLogger("app").error(f"[{job.row}] on_done failed\n{traceback.format_exc()}")
+
+    def _handle(self, slot: _ProcSlot, msg: tuple):
+        kind, tid = msg[0], msg[1]
+        if kind == "l" and tid == 0:
+            logging.getLogger("app").log(msg[2], msg[3])   # giữ nguyên level (WARNING/ERROR của process con)
+            return
+        job = self._jobs.get(tid)
+        if job is None:
+            return
+        if kind == "p":
+            if job.on_progress:
+                job.on_progress(msg[2])
+        elif kind == "s":
+            job.last_status = msg[2]
+            if job.on_status:
+                job.on_status(msg[2])
+        elif kind == "l":
+            if job.on_log:
+                job.on_log(msg[2])
+        elif kind == "d":
+            ok, err, job.error_class, job.throttled, job.last_status, job.output_files, stats = msg[2:]
+            if stats:
+                STRATEGY_STATS.merge(stats)
+            with self._lock:
+                self._jobs.pop(tid, None)
+                slot.job, slot.stop_at = None, 0.0
+            self._finish(job, ok, err)
+
+    def _drain(self, slot: _ProcSlot):
+        try:
+            while slot.ev.poll():
+                self._handle(slot, slot.ev.recv())
+        except (EOFError, OSError):
+            pass
+
+    def _reap(self, slot: _ProcSlot):
+        """Process con đã thoát/bị kill: báo lỗi cho job đang chạy (nếu có) và bỏ slot."""
+        self._drain(slot)
+        slot.proc.join(1.0)
+        with self._lock:
+            if slot in self._slots:
+                self._slots.remove(slot)
+            job = slot.job
+            if job is not None:
+                self._jobs.pop(job.tid, None)
+        for c in (slot.ctl, slot.ev):
+            try:
+                c.close()
+            except Exception:
+                pass
+        if job is not None:
+            if slot.killed:
+                self._finish(job, False, "Killed", "killed")
+            else:
+                self._finish(job, False, f"Worker process died (exit code {slot.proc.exitcode})", "crashed")
+
+    def _pump(self):
+        from multiprocessing.connection import wait
+        while True:
+            with self._lock:
+                if self._closed and not self._slots:
+                    return
+                slots = list(self._slots)
+            if not slots:
+                time.sleep(0.2)
+                continue
+            ready = wait([s.ev for s in slots] + [s.proc.sentinel for s in slots], timeout=0.5)
+            now = time.monotonic()
+            for s in slots:
+                if s.ev in ready:
+                    self._drain(s)
+                if s.proc.sentinel in ready or not s.proc.is_alive():
+                    self._reap(s)
+                elif s.job is not None and s.stop_at and now > s.stop_at:
+                    logging.getLogger("app").warning(f"[{s.job.row}] Job không dừng sau {self.stop_grace:.0f}s → kill process")
+                    s.killed = True
+                    s.proc.kill()
+            with self._lock:
+                # process rảnh vượt `size` (sau resize) → cho thoát
+                extra = len(self._slots) - self.size
+                for s in [s for s in self._slots if s.job is None and not s.killed][:max(0, extra)]:
+                    s.killed = True
+                    try:
+                        s.ctl.send(("quit",))
+                    except (OSError, EOFError, ValueError):
+                        s.proc.kill()
+                self._dispatch_locked()
+
+    def shutdown(self, timeout: float = 5.0) -> bool:
+        """Dừng job đang chạy, cho mọi process thoát (quá `timeout` thì kill). Trả về True nếu thoát êm."""
+        with self._lock:
+            self._closed = True
+            self._tasks.clear()
+            slots = list(self._slots)
+            for s in slots:
+                try:
+                    if s.job is not None:
+                        s.ctl.send(("stop", s.job.tid))
+                    s.ctl.send(("quit",))
+                except (OSError, EOFError, ValueError):
+                    pass
+        deadline = time.monotonic() + timeout
+        clean = True
+        for s in slots:
+            s.proc.join(max(0.0, deadline - time.monotonic()))
+            if s.proc.is_alive():
+                clean = False
+                s.killed = True
+                s.proc.kill()
+                s.proc.join(1.0)
+        if self._pump_thread is not None:
+            self._pump_thread.join(2.0)
+        return clean
+
+
+# ------------------------ Headless batch (CLI) ------------------------
+def run_batch(urls: Iterable[str], out_dir: Path, quality: str = "1080p", jobs: int = 4,
+              max_retries: int = 1, audio_only: bool = False, convert_av1: bool = False,
+              results: TextIO | None = None, expand: bool = True,
+              logger: logging.Logger | None = None, use_archive: bool = True,
+              recheck_unavailable: bool = False,
+              platform_limits: Dict[str, tuple[int, float | None]] | None = None) -> tuple[int, int]:
+    """
+    Tải danh sách URL bằng `jobs` thread, không cần Qt/màn hình.
+    `urls` có thể là generator (vd: đọc stdin) — job được chạy ngay khi URL tới.
+    Mỗi job kết thúc (hết retry) ghi 1 dòng JSON vào `results`. Trả về (ok, fail).
+    use_archive: media đã tải ở phiên trước (ARCHIVE) → hard-link vào out_dir, không tải lại.
+    recheck_unavailable: bỏ dấu private/removed đã cache (METADATA 'unavailable') → kiểm tra lại qua mạng.
+    platform_limits: mức song song/nhịp riêng theo nền tảng (parse_platform_limits), ghi đè mức mặc định.
+    """
+    log = logger or logging.getLogger("app")
+    jobs = max(1, int(jobs))
+    sched = Scheduler(max_workers=jobs, max_retries=max_retries,
+                      budget=HostBudget(platform_limits, max_workers=jobs))
+    log.info(f"Giới hạn song song theo nền tảng: {sched.budget.describe()}")
+    cond = threading.Condition()
+    job_url: Dict[int, str] = {}
+    started: Dict[int, float] = {}
+    attempts: Dict[int, int] = {}
+    counts = {"ok": 0, "fail": 0}
+    feeding = [True]
+
+    def _write(rec: dict):
+        if results is None:
+            return
+        results.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        results.flush()
+
+    def _feed():
+        seen = set()
+        try:
+            for raw in urls:
+                u = _sanitize_yt_watch_url((raw or "").strip())
+                if not u.startswith("http"):
+                    continue
+                pages = iter_collection_videos(u) if (expand and looks_like_playlist_or_channel(u)) else [[u]]
+                for vids in pages:  # kênh lớn: trang đầu đã tải trong khi các trang sau còn đang lấy
+                    found = find_archived(vids) if use_archive else {}
+                    if recheck_unavailable:
+                        forget_unavailable(vids)
+                    for v in vids:
+                        ident = identity_key(v) or v   # mọi cách viết của cùng 1 video (như JobTableModel)
+                        if ident in seen:
+                            continue
+                        seen.add(ident)
+                        entry = found.get(v)
+                        path = reuse_archived(entry, out_dir) if entry else None
+                        if path:
+                            with cond:
+                                counts["ok"] += 1
+                                log.info(f"ARCHIVED {v} → {path}")
+                                _write({"index": None, "url": v, "platform": detect_platform(v), "ok": True,
+                                        "status": "Skipped (archived)", "error": "", "path": str(path)})
+                            continue
+                        with cond:
+                            key = len(job_url)
+                            job_url[key] = v
+                            sched.add(key, host=detect_platform(v))
+                            cond.notify()
+        except Exception as e:
+            log.error(f"Input error: {e!r}")
+        finally:
+            with cond:
+                feeding[0] = False
+                cond.notify_all()
+
+    def _worker():
+        warm = WarmState()  # thread sống tới hết batch → giữ extractor ấm giữa các job
+        try:
+            _work(warm)
+        finally:
+            warm.close()
+
+    def _work(warm: WarmState):
+        while True:
+            with cond:
+                key = sched.next()
+                while key is None and (feeding[0] or not sched.idle):
+                    cond.wait(sched.wake_in())  # nền tảng hết token → tự thức dậy khi có token
+                    key = sched.next()
+                if key is None:
+                    return
+                url = job_url[key]
+                started.setdefault(key, time.time())
+                attempts[key] = attempts.get(key, 0) + 1
+            platform = detect_platform(url)
+            job = DownloadJob(
+                row=key, url=url, out_dir=out_dir,
+                fmt=build_format(quality, platform),
+                audio_only=audio_only, convert_av1=convert_av1,
+                on_log=log.debug,
+            )
+            job.warm = warm
+            try:
+                ok, err = job.run()
+            except Exception as e:
+                ok, err = False, f"{e!r}"
+                log.error(f"[{key}] Worker crashed: {e!r}\n{traceback.format_exc()}")
+            with cond:
+                out = sched.done(key, ok, retryable=job.error_class not in PERMANENT_ERRORS,
+                                 throttled=job.throttled)
+                if out.retry:
+                    log.info(f"[{key}] Auto-retry {out.retry}/{sched.max_retries}: {err[:100]}")
+                else:
+                    counts["ok" if ok else "fail"] += 1
+                    log.info(f"[{key}] {'OK' if ok else 'FAIL'} {url}")
+                    _write({
+                        "index": key,
+                        "url": url,
+                        "platform": platform,
+                        "ok": ok,
+                        "status": "Bong" if ok else (job.last_status or "Error"),
+                        "error": err,
+                        "error_class": job.error_class,
+                        "attempts": attempts.get(key, 1),
+                        "elapsed": round(time.time() - started.get(key, time.time()), 2),
+                    })
+                cond.notify_all()
+
+    feeder = threading.Thread(target=_feed, name="feed", daemon=True)
+    feeder.start()
+    workers = [threading.Thread(target=_worker, name=f"dl-{i}", daemon=True) for i in range(jobs)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return counts["ok"], counts["fail"]
+
+
+def _iter_input(sources: List[str]):
+    """URL trực tiếp, file .txt, hoặc '-' (stdin, đọc từng dòng → chạy như daemon qua pipe)."""
+    for src in sources:
+        if src == "-":
+            for line in sys.stdin:
+                yield from split_urls(line)
+        elif src.startswith("http://") or src.startswith("https://"):
+            yield src
+        else:
+            p = Path(src)
+            try: text = p.read_text(encoding="utf-8", errors="ignore")
+            except Exception: text = p.read_text(encoding="latin-1", errors="ignore")
+            yield from split_urls(text)
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="download_core",
+        description="Headless batch download (không cần Qt). Kết quả: JSONL mỗi job 1 dòng.")
+    ap.add_argument("inputs", nargs="+", help="URL, file .txt chứa URL, hoặc '-' để đọc stdin")
+    ap.add_argument("-o", "--out", default=str(APP_DIR / "Output"), help="Thư mục lưu (mặc định: ./Output)")
+    ap.add_argument("-q", "--quality", default="1080p", choices=QUALITY_OPTIONS + ["Best"])
+    ap.add_argument("-j", "--jobs", type=int, default=4, help="Số job tải song song")
+    ap.add_argument("-r", "--retries", type=int, default=1, help="Số lần auto-retry mỗi job")
+    ap.add_argument("--results", default="-", help="File JSONL kết quả ('-' = stdout)")
+    ap.add_argument("--audio-only", action="store_true", help="Chỉ tải audio (mp3)")
+    ap.add_argument("--h264", action="store_true", help="Convert video → H.264")
+    ap.add_argument("--no-expand", action="store_true", help="Không explode playlist/kênh")
+    ap.add_argument("--no-archive", action="store_true", help="Tải lại cả media đã có trong kho đã tải")
+    ap.add_argument("--recheck-unavailable", action="store_true",
+                    help="Bỏ qua dấu private/removed đã nhớ (12 h) — kiểm tra lại các link đó")
+    ap.add_argument("--limit-rate", default="", help="Tổng băng thông cho mọi job, vd 5M / 800k (mặc định: không giới hạn)")
+    ap.add_argument("--limit-schedule", default="",
+                    help="Băng thông theo giờ, vd '08:00-18:00=2M;18:00-08:00=0' (ưu tiên hơn --limit-rate)")
+    ap.add_argument("--platform-limits", default="",
+                    help="Giới hạn theo nền tảng, vd 'yt=12/6; ig=2' (job song song/job bắt đầu mỗi giây)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="In log chi tiết yt-dlp ra stderr")
+    args = ap.parse_args(argv)
+    try:
+        BANDWIDTH.configure(parse_rate(args.limit_rate), parse_schedule(args.limit_schedule))
+        platform_limits = parse_platform_limits(args.platform_limits)
+    except ValueError as e:
+        ap.error(str(e))
+
+    logger = logging.getLogger("app")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    sh = logging.StreamHandler(sys.stderr)
+    sh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s", "%Y-%m-%d %H:%M:%S"))
+    logger.addHandler(sh)
+
+    FFMPEG.warm()
+    out_dir = Path(args.out); out_dir.mkdir(parents=True, exist_ok=True)
+    res_fp = sys.stdout if args.results == "-" else open(args.results, "a", encoding="utf-8")
+    try:
+        ok, fail = run_batch(
+            _iter_input(args.inputs), out_dir,
+            quality=args.quality, jobs=args.jobs, max_retries=args.retries,
+            audio_only=args.audio_only, convert_av1=args.h264,
+            results=res_fp, expand=not args.no_expand, logger=logger,
+            use_archive=not args.no_archive, recheck_unavailable=args.recheck_unavailable,
+            platform_limits=platform_limits,
+        )
+    finally:
+        if res_fp is not sys.stdout:
+            res_fp.close()
+    logger.info(f"Done: {ok} OK, {fail} failed")
+    return 0 if fail == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,583 @@
+# ==== gsheet.py (Google Sheets: OAuth + đọc cột link/STT theo từng khúc, không phụ thuộc Qt) ====
+# Thư viện Google (~0.2 s import) chỉ nạp khi dùng tới Sheet lần đầu — xem prewarm().
+from __future__ import annotations
+import os, re, time, datetime, hashlib, sqlite3, threading, pathlib, typing as _t
+
+from download_core import (
+    USER_DATA_DIR, identity_key, parse_cell_content, is_valid_video_url, _sanitize_yt_watch_url,
+)
+
+TOKEN_FILE = USER_DATA_DIR / "gsheets_token.json"
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+# Quyền ghi chỉ xin khi bật write-back; token riêng → token chỉ-đọc cũ vẫn dùng được
+TOKEN_RW_FILE = USER_DATA_DIR / "gsheets_token_rw.json"
+SHEETS_WRITE_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+# vd "http://127.0.0.1:8790" → gọi stand-in Sheets API local, không OAuth (chạy thử write-back)
+SHEETS_API_ENDPOINT = os.environ.get("SHEETS_API_ENDPOINT", "")
+
+LINK_COL, STT_COL = "C", "F"   # Cột C = link video, Cột F = STT; hàng 1 là tiêu đề
+CHUNK_ROWS = 2000              # số hàng mỗi lượt batchGet
+
+if _t.TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+
+def prewarm():
+    """Nạp trước thư viện Google (thread nền) — vd khi bật sync Sheet định kỳ."""
+    import googleapiclient.discovery, google.oauth2.credentials  # noqa: F401
+    import google_auth_oauthlib.flow, google.auth.transport.requests  # noqa: F401
+
+
+def _gs_get_creds(credentials_path: str, token_path: str | None = None,
+                  scopes: list[str] | None = None, interactive: bool = True) -> Credentials:
+    """
+    Lấy credentials với các bước:
+    1) Nếu đã có token → refresh nếu cần.
+    2) Cố gắng mở local server trên 127.0.0.1:55009; nếu fail → port=0.
+    3) Nếu vẫn không nhận redirect → fallback run_console() (copy-paste code).
+    4) Lưu token vào USER_DATA_DIR (ghi chắc hơn APP_DIR).
+    interactive=False → không có token dùng được thì raise thay vì mở trình duyệt (vd: lúc thoát app).
+    """
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    scopes = scopes or SHEETS_SCOPES
+    try:
+        token_file = TOKEN_FILE if token_path is None else pathlib.Path(token_path)
+        if token_file.parent and not token_file.parent.exists():
+            token_file.parent.mkdir(parents=True, exist_ok=True)
+
+        creds = None
+        if token_file.exists():
+            creds = Credentials.from_authorized_user_file(str(token_file), scopes)
+
+        if creds and creds.valid:
+            return creds
+
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+                token_file.write_text(creds.to_json(), encoding="utf-8")
+                return creds
+            except Exception:
+                # token hỏng → xoá để chạy luồng mới
+                try:
+                    token_file.unlink(missing_ok=True)
+                except Exception:
+                    pass
+                creds = None
+
+        # Không có token hợp lệ → chạy OAuth flow
+        if not interactive:
+            raise RuntimeError("Chưa có token Google Sheets hợp lệ (cần đăng nhập).")
+        flow = InstalledAppFlow.from_client_secrets_file(credentials_path, scopes)
+
+        # 1) thử port “thân thiện” 55009 (hay dùng trong log của bạn)
+        try:
+            creds = flow.run_local_server(
+                host="127.0.0.1",
+                port=55009,
+                open_browser=True,
+                authorization_prompt_message="🔐 Trình duyệt sẽ mở để cấp quyền Google Sheets…",
+                success_message="✅ Đăng nhập thành công. Bạn có thể đóng tab này.",
+                timeout_seconds=180
+            )
+        except Exception:
+            # 3) Cuối cùng: thử một lần nữa với cấu hình đặc biệt
+            try:
+                print("⚠️ Thử lại với cấu hình đặc biệt...")
+                creds = flow.run_local_server(
+                    bind_addr="127.0.0.1",
+                    port=0,
+                    open_browser=True,
+                    authorization_prompt_message="🔐 Vui lòng cấp quyền trong trình duyệt...",
+                    success_message="✅ Đăng nhập thành công!",
+                    timeout_seconds=300
+                )
+            except Exception as final_err:
+                # Nếu vẫn không được, báo lỗi rõ ràng
+                raise RuntimeError(
+                    "Không thể hoàn tất OAuth flow. Vui lòng kiểm tra:\n"
+                    "1. Trình duyệt có mở được không?\n"
+                    "2. Firewall có chặn localhost không?\n"
+                    "3. Cổng 55009 hoặc các cổng khác có bị chiếm không?\n"
+                    f"Chi tiết lỗi: {final_err}"
+                )
+
+
+        token_file.write_text(creds.to_json(), encoding="utf-8")
+        return creds
+
+    except Exception as e:
+        raise RuntimeError(f"OAuth failed: {e}")
+
+def _gs_extract_spreadsheet_id(url: str) -> str:
+    # .../spreadsheets/d/<ID>/...
+    m = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", url)
+    return m.group(1) if m else ""
+
+def _gs_extract_gid(url: str) -> str | None:
+    m = re.search(r"[?#&]gid=(\d+)", url)
+    return m.group(1) if m else None
+
+def _gs_quote_sheet(title: str) -> str:
+    return "'" + title.replace("'", "''") + "'"
+
+def _gs_col(col: str, offset: int = 0) -> str:
+    """Cột chữ + offset: ("G", 2) → "I", ("Z", 1) → "AA"."""
+    n = 0
+    for ch in col.upper():
+        n = n * 26 + ord(ch) - 64
+    n += offset
+    out = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+class _ThreadLocalHttp:
+    """Thay httplib2.Http cho googleapiclient: mỗi thread 1 AuthorizedHttp riêng (httplib2 không thread-safe)."""
+
+    def __init__(self, creds):
+        self.creds = creds
+        self._local = threading.local()
+
+    def request(self, *args, **kwargs):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import google_auth_httplib2
+            from googleapiclient.http import build_http
+            http = self._local.http = google_auth_httplib2.AuthorizedHttp(self.creds, http=build_http())
+        return http.request(*args, **kwargs)
+
+
+class _Service:
+    """Service Sheets đã build; giữ lại resource spreadsheets() (mỗi lần tạo mới tốn 40–300 ms)."""
+
+    def __init__(self, service):
+        self._service = service
+        self._sheets = None
+        self._lock = threading.Lock()
+
+    def spreadsheets(self):
+        with self._lock:
+            if self._sheets is None:
+                self._sheets = self._service.spreadsheets()
+            return self._sheets
+
+
+class SheetsClient:
+    """
+    Client Sheets dùng chung cả process (READ_CLIENT / WRITE_CLIENT), thread-safe:
+    - credentials giữ trong RAM (chỉ đọc file token lần đầu), refresh trước khi hết hạn REFRESH_MARGIN giây;
+    - service build 1 lần từ discovery đóng gói sẵn (static_discovery, không tải/cache discovery qua mạng).
+    Request từ nhiều thread dùng kết nối riêng từng thread (_ThreadLocalHttp).
+    Nạp/refresh credentials (có thể mở trình duyệt OAuth) chạy ngoài lock, 1 thread mỗi lúc (_loading):
+    thread khác vẫn dùng service cũ còn hạn; chưa có service thì đợi (interactive=False → raise).
+    """
+
+    REFRESH_MARGIN = 300
+
+    def __init__(self, write: bool = False):
+        self.write = write
+        self._lock = threading.Lock()
+        self._loading: threading.Event | None = None
+        self._creds = None
+        self._service: _Service | None = None
+        self._cred_path = ""
+
+    def service(self, credentials_path: str, interactive: bool = True):
+        while True:
+            with self._lock:
+                current = self._service if credentials_path == self._cred_path else None
+                if current is not None and not self._needs_refresh():
+                    return current
+                loading = self._loading
+                if loading is None:
+                    loading = self._loading = threading.Event()
+                    creds = self._creds if current is not None else None
+                    break
+            if current is not None:
+                return current   # thread khác đang refresh — token hiện tại vẫn còn hạn
+            if not interactive:
+                raise RuntimeError("Đang chờ đăng nhập Google Sheets.")
+            loading.wait()
+        try:
+            fresh = self._fresh_creds(creds, credentials_path, interactive)
+            service = current if fresh is creds else self._build(fresh)
+            with self._lock:
+                self._cred_path, self._creds, self._service = credentials_path, fresh, service
+            return service
+        finally:
+            with self._lock:
+                self._loading = None
+            loading.set()
+
+    def reset(self):
+        """Bỏ credentials/service đang giữ (vd: token bị thu hồi) — lần sau đọc lại từ đầu."""
+        with self._lock:
+            self._creds = self._service = None
+
+    def _load_creds(self, credentials_path: str, interactive: bool = True):
+        if SHEETS_API_ENDPOINT:
+            from google.auth.credentials import AnonymousCredentials
+            return AnonymousCredentials()
+        if self.write:
+            return _gs_get_creds(credentials_path, str(TOKEN_RW_FILE), SHEETS_WRITE_SCOPES, interactive)
+        # Lưu ở USER_DATA_DIR để chắc quyền ghi
+        return _gs_get_creds(credentials_path, None, interactive=interactive)
+
+    def _needs_refresh(self) -> bool:
+        creds = self._creds
+        expiry = getattr(creds, "expiry", None)
+        if expiry is None or not getattr(creds, "refresh_token", None):
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds() <= self.REFRESH_MARGIN
+
+    def _fresh_creds(self, creds, credentials_path: str, interactive: bool):
+        """Refresh tại chỗ `creds` (mọi kết nối đang dùng có token mới); không có/hỏng → nạp lại từ đầu."""
+        if creds is not None:
+            try:
+                from google.auth.transport.requests import Request
+                creds.refresh(Request())
+                token_file = TOKEN_RW_FILE if self.write else TOKEN_FILE
+                token_file.write_text(creds.to_json(), encoding="utf-8")
+                return creds
+            except Exception:
+                pass   # refresh hỏng → lấy lại từ đầu (có thể mở trình duyệt xin quyền)
+        return self._load_creds(credentials_path, interactive)
+
+    @staticmethod
+    def _build(creds) -> _Service:
+        from googleapiclient.discovery import build
+        kwargs = {"client_options": {"api_endpoint": SHEETS_API_ENDPOINT}} if SHEETS_API_ENDPOINT else {}
+        return _Service(build("sheets", "v4", http=_ThreadLocalHttp(creds),
+                              static_discovery=True, cache_discovery=False, **kwargs))
+
+
+READ_CLIENT = SheetsClient()
+WRITE_CLIENT = SheetsClient(write=True)
+
+def gs_service(credentials_path: str, write: bool = False, interactive: bool = True):
+    """Service Sheets v4 dùng chung; write → token quyền ghi (lần đầu mở trình duyệt xin quyền, trừ khi interactive=False)."""
+    return (WRITE_CLIENT if write else READ_CLIENT).service(credentials_path, interactive)
+
+def gs_sheet_props(service, spreadsheet_id: str, gid: str | None) -> tuple[str, int]:
+    """(tên sheet, số hàng của lưới) theo gid; không có gid → sheet đầu tiên. Chỉ lấy đúng 3 field."""
+    meta = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields="sheets.properties(sheetId,title,gridProperties.rowCount)").execute()
+    sheets = [sh.get("properties", {}) for sh in meta.get("sheets", [])]
+    if gid:
+        sheets = [p for p in sheets if str(p.get("sheetId")) == str(gid)]
+        if not sheets:
+            raise RuntimeError("Không tìm thấy sheet theo GID.")
+    if not sheets:
+        return "Sheet1", 0
+    props = sheets[0]
+    return props.get("title", "Sheet1"), int(props.get("gridProperties", {}).get("rowCount", 0))
+
+def gs_iter_columns(service, spreadsheet_id: str, sheet_title: str, columns: _t.Sequence[str],
+                    start_row: int = 2, row_count: int = 0, chunk_rows: int = CHUNK_ROWS,
+                    cancelled: _t.Callable[[], bool] | None = None) -> _t.Iterator[tuple[int, list[tuple]]]:
+    """
+    Đọc vài cột theo từng khúc `chunk_rows` hàng (1 values().batchGet mỗi khúc, mỗi cột 1 range).
+    Yield (số hàng đầu khúc, [tuple giá trị từng cột] mỗi hàng). row_count = 0 → đọc tới khúc trống.
+    """
+    sheet = _gs_quote_sheet(sheet_title)
+    row = start_row
+    while not row_count or row <= row_count:
+        if cancelled and cancelled():
+            return
+        last = row + chunk_rows - 1
+        if row_count:
+            last = min(last, row_count)
+        resp = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{sheet}!{c}{row}:{c}{last}" for c in columns],
+            majorDimension="COLUMNS").execute()
+        cols = []
+        for vr in resp.get("valueRanges", []):
+            vals = vr.get("values") or [[]]
+            cols.append(vals[0])
+        n = max((len(c) for c in cols), default=0)
+        if n == 0 and not row_count:
+            return
+        rows = [tuple((c[i] if i < len(c) else "") for c in cols) for i in range(n)]
+        if rows:
+            yield row, rows
+        row = last + 1
+
+class SheetRow(_t.NamedTuple):
+    row: int      # số hàng trên sheet (1-based)
+    link: str     # ô cột C
+    stt: str      # ô cột F (có thể trống)
+
+def sheet_key(sheet_url: str) -> str:
+    """Khoá 1 tab của spreadsheet: "<spreadsheet id>:<gid>" (gid trống = sheet đầu)."""
+    return f"{_gs_extract_spreadsheet_id(sheet_url)}:{_gs_extract_gid(sheet_url) or ''}"
+
+def _gs_open(sheet_url: str, credentials_path: str):
+    """(service, spreadsheet id, tên sheet, số hàng lưới) cho URL sheet (hỗ trợ gid)."""
+    spreadsheet_id = _gs_extract_spreadsheet_id(sheet_url)
+    if not spreadsheet_id:
+        raise RuntimeError("Không lấy được Spreadsheet ID từ URL.")
+
+    service = gs_service(credentials_path)
+    title, row_count = gs_sheet_props(service, spreadsheet_id, _gs_extract_gid(sheet_url))
+    return service, spreadsheet_id, title, row_count
+
+class SheetSyncState:
+    """
+    Trạng thái đồng bộ mỗi sheet (sheet_key): watermark = hàng cuối đã thấy có dữ liệu, và hash nội dung
+    (link + STT hiệu lực) từng hàng → lần sync sau chỉ đọc phần đuôi và chỉ đưa ra hàng mới/đổi.
+    SQLite như JobJournal; lỗi SQLite đều nuốt (mất trạng thái = lần sau đọc lại toàn bộ).
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sheets ("
+                " sheet TEXT PRIMARY KEY, watermark INTEGER NOT NULL, updated REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows ("
+                " sheet TEXT NOT NULL, row INTEGER NOT NULL, hash TEXT NOT NULL, stt TEXT NOT NULL,"
+                " PRIMARY KEY (sheet, row))")
+            self._conn = conn
+        return self._conn
+
+    def watermark(self, sheet: str) -> int:
+        try:
+            with self._lock:
+                row = self._db().execute("SELECT watermark FROM sheets WHERE sheet=?", (sheet,)).fetchone()
+            return row[0] if row else 0
+        except Exception:
+            return 0
+
+    def rows(self, sheet: str, first: int, last: int) -> dict[int, tuple[str, str]]:
+        """row -> (hash, STT hiệu lực) các hàng đã lưu trong [first, last]."""
+        try:
+            with self._lock:
+                cur = self._db().execute(
+                    "SELECT row, hash, stt FROM rows WHERE sheet=? AND row BETWEEN ? AND ?", (sheet, first, last))
+                return {r: (h, stt) for r, h, stt in cur.fetchall()}
+        except Exception:
+            return {}
+
+    def save(self, sheet: str, rows: _t.Iterable[tuple[int, str, str]], watermark: int | None = None):
+        """Ghi hash các hàng (row, hash, stt) và (nếu có) watermark mới — 1 transaction."""
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("BEGIN")
+                try:
+                    db.executemany("INSERT OR REPLACE INTO rows(sheet, row, hash, stt) VALUES (?,?,?,?)",
+                                   [(sheet, r, h, stt) for r, h, stt in rows])
+                    if watermark is not None:
+                        db.execute("INSERT OR REPLACE INTO sheets(sheet, watermark, updated) VALUES (?,?,?)",
+                                   (sheet, watermark, time.time()))
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+        except Exception:
+            pass
+
+    def forget(self, sheet: str):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("DELETE FROM rows WHERE sheet=?", (sheet,))
+                db.execute("DELETE FROM sheets WHERE sheet=?", (sheet,))
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def _row_hash(link: str, stt: str) -> str:
+    return hashlib.blake2b(f"{link}\x1f{stt}".encode("utf-8"), digest_size=12).hexdigest()
+
+def gs_sync_sheet_rows(sheet_url: str, credentials_path: str, state: SheetSyncState,
+                       start_row: int | None = None, changed_only: bool = True, overlap: int = 200,
+                       chunk_rows: int = CHUNK_ROWS,
+                       cancelled: _t.Callable[[], bool] | None = None) -> _t.Iterator[list[SheetRow]]:
+    """
+    Đọc cột link + STT của sheet theo URL (hỗ trợ gid), yield từng khúc; nhớ trạng thái trong `state`:
+    - start_row None → chỉ đọc đuôi: từ watermark - overlap (bắt cả sửa ở các hàng cuối); 2 → đọc cả sheet.
+    - changed_only → chỉ yield hàng mới hoặc đổi nội dung so với hash đã lưu.
+    Hàng yield ra đã có STT hiệu lực (kế thừa hàng trên) → đưa thẳng vào SheetParser.
+    Watermark chỉ cập nhật khi đọc hết (không bị huỷ giữa chừng).
+    """
+    key = sheet_key(sheet_url)
+    service, spreadsheet_id, title, row_count = _gs_open(sheet_url, credentials_path)
+    mark = state.watermark(key)
+    if start_row is None:
+        start_row = max(2, mark - overlap + 1)
+    # STT hiệu lực của hàng ngay trên chỗ bắt đầu đọc
+    last_stt = state.rows(key, start_row - 1, start_row - 1).get(start_row - 1, ("", ""))[1]
+    for first, rows in gs_iter_columns(service, spreadsheet_id, title, (LINK_COL, STT_COL), start_row=start_row,
+                                       row_count=row_count, chunk_rows=chunk_rows, cancelled=cancelled):
+        known = state.rows(key, first, first + len(rows) - 1) if changed_only else {}
+        out, seen = [], []
+        for i, (link, stt) in enumerate(rows):
+            row, link, stt = first + i, link or "", (stt or "").strip()
+            if stt:
+                last_stt = stt
+            h = _row_hash(link, last_stt)
+            if link or stt:
+                mark = max(mark, row)
+            seen.append((row, h, last_stt))
+            if known.get(row, ("",))[0] != h and link:
+                out.append(SheetRow(row, link, last_stt))
+        if out:
+            yield out
+            if cancelled and cancelled():
+                return  # khúc này có thể chưa vào bảng → không ghi hash, lần sau đọc lại
+        state.save(key, seen)
+    if not (cancelled and cancelled()):
+        state.save(key, (), watermark=mark)
+
+
+class SheetEntry(_t.NamedTuple):
+    key: tuple            # (identity_key(url), kind) — 1 video/loại = 1 job
+    url: str
+    kind: str             # main / preventive / sound
+    stt: str              # STT hiển thị = tên file (ghép các STT, thêm hậu tố loại)
+    rows: tuple           # các hàng sheet chứa link này
+    new: bool             # False → link đã có ở khúc trước, chỉ đổi STT
+
+
+class SheetParser:
+    """
+    Gom link theo STT như nhập Sheet từ trước đến nay, nhưng nhận dữ liệu theo từng khúc:
+    STT trống kế thừa STT hàng trên (kể cả qua ranh giới khúc); link lặp ở nhiều hàng → ghép STT.
+    Hàng đã thấy mà đến lại (sync hàng đã sửa) → STT của hàng đó được thay, không ghép thêm.
+    """
+
+    _SUFFIX = {"main": "", "preventive": "_preventive", "sound": "_sound"}
+
+    def __init__(self):
+        self.last_stt = ""
+        self._entries: dict[tuple, dict] = {}   # key -> {"url", "kind", "stts": {row: stt}, "base"}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def feed(self, rows: _t.Iterable[SheetRow]) -> list[SheetEntry]:
+        """Các link mới hoặc đổi STT trong khúc này (theo thứ tự xuất hiện)."""
+        touched: dict[tuple, bool] = {}
+        for r in rows:
+            stt = r.stt
+            if stt:
+                self.last_stt = stt
+            else:
+                stt = self.last_stt
+            reg, prev, snd = parse_cell_content(r.link)
+            for kind, urls in (("main", reg), ("preventive", prev), ("sound", snd)):
+                for u in urls:
+                    if not is_valid_video_url(u):
+                        continue
+                    # ✅ Sanitize URL để loại bỏ tham số thời gian
+                    u = _sanitize_yt_watch_url(u)
+                    key = (identity_key(u), kind)
+                    e = self._entries.get(key)
+                    if e is None:
+                        # không có STT → số thứ tự theo link
+                        e = self._entries[key] = {"url": u, "kind": kind, "stts": {},
+                                                  "base": str(len(self._entries) + 1)}
+                        touched[key] = True
+                    if e["stts"].get(r.row) != stt:
+                        e["stts"][r.row] = stt
+                        touched.setdefault(key, False)
+        return [self._entry(key, new) for key, new in touched.items()]
+
+    def _entry(self, key: tuple, new: bool) -> SheetEntry:
+        e = self._entries[key]
+        stts = list(dict.fromkeys(v for v in e["stts"].values() if v))
+        base = "_".join(stts) if stts else e["base"]
+        return SheetEntry(key, e["url"], e["kind"], base + self._SUFFIX[e["kind"]], tuple(e["stts"]), new)
+
+
+class SheetWriteBack:
+    """
+    Ghi kết quả job (status, file, loại lỗi) về đúng hàng của sheet nguồn, 3 ô liền từ cột `column`.
+    - add() chỉ ghi nhớ (hàng có kết quả mới hơn thì đè); flush() gửi tất cả bằng 1 values().batchUpdate
+      mỗi spreadsheet, hàng liền nhau gộp 1 range → vài request cho cả lượt tải, không phải 1 request/job.
+    - service_factory() trả service Sheets có quyền ghi (gs_service(..., write=True) — đã cache, gọi mỗi lượt).
+    - flush() lỗi → kết quả giữ lại cho lượt sau. Thread-safe.
+    """
+
+    _MAX_RANGES = 500   # số range mỗi batchUpdate
+
+    def __init__(self, service_factory: _t.Callable[[], _t.Any], column: str = "G"):
+        self.service_factory = service_factory
+        self.column = column.strip().upper() or "G"
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict[tuple[str, int], list[str]] = {}   # (sheet_key, row) -> [status, file, lỗi]
+        self._titles: dict[str, str] = {}
+
+    def add(self, sheet: str, rows: _t.Iterable[int], status: str, path: str = "", error_class: str = ""):
+        with self._lock:
+            for r in rows:
+                self._pending[(sheet, r)] = [status, path or "", error_class or ""]
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Gửi các kết quả đang chờ; trả số hàng đã ghi."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                service = self.service_factory()
+                by_sheet: dict[str, list[int]] = {}
+                for sheet, r in batch:
+                    by_sheet.setdefault(sheet, []).append(r)
+                data_by_sid: dict[str, list[dict]] = {}
+                for sheet, rows in by_sheet.items():
+                    sid, _, gid = sheet.partition(":")
+                    if sheet not in self._titles:
+                        self._titles[sheet] = gs_sheet_props(service, sid, gid or None)[0]
+                    prefix = _gs_quote_sheet(self._titles[sheet])
+                    rows.sort()
+                    start = prev = rows[0]
+                    for r in rows[1:] + [None]:
+                        if r is not None and r == prev + 1:
+                            prev = r
+                            continue
+                        data_by_sid.setdefault(sid, []).append({
+                            "range": f"{prefix}!{self.column}{start}:{_gs_col(self.column, 2)}{prev}",
+                            "values": [batch[(sheet, x)] for x in range(start, prev + 1)]})
+                        start = prev = r
+                for sid, data in data_by_sid.items():
+                    for i in range(0, len(data), self._MAX_RANGES):
+                        service.spreadsheets().values().batchUpdate(
+                            spreadsheetId=sid,
+                            body={"valueInputOption": "RAW", "data": data[i:i + self._MAX_RANGES]}).execute()
+            except Exception:
+                with self._lock:
+                    for k, v in batch.items():
+                        self._pending.setdefault(k, v)   # kết quả mới hơn (add trong lúc gửi) được giữ
+                raise
+            return len(batch)
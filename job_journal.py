@@ -0,0 +1,166 @@
+# ==== job_journal.py (nhật ký job trên đĩa: SQLite WAL → khôi phục hàng đợi sau crash/đóng app) ====
+from __future__ import annotations
+import json, sqlite3, threading, time, pathlib, typing as _t
+
+# status coi như đã xong → không khôi phục ở lần mở sau
+FINISHED_STATUSES = ("Bong", "Canceled")
+FINISHED_PREFIXES = ("Skipped",)
+
+
+def is_finished(status: str) -> bool:
+    return status in FINISHED_STATUSES or status.startswith(FINISHED_PREFIXES)
+
+
+class JournalRecord(_t.NamedTuple):
+    url: str
+    quality: str
+    stt: str
+    filename: str | None
+    from_collection: bool
+    checked: bool
+    status: str
+    error: str
+    source: tuple[str, tuple[int, ...]] | None = None   # (sheet_key, hàng) nếu nhập từ Google Sheet
+
+
+def _dump_source(source) -> str | None:
+    return json.dumps([source[0], list(source[1])]) if source else None
+
+
+def _load_source(text: str | None) -> tuple[str, tuple[int, ...]] | None:
+    try:
+        sheet, rows = json.loads(text)
+        return str(sheet), tuple(int(r) for r in rows)
+    except Exception:
+        return None
+
+
+class JobJournal:
+    """
+    Nhật ký job (định nghĩa + trạng thái) để mở lại app là có lại hàng đợi.
+    - add()/remove()/clear() ghi ngay (1 transaction mỗi lượt) — job đã vào bảng là đã nằm trên đĩa.
+    - touch(job): đổi status/lỗi/ô sửa tay... chỉ đánh dấu bẩn; flush() ghi dồn 1 transaction
+      (GUI gọi mỗi nhịp drain 10 Hz → tối đa mất ~100 ms trạng thái khi crash).
+    - job là object có id/url/quality/stt/filename/from_collection/checked/status/error/source (job_table.Job).
+    - Mọi lỗi SQLite đều nuốt → journal hỏng không làm hỏng tải.
+    """
+
+    _COLS = "jid, url, quality, stt, filename, from_collection, checked, status, error, source, updated"
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._dirty: dict[int, _t.Any] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " jid INTEGER PRIMARY KEY, url TEXT NOT NULL, quality TEXT NOT NULL,"
+                " stt TEXT NOT NULL, filename TEXT, from_collection INTEGER NOT NULL,"
+                " checked INTEGER NOT NULL, status TEXT NOT NULL, error TEXT NOT NULL,"
+                " source TEXT, updated REAL NOT NULL)")
+            if "source" not in {c[1] for c in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN source TEXT")   # nhật ký của bản cũ
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(job, now: float) -> tuple:
+        return (job.id, job.url, job.quality or "", job.stt or "", job.filename,
+                int(bool(job.from_collection)), int(bool(job.checked)),
+                job.status, job.error or "", _dump_source(getattr(job, "source", None)), now)
+
+    def _write(self, sql: str, rows: _t.Iterable[tuple] | None = None, before: str | None = None):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("BEGIN")
+                try:
+                    if before:
+                        db.execute(before)
+                    if rows is None:
+                        db.execute(sql)
+                    else:
+                        db.executemany(sql, rows)
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+        except Exception:
+            pass
+
+    # ---- ghi ----
+    def add(self, jobs: _t.Iterable[_t.Any]):
+        now = time.time()
+        rows = [self._row(j, now) for j in jobs]
+        if rows:
+            self._write(f"INSERT OR REPLACE INTO jobs({self._COLS}) VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+
+    def reset(self, jobs: _t.Iterable[_t.Any]):
+        """Thay toàn bộ nhật ký bằng `jobs` trong 1 transaction (sau khi khôi phục với id mới)."""
+        now = time.time()
+        self._dirty.clear()
+        self._write(f"INSERT OR REPLACE INTO jobs({self._COLS}) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                    [self._row(j, now) for j in jobs], before="DELETE FROM jobs")
+
+    def touch(self, job):
+        self._dirty[job.id] = job
+
+    def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        self._write(
+            "UPDATE jobs SET url=?, quality=?, stt=?, filename=?, from_collection=?, checked=?,"
+            " status=?, error=?, source=?, updated=? WHERE jid=?",
+            [self._row(j, now)[1:] + (j.id,) for j in dirty.values()])
+
+    def remove(self, ids: _t.Iterable[int]):
+        ids = list(ids)
+        for jid in ids:
+            self._dirty.pop(jid, None)
+        if ids:
+            self._write("DELETE FROM jobs WHERE jid=?", [(jid,) for jid in ids])
+
+    def clear(self):
+        self._dirty.clear()
+        self._write("DELETE FROM jobs")
+
+    def set_meta(self, key: str, value: str):
+        self._write("INSERT OR REPLACE INTO meta(key, value) VALUES (?,?)", [(key, value)])
+
+    # ---- đọc ----
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        try:
+            with self._lock:
+                row = self._db().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+            return row[0] if row else default
+        except Exception:
+            return default
+
+    def load(self) -> list[JournalRecord]:
+        """Các job trong nhật ký, theo thứ tự thêm vào."""
+        try:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT url, quality, stt, filename, from_collection, checked, status, error, source"
+                    " FROM jobs ORDER BY jid").fetchall()
+        except Exception:
+            return []
+        return [JournalRecord(u, q, s, f, bool(c), bool(k), st, e, _load_source(src))
+                for u, q, s, f, c, k, st, e, src in rows]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
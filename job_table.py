@@ -0,0 +1,400 @@
+# ==== job_table.py (bảng job: model Qt trên kho job gọn, thay cho QTableWidget) ====
+import itertools
+import threading
+from collections import Counter
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+COLUMNS = ("Sel", "STT", "URL", "Quality", "Status", "Progress")
+COL_SEL, COL_STT, COL_URL, COL_QUALITY, COL_STATUS, COL_PROGRESS = range(len(COLUMNS))
+PROGRESS_ROLE = Qt.UserRole + 1   # % tiến độ (int, -1 = chưa rõ) cho delegate vẽ thanh
+
+# data() bị view gọi rất nhiều lần/giây → so role bằng int thuần, role không dùng trả None ngay
+_DISPLAY, _EDIT, _CHECK, _TOOLTIP, _ALIGN, _PROGRESS = (
+    int(Qt.DisplayRole), int(Qt.EditRole), int(Qt.CheckStateRole),
+    int(Qt.ToolTipRole), int(Qt.TextAlignmentRole), int(PROGRESS_ROLE))
+_ROLES = frozenset((_DISPLAY, _EDIT, _CHECK, _TOOLTIP, _ALIGN, _PROGRESS))
+_ALIGN_CENTER = int(Qt.AlignCenter)
+
+
+def classify_stt(stt: str) -> Tuple[str, str]:
+    """STT '12_preventive' → ('preventive', '12'); '12_sound' → ('sound', '12'); còn lại 'main'."""
+    group = (stt or "").lower()
+    kind = "main"
+    if group.endswith("_preventive"):
+        kind = "preventive"
+    elif group.endswith("_sound"):
+        kind = "sound"
+    for suf in ("_preventive", "_sound"):
+        if group.endswith(suf):
+            group = group[: -len(suf)]
+    return kind, group
+
+
+class Job:
+    """1 hàng trong bảng. __slots__ → ~vài trăm byte/hàng, 100k hàng vẫn nhẹ."""
+    __slots__ = ("id", "url", "quality", "stt", "filename", "kind", "group",
+                 "from_collection", "checked", "status", "progress", "error", "key", "source")
+
+    def __init__(self, jid: int, url: str, quality: str, stt: str = "",
+                 filename: Optional[str] = None, from_collection: bool = False):
+        self.id = jid
+        self.url = url
+        self.quality = quality
+        self.stt = stt
+        self.filename = filename
+        self.kind, self.group = classify_stt(stt)
+        self.from_collection = bool(from_collection)
+        self.checked = True
+        self.status = "Pending"
+        self.progress = -1
+        self.error = ""
+        self.key: Hashable = None   # (identity của URL, kind) — model gán, dùng chống trùng
+        self.source: Optional[Tuple[str, Tuple[int, ...]]] = None   # (sheet_key, hàng) nếu nhập từ Google Sheet
+
+
+class JobEvents:
+    """
+    Kênh worker → GUI: thread tải chỉ ghi vào trạng thái chung, GUI đọc gom theo nhịp timer.
+    - progress/status: giữ giá trị MỚI NHẤT mỗi job (100 lần cập nhật giữa 2 nhịp = 1 lần vẽ).
+    - done: giữ thứ tự, luôn được xử lý sau progress/status của cùng lượt drain.
+    (Log không đi qua đây mà qua logger "app" — xem QtLogHandler.)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress: dict[int, int] = {}
+        self._status: dict[int, str] = {}
+        self._done: List[Tuple[int, bool, str]] = []
+
+    def progress(self, jid: int, percent: int):
+        with self._lock:
+            self._progress[jid] = percent
+
+    def status(self, jid: int, text: str):
+        with self._lock:
+            self._status[jid] = text
+
+    def done(self, jid: int, ok: bool, err: str):
+        with self._lock:
+            self._done.append((jid, ok, err))
+
+    def drain(self):
+        """Lấy hết sự kiện đã dồn: (progress, status, done)."""
+        with self._lock:
+            if not (self._progress or self._status or self._done):
+                return {}, {}, []
+            progress, self._progress = self._progress, {}
+            status, self._status = self._status, {}
+            done, self._done = self._done, []
+        return progress, status, done
+
+
+def _is_checked(value) -> bool:
+    return getattr(value, "value", value) == Qt.Checked.value
+
+
+class JobTableModel(QAbstractTableModel):
+    """
+    Model cho QTableView: toàn bộ trạng thái job nằm trong list[Job] (không tạo item/widget mỗi ô).
+    - Job có id ổn định (không đổi khi xoá/chèn hàng) → scheduler/worker/title nền đều dùng id.
+    - id → row tra O(1); chỉ build lại sau khi xoá hàng.
+    - status_counts: số job theo từng status, cập nhật mỗi lần đổi status → thống kê O(1).
+      Vì vậy status chỉ được đổi qua set_status / set_states (không gán job.status trực tiếp).
+    - journal (tuỳ chọn, job_journal.JobJournal): mọi thêm/xoá/đổi job được ghi theo; chủ model flush.
+    - key_fn(url) → identity (vd: download_core.identity_key, mọi cách viết 1 link ra cùng khoá);
+      chỉ mục (identity, kind) → số hàng cập nhật dần theo append/xoá/sửa → dedupe() O(1) mỗi job.
+    """
+
+    def __init__(self, parent=None, key_fn: Optional[Callable[[str], Any]] = None):
+        super().__init__(parent)
+        self._jobs: List[Job] = []
+        self._row: dict[int, int] = {}
+        self._ids = itertools.count(1)
+        self.status_counts: Counter = Counter()
+        self.key_fn = key_fn or (lambda url: url)
+        self._keys: Counter = Counter()
+        self.journal = None
+
+    # ---------- Kho job ----------
+    def new_job(self, url: str, quality: str, stt: str = "",
+                filename: Optional[str] = None, from_collection: bool = False) -> Job:
+        """Tạo Job (có id) nhưng chưa thêm vào bảng — gom nhiều job rồi append 1 lần."""
+        job = Job(next(self._ids), url, quality, stt, filename, from_collection)
+        job.key = (self.key_fn(url), job.kind)
+        return job
+
+    def has_key(self, key: Hashable) -> bool:
+        return self._keys.get(key, 0) > 0
+
+    def dedupe(self, jobs: Iterable[Job]) -> List[Job]:
+        """Bỏ job trùng (identity, kind) với bảng hoặc với job đứng trước trong lô — O(1) mỗi job."""
+        fresh, seen = [], set()
+        for job in jobs:
+            if job.key in seen or self._keys.get(job.key):
+                continue
+            seen.add(job.key)
+            fresh.append(job)
+        return fresh
+
+    def append(self, jobs: Iterable[Job]) -> List[Job]:
+        jobs = list(jobs)
+        if not jobs:
+            return jobs
+        first = len(self._jobs)
+        self.beginInsertRows(QModelIndex(), first, first + len(jobs) - 1)
+        for i, job in enumerate(jobs, first):
+            if not job.stt:
+                job.stt = str(i + 1)
+            self._row[job.id] = i
+            self._jobs.append(job)
+            self.status_counts[job.status] += 1
+            self._keys[job.key] += 1
+        self.endInsertRows()
+        if self.journal is not None:
+            self.journal.add(jobs)
+        return jobs
+
+    def remove_ids(self, ids: Iterable[int]) -> int:
+        rows = sorted({self._row[j] for j in ids if j in self._row})
+        if not rows:
+            return 0
+        for r in rows:
+            self.status_counts[self._jobs[r].status] -= 1
+            self._unkey(self._jobs[r])
+        if self.journal is not None:
+            self.journal.remove(self._jobs[r].id for r in rows)
+        # gom các hàng liên tiếp thành đoạn; quá nhiều đoạn lẻ → reset 1 lần rẻ hơn
+        ranges = []
+        for r in rows:
+            if ranges and ranges[-1][1] == r - 1:
+                ranges[-1][1] = r
+            else:
+                ranges.append([r, r])
+        if len(ranges) > 64:
+            drop = set(rows)
+            self.beginResetModel()
+            self._jobs = [j for i, j in enumerate(self._jobs) if i not in drop]
+            self.endResetModel()
+        else:
+            for a, b in reversed(ranges):
+                self.beginRemoveRows(QModelIndex(), a, b)
+                del self._jobs[a:b + 1]
+                self.endRemoveRows()
+        self._row = {j.id: i for i, j in enumerate(self._jobs)}
+        return len(rows)
+
+    def clear(self):
+        self.beginResetModel()
+        self._jobs = []
+        self._row = {}
+        self.status_counts.clear()
+        self._keys.clear()
+        self.endResetModel()
+        if self.journal is not None:
+            self.journal.clear()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __iter__(self) -> Iterator[Job]:
+        return iter(list(self._jobs))
+
+    def job(self, jid: int) -> Optional[Job]:
+        r = self._row.get(jid)
+        return None if r is None else self._jobs[r]
+
+    def job_at(self, row: int) -> Job:
+        return self._jobs[row]
+
+    def row_of(self, jid: int) -> Optional[int]:
+        return self._row.get(jid)
+
+    # ---------- Cập nhật + báo view ----------
+    def touch(self, jid: int, first: int = 0, last: int = len(COLUMNS) - 1):
+        r = self._row.get(jid)
+        if r is not None:
+            self.dataChanged.emit(self.index(r, first), self.index(r, last))
+
+    def touch_all(self, first: int = 0, last: int = len(COLUMNS) - 1):
+        if self._jobs:
+            self.dataChanged.emit(self.index(0, first), self.index(len(self._jobs) - 1, last))
+
+    def _unkey(self, job: Job):
+        self._keys[job.key] -= 1
+        if self._keys[job.key] <= 0:
+            del self._keys[job.key]
+
+    def _rekey(self, job: Job):
+        self._unkey(job)
+        job.key = (self.key_fn(job.url), job.kind)
+        self._keys[job.key] += 1
+
+    def _journal_touch(self, job: Job):
+        if self.journal is not None:
+            self.journal.touch(job)
+
+    def _restatus(self, job: Job, text: str):
+        c = self.status_counts
+        c[job.status] -= 1
+        if not c[job.status]:
+            del c[job.status]
+        c[text] += 1
+        job.status = text
+        self._journal_touch(job)
+
+    def set_status(self, jid: int, text: str):
+        job = self.job(jid)
+        if job and job.status != text:
+            self._restatus(job, text)
+            self.touch(jid, COL_STATUS, COL_STATUS)
+
+    def set_states(self, updates: Iterable[Tuple[Job, str, Optional[int]]]):
+        """Đổi status (+ progress nếu khác None) cho nhiều job, báo view 1 lần."""
+        for job, text, percent in updates:
+            if job.status != text:
+                self._restatus(job, text)
+            if percent is not None:
+                job.progress = percent
+        self.touch_all(COL_STATUS, COL_PROGRESS)
+
+    def apply_events(self, progress: dict, status: dict):
+        """Áp 1 lượt sự kiện từ JobEvents, báo view bằng 1 dataChanged phủ các hàng bị đổi."""
+        rows = []
+        for jid, text in status.items():
+            r = self._row.get(jid)
+            if r is not None and self._jobs[r].status != text:
+                self._restatus(self._jobs[r], text)
+                rows.append(r)
+        for jid, percent in progress.items():
+            r = self._row.get(jid)
+            if r is not None:
+                percent = -1 if percent < 0 else min(100, percent)
+                if self._jobs[r].progress != percent:
+                    self._jobs[r].progress = percent
+                    rows.append(r)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), COL_STATUS), self.index(max(rows), COL_PROGRESS))
+
+    def count(self, *statuses: str) -> int:
+        return sum(self.status_counts.get(s, 0) for s in statuses)
+
+    def set_progress(self, jid: int, percent: int):
+        job = self.job(jid)
+        if not job:
+            return
+        percent = -1 if percent < 0 else min(100, percent)
+        if job.progress != percent:
+            job.progress = percent
+            self.touch(jid, COL_PROGRESS, COL_PROGRESS)
+
+    def set_error(self, jid: int, err: str):
+        job = self.job(jid)
+        if job:
+            job.error = err or ""
+            self._journal_touch(job)
+            self.touch(jid, COL_QUALITY, COL_QUALITY)
+
+    def set_title(self, jid: int, title: str):
+        """Title lấy nền → thành STT hiển thị + tên file."""
+        job = self.job(jid)
+        if job:
+            job.stt = title
+            job.filename = title
+            self._journal_touch(job)
+            self.touch(jid, COL_STT, COL_STT)
+
+    def set_source(self, jid: int, source: Optional[Tuple[str, Tuple[int, ...]]]):
+        """Hàng sheet nguồn của job (không hiện trên bảng, chỉ ghi nhật ký)."""
+        job = self.job(jid)
+        if job and job.source != source:
+            job.source = source
+            self._journal_touch(job)
+
+    def renumber(self):
+        for i, job in enumerate(self._jobs):
+            job.stt = str(i + 1)
+            self._journal_touch(job)
+        self.touch_all(COL_STT, COL_STT)
+
+    def set_all_checked(self, checked: bool):
+        for job in self._jobs:
+            job.checked = checked
+            self._journal_touch(job)
+        self.touch_all(COL_SEL, COL_SEL)
+
+    # ---------- QAbstractTableModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        role = int(role)
+        if role not in _ROLES or not index.isValid():
+            return None
+        job = self._jobs[index.row()]
+        col = index.column()
+        if role == _DISPLAY or role == _EDIT:
+            if col == COL_STT:
+                return job.stt
+            if col == COL_URL:
+                return job.url
+            if col == COL_QUALITY:
+                return job.quality
+            if col == COL_STATUS:
+                return job.status
+            if col == COL_PROGRESS and role == _DISPLAY:
+                return "—" if job.progress < 0 else f"{job.progress}%"
+            return None
+        if role == _CHECK and col == COL_SEL:
+            return Qt.Checked if job.checked else Qt.Unchecked
+        if role == _PROGRESS and col == COL_PROGRESS:
+            return job.progress
+        if role == _TOOLTIP and col == COL_QUALITY and job.error:
+            return job.error  # lỗi lần tải gần nhất
+        if role == _ALIGN and col == COL_PROGRESS:
+            return _ALIGN_CENTER
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        f = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        col = index.column()
+        if col == COL_SEL:
+            f |= Qt.ItemIsUserCheckable
+        elif col in (COL_STT, COL_URL, COL_QUALITY):
+            f |= Qt.ItemIsEditable
+        return f
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        job = self._jobs[index.row()]
+        col = index.column()
+        if col == COL_SEL and role == Qt.CheckStateRole:
+            job.checked = _is_checked(value)
+        elif role == Qt.EditRole and col == COL_STT:
+            # sửa STT tay = đặt tên file + nhóm main/preventive/sound
+            job.stt = str(value).strip()
+            job.filename = job.stt or None
+            job.kind, job.group = classify_stt(job.stt)
+            self._rekey(job)
+        elif role == Qt.EditRole and col == COL_URL:
+            job.url = str(value).strip()
+            self._rekey(job)
+        elif role == Qt.EditRole and col == COL_QUALITY:
+            job.quality = str(value).strip()
+        else:
+            return False
+        self._journal_touch(job)
+        self.dataChanged.emit(index, index)
+        return True
@@ -1,8 +1,6 @@
 # ==== license_check.py (nhúng public key, verify token) ====
 from __future__ import annotations
 import os, base64, pathlib, datetime, typing as _t
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
 
 APP_SETTINGS_DIR = pathlib.Path(r"C:\11LABSV3\Settings")
 APP_LICENSE_FILE = APP_SETTINGS_DIR / "license_token.txt"
@@ -30,6 +28,7 @@ def get_device_id() -> str:
         return ""
 
 def _load_public_key():
+    from cryptography.hazmat.primitives import serialization  # nạp lười: chỉ cần lúc verify
     return serialization.load_pem_public_key(PUBLIC_KEY_PEM)
 
 def _read_token_file() -> str:
@@ -54,6 +53,8 @@ def _parse_token(token: str) -> tuple[str, str, datetime.date, bytes]:
     return did.strip(), owner.strip(), exp_date, sig
 
 def _verify_signature(did: str, owner: str, exp: datetime.date, sig: bytes) -> bool:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
     message = f"{did}|{owner}|{exp.isoformat()}".encode("utf-8")
     pk = _load_public_key()
     try:
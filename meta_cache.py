@@ -0,0 +1,130 @@
+# ==== meta_cache.py (cache metadata trên đĩa: SQLite, key = (platform, id)) ====
+from __future__ import annotations
+import json, sqlite3, threading, time, pathlib, typing as _t
+
+# TTL mặc định theo field (giây). Field không có trong bảng dùng DEFAULT_TTL.
+FIELD_TTLS: dict[str, float] = {
+    "title":       30 * 86400,   # title gần như không đổi
+    "duration":    30 * 86400,
+    "formats":     1 * 86400,    # ladder format (không lưu link media — link hết hạn nhanh)
+    "playlist":    6 * 3600,     # danh sách video của playlist/kênh (kênh ra video mới)
+    "unavailable": 12 * 3600,    # lỗi vĩnh viễn (private/removed) → re-run batch fail nhanh
+}
+DEFAULT_TTL = 86400.0
+
+
+class MetaCache:
+    """
+    Cache metadata (title, duration, format ladder, playlist expansion...) theo (platform, id).
+    - Mỗi field có TTL riêng (FIELD_TTLS), hết hạn coi như không có.
+    - Tổng dung lượng vượt max_bytes → xoá bản ghi hết hạn rồi bản ghi lâu không dùng (LRU).
+    - Thread-safe (1 connection + lock); mọi lỗi SQLite đều nuốt → cache hỏng không làm hỏng tải.
+    """
+
+    def __init__(self, path: pathlib.Path, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._puts = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                " platform TEXT NOT NULL, mid TEXT NOT NULL, field TEXT NOT NULL,"
+                " value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " expires REAL NOT NULL, accessed REAL NOT NULL,"
+                " PRIMARY KEY (platform, mid, field))")
+            conn.execute("CREATE INDEX IF NOT EXISTS meta_accessed ON meta(accessed)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, platform: str, mid: str, field: str) -> _t.Any:
+        """Trả về giá trị còn hạn, hoặc None."""
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                row = db.execute(
+                    "SELECT value, expires, accessed FROM meta WHERE platform=? AND mid=? AND field=?",
+                    (platform, mid, field)).fetchone()
+                if not row or row[1] <= now:
+                    return None
+                # chỉ cập nhật thời điểm dùng mỗi giờ 1 lần → đọc không thành ghi liên tục
+                if now - row[2] > 3600:
+                    db.execute("UPDATE meta SET accessed=? WHERE platform=? AND mid=? AND field=?",
+                               (now, platform, mid, field))
+            return json.loads(row[0])
+        except Exception:
+            return None
+
+    def put(self, platform: str, mid: str, field: str, value: _t.Any, ttl: float | None = None):
+        if value is None:
+            return
+        now = time.time()
+        ttl = FIELD_TTLS.get(field, DEFAULT_TTL) if ttl is None else ttl
+        try:
+            data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+            with self._lock:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO meta(platform, mid, field, value, size, expires, accessed)"
+                    " VALUES (?,?,?,?,?,?,?)",
+                    (platform, mid, field, data, len(data), now + ttl, now))
+                self._puts += 1
+                if self._puts % 200 == 0:
+                    self._evict_locked()
+        except Exception:
+            pass
+
+    def put_info(self, platform: str, mid: str, info: dict):
+        """Lưu title/duration/format ladder từ info dict của yt-dlp."""
+        if not info:
+            return
+        self.put(platform, mid, "title", info.get("title"))
+        self.put(platform, mid, "duration", info.get("duration"))
+        fmts = [
+            {k: f.get(k) for k in ("format_id", "ext", "height", "width", "fps",
+                                   "vcodec", "acodec", "tbr", "filesize")}
+            for f in (info.get("formats") or [])
+        ]
+        if fmts:
+            self.put(platform, mid, "formats", fmts)
+
+    def delete(self, platform: str, mid: str, field: str | None = None):
+        try:
+            with self._lock:
+                if field is None:
+                    self._db().execute("DELETE FROM meta WHERE platform=? AND mid=?", (platform, mid))
+                else:
+                    self._db().execute("DELETE FROM meta WHERE platform=? AND mid=? AND field=?",
+                                       (platform, mid, field))
+        except Exception:
+            pass
+
+    def _evict_locked(self):
+        db = self._db()
+        db.execute("DELETE FROM meta WHERE expires <= ?", (time.time(),))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM meta").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # xoá LRU tới khi còn ~90% max_bytes
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for platform, mid, field, size in db.execute(
+                "SELECT platform, mid, field, size FROM meta ORDER BY accessed"):
+            victims.append((platform, mid, field))
+            freed += size
+            if freed >= target:
+                break
+        db.executemany("DELETE FROM meta WHERE platform=? AND mid=? AND field=?", victims)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
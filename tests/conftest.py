@@ -0,0 +1,67 @@
+# ==== tests/conftest.py (module app nằm phẳng ở thư mục gốc; dữ liệu người dùng → thư mục tạm) ====
+import os, sys, re, tempfile
+
+# download_core tạo USER_DATA_DIR (~/.myduyen) lúc import → trỏ HOME sang thư mục tạm trước khi import
+_HOME = tempfile.mkdtemp(prefix="myduyen-tests-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = _HOME
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Exec:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeSheets:
+    """
+    Thay service Sheets v4 (spreadsheets().get / values().batchGet / values().batchUpdate).
+    grid = {tên sheet: {cột: {hàng: giá trị}}}; calls/updates ghi lại request đã gửi.
+    """
+
+    def __init__(self, grid=None, row_count=1000, gid=0):
+        self.grid = grid if grid is not None else {"Data": {}}
+        self.row_count = row_count
+        self.gid = gid
+        self.calls = []
+        self.updates = []
+        self.fail = False
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        self.calls.append(("get", spreadsheetId))
+        return _Exec(lambda: {"sheets": [
+            {"properties": {"sheetId": self.gid, "title": t, "gridProperties": {"rowCount": self.row_count}}}
+            for t in self.grid]})
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension="ROWS", **kwargs):
+        self.calls.append(("batchGet", tuple(ranges)))
+
+        def run():
+            out = []
+            for r in ranges:
+                title, col, a, _, b = re.match(r"'(.*)'!([A-Z]+)(\d+):([A-Z]+)(\d+)", r).groups()
+                cells = self.grid[title.replace("''", "'")].get(col, {})
+                vals = [cells.get(i, "") for i in range(int(a), int(b) + 1)]
+                while vals and vals[-1] == "":
+                    vals.pop()
+                out.append({"range": r, "values": [vals]} if vals else {"range": r})
+            return {"valueRanges": out}
+        return _Exec(run)
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        self.calls.append(("batchUpdate", spreadsheetId))
+
+        def run():
+            if self.fail:
+                raise RuntimeError("HTTP Error 503")
+            self.updates.append((spreadsheetId, body))
+            return {"totalUpdatedRows": sum(len(d["values"]) for d in body["data"])}
+        return _Exec(run)
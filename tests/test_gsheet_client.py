@@ -0,0 +1,91 @@
+import datetime, threading
+
+import pytest
+
+from gsheet import SheetsClient
+
+
+class _Creds:
+    refresh_token = "r"
+
+    def __init__(self, seconds_left=3600):
+        self.expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) \
+            + datetime.timedelta(seconds=seconds_left)
+        self.refreshed = 0
+
+    def refresh(self, request):
+        self.refreshed += 1
+        self.expiry += datetime.timedelta(hours=1)
+
+    def to_json(self):
+        return "{}"
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    import gsheet
+    monkeypatch.setattr(gsheet, "SHEETS_API_ENDPOINT", "")
+    monkeypatch.setattr(gsheet, "TOKEN_FILE", tmp_path / "token.json")
+    c = SheetsClient()
+    c.loads = []
+    c.gate = threading.Event()
+    c.gate.set()
+
+    def load(path, interactive=True):
+        c.loads.append(path)
+        c.gate.wait(5)          # giả lập luồng OAuth đang đợi người dùng
+        return _Creds()
+    monkeypatch.setattr(c, "_load_creds", load)
+    monkeypatch.setattr(SheetsClient, "_build", staticmethod(lambda creds: object()))
+    return c
+
+
+def test_service_is_built_once_and_reloaded_on_new_credentials_path(client):
+    svc = client.service("a.json")
+    assert client.service("a.json") is svc
+    assert client.service("b.json") is not svc
+    assert client.loads == ["a.json", "b.json"]
+
+
+def test_credentials_refreshed_in_place_before_expiry(client):
+    svc = client.service("a.json")
+    client._creds = creds = _Creds(seconds_left=60)
+    assert client.service("a.json") is svc
+    assert client.service("a.json") is svc
+    assert creds.refreshed == 1 and client.loads == ["a.json"]
+
+
+def test_login_does_not_hold_the_lock(client):
+    client.gate.clear()
+    first = threading.Thread(target=client.service, args=("a.json",))
+    first.start()
+    while not client.loads:
+        pass
+    # người dùng còn đang đăng nhập: lời gọi không tương tác trả lỗi ngay, không bị chặn
+    with pytest.raises(RuntimeError):
+        client.service("a.json", interactive=False)
+    waiter = []
+    second = threading.Thread(target=lambda: waiter.append(client.service("a.json")))
+    second.start()
+    client.gate.set()
+    first.join(5); second.join(5)
+    assert waiter == [client.service("a.json")] and client.loads == ["a.json"]
+
+
+def test_current_service_served_while_another_thread_refreshes(client):
+    svc = client.service("a.json")
+    started, release = threading.Event(), threading.Event()
+
+    class SlowCreds(_Creds):
+        def refresh(self, request):
+            started.set()
+            release.wait(5)
+            super().refresh(request)
+    client._creds = SlowCreds(seconds_left=60)
+    t = threading.Thread(target=client.service, args=("a.json",))
+    t.start()
+    assert started.wait(5)
+    assert client.service("a.json", interactive=False) is svc
+    release.set()
+    t.join(5)
+    assert client._creds.refreshed == 1
@@ -0,0 +1,33 @@
+from gsheet import SheetParser, SheetRow
+
+
+def _vid(n: int) -> str:
+    return f"https://youtu.be/{n:011d}"
+
+
+def test_parser_inherits_stt_across_chunks_and_joins_repeated_links():
+    p = SheetParser()
+    first = p.feed([SheetRow(2, _vid(1), "A1"), SheetRow(3, _vid(2), "")])
+    assert [(e.key, e.stt, e.rows, e.new) for e in first] == [
+        ((("yt", "00000000001"), "main"), "A1", (2,), True), ((("yt", "00000000002"), "main"), "A1", (3,), True)]
+    assert first[0].url == "https://www.youtube.com/watch?v=00000000001"   # link đã chuẩn hoá
+    # khúc sau: STT trống vẫn kế thừa "A1"; link lặp → ghép STT
+    second = p.feed([SheetRow(4, _vid(1), ""), SheetRow(5, _vid(1), "B2")])
+    assert [(e.stt, e.rows, e.new) for e in second] == [("A1_B2", (2, 4, 5), False)]
+    assert len(p) == 2
+
+
+def test_parser_kinds_and_edited_row_replaces_stt():
+    p = SheetParser()
+    cell = f"{_vid(1)}\nlink dự phòng {_vid(2)}\noriginal sound {_vid(3)}"
+    out = p.feed([SheetRow(2, cell, "S1")])
+    assert [(e.kind, e.stt) for e in out] == [
+        ("main", "S1"), ("preventive", "S1_preventive"), ("sound", "S1_sound")]
+    edited = p.feed([SheetRow(2, _vid(1), "S9")])
+    assert [(e.kind, e.stt, e.new) for e in edited] == [("main", "S9", False)]
+
+
+def test_parser_numbers_links_without_stt_and_skips_unsupported():
+    p = SheetParser()
+    out = p.feed([SheetRow(2, "https://example.com/x", ""), SheetRow(3, _vid(1), ""), SheetRow(4, _vid(2), "")])
+    assert [e.stt for e in out] == ["1", "2"]
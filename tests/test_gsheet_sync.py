@@ -0,0 +1,95 @@
+import pytest
+
+import gsheet
+from gsheet import SheetRow, SheetSyncState, gs_sync_sheet_rows, sheet_key
+from conftest import FakeSheets
+
+URL = "https://docs.google.com/spreadsheets/d/1AbCdEfGhIjKlMnOpQrStUvWxYz/edit#gid=0"
+
+
+def _vid(n: int) -> str:
+    return f"https://youtu.be/{n:011d}"
+
+
+@pytest.fixture
+def sheet(monkeypatch, tmp_path):
+    """Sheet giả: cột C = link, F = STT; gs_service trả FakeSheets; trạng thái sync ở tmp_path."""
+    svc = FakeSheets({"Data": {"C": {}, "F": {}}})
+    monkeypatch.setattr(gsheet, "gs_service", lambda *a, **k: svc)
+    state = SheetSyncState(tmp_path / "sync.sqlite3")
+    yield svc, state
+    state.close()
+
+
+def _set(svc, row, link="", stt=""):
+    data = svc.grid["Data"]
+    data["C"][row] = link
+    data["F"][row] = stt
+
+
+def _sync(state, **kw):
+    return [r for chunk in gs_sync_sheet_rows(URL, "cred.json", state, **kw) for r in chunk]
+
+
+# ---- gs_sync_sheet_rows ----
+def test_full_read_sets_watermark_and_effective_stt(sheet):
+    svc, state = sheet
+    _set(svc, 2, _vid(1), "S1")
+    _set(svc, 3, _vid(2))
+    _set(svc, 5, "", "S2")
+    _set(svc, 6, _vid(3))
+    rows = _sync(state, start_row=2, changed_only=False)
+    assert rows == [SheetRow(2, _vid(1), "S1"), SheetRow(3, _vid(2), "S1"), SheetRow(6, _vid(3), "S2")]
+    assert state.watermark(sheet_key(URL)) == 6
+
+
+def test_tail_sync_reads_from_watermark_minus_overlap_and_yields_only_changes(sheet):
+    svc, state = sheet
+    for r in range(2, 302):
+        _set(svc, r, _vid(r), "S1" if r == 2 else "")
+    _sync(state, start_row=2, changed_only=False)
+    assert state.watermark(sheet_key(URL)) == 301
+
+    svc.calls.clear()
+    assert _sync(state, overlap=50) == []
+    assert [c[1] for c in svc.calls if c[0] == "batchGet"] == [("'Data'!C252:C1000", "'Data'!F252:F1000")]
+
+    _set(svc, 280, _vid(9280))          # sửa trong vùng overlap
+    _set(svc, 302, _vid(302))           # hàng mới: STT kế thừa từ hàng đã lưu phía trên
+    _set(svc, 303, _vid(303), "S2")
+    assert _sync(state, overlap=50) == [
+        SheetRow(280, _vid(9280), "S1"), SheetRow(302, _vid(302), "S1"), SheetRow(303, _vid(303), "S2")]
+    assert state.watermark(sheet_key(URL)) == 303
+    assert _sync(state, overlap=50) == []
+
+
+def test_stt_edit_above_changes_effective_stt_of_rows_below(sheet):
+    svc, state = sheet
+    _set(svc, 2, _vid(1), "S1")
+    _set(svc, 3, _vid(2))
+    _sync(state, start_row=2, changed_only=False)
+    _set(svc, 2, _vid(1), "S7")
+    assert _sync(state, start_row=2) == [SheetRow(2, _vid(1), "S7"), SheetRow(3, _vid(2), "S7")]
+
+
+def test_cancelled_sync_does_not_advance_watermark_or_hashes(sheet):
+    svc, state = sheet
+    for r in range(2, 40):
+        _set(svc, r, _vid(r), "S")
+    stop = []
+    gen = gs_sync_sheet_rows(URL, "cred.json", state, start_row=2, chunk_rows=10, cancelled=lambda: bool(stop))
+    first = next(gen)
+    stop.append(True)
+    assert list(gen) == []
+    assert [r.row for r in first] == list(range(2, 12))
+    assert state.watermark(sheet_key(URL)) == 0
+    assert len(_sync(state, start_row=2)) == 38     # khúc bị huỷ chưa lưu hash → đọc lại đủ
+
+
+def test_forget_resets_state(sheet):
+    svc, state = sheet
+    _set(svc, 2, _vid(1), "S1")
+    _sync(state, start_row=2)
+    state.forget(sheet_key(URL))
+    assert state.watermark(sheet_key(URL)) == 0
+    assert _sync(state, start_row=2) == [SheetRow(2, _vid(1), "S1")]
@@ -0,0 +1,119 @@
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import gsheet
+from gsheet import SheetWriteBack
+from conftest import FakeSheets
+
+
+def _wb(service, column="G"):
+    return SheetWriteBack(lambda: service, column)
+
+
+def test_flush_merges_contiguous_rows_into_one_request():
+    svc = FakeSheets()
+    wb = _wb(svc)
+    wb.add("abc:0", [2, 3], "Bong", "/out/a.mp4")
+    wb.add("abc:0", [4], "Error", "", "unavailable")
+    wb.add("abc:0", [7], "Bong", "/out/b.mp4")
+
+    assert wb.flush() == 4
+    assert svc.updates == [("abc", {"valueInputOption": "RAW", "data": [
+        {"range": "'Data'!G2:I4", "values": [["Bong", "/out/a.mp4", ""],
+                                             ["Bong", "/out/a.mp4", ""],
+                                             ["Error", "", "unavailable"]]},
+        {"range": "'Data'!G7:I7", "values": [["Bong", "/out/b.mp4", ""]]},
+    ]})]
+    assert wb.pending == 0
+
+
+def test_latest_result_wins_and_column_offset():
+    svc = FakeSheets({"Bob's list": {}})
+    wb = _wb(svc, column="z")
+    wb.add("abc:0", [5], "Error", "", "network")
+    wb.add("abc:0", [5], "Bong", "/out/c.mp4")
+    wb.flush()
+    assert svc.updates[0][1]["data"] == [
+        {"range": "'Bob''s list'!Z5:AB5", "values": [["Bong", "/out/c.mp4", ""]]}]
+
+
+def test_one_batch_update_per_spreadsheet_and_titles_cached():
+    svc = FakeSheets()
+    wb = _wb(svc)
+    wb.add("one:0", [2], "Bong")
+    wb.add("two:0", [2], "Bong")
+    wb.flush()
+    wb.add("one:0", [3], "Bong")
+    wb.flush()
+    assert sorted(sid for sid, _ in svc.updates) == ["one", "one", "two"]
+    assert [c for c in svc.calls if c[0] == "get"] == [("get", "one"), ("get", "two")]
+
+
+def test_ranges_are_capped_per_request(monkeypatch):
+    monkeypatch.setattr(SheetWriteBack, "_MAX_RANGES", 2)
+    svc = FakeSheets()
+    wb = _wb(svc)
+    for r in (2, 4, 6):
+        wb.add("abc:0", [r], "Bong")
+    wb.flush()
+    assert [[d["range"] for d in body["data"]] for _, body in svc.updates] == [
+        ["'Data'!G2:I2", "'Data'!G4:I4"], ["'Data'!G6:I6"]]
+
+
+def test_failed_flush_keeps_results_for_next_round():
+    svc = FakeSheets()
+    wb = _wb(svc)
+    wb.add("abc:0", [2], "Error", "", "network")
+    svc.fail = True
+    with pytest.raises(RuntimeError):
+        wb.flush()
+    assert wb.pending == 1
+    wb.add("abc:0", [3], "Bong", "/out/d.mp4")
+    svc.fail = False
+    assert wb.flush() == 2
+    assert svc.updates[-1][1]["data"] == [
+        {"range": "'Data'!G2:I3", "values": [["Error", "", "network"], ["Bong", "/out/d.mp4", ""]]}]
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Sheets API v4 tối giản: GET spreadsheet → 1 sheet 'Data'; POST batchUpdate → ghi lại body."""
+    posts: list = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send({"sheets": [{"properties": {"sheetId": 0, "title": "Data",
+                                               "gridProperties": {"rowCount": 100}}}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.posts.append((self.path.split("?")[0], body))
+        self._send({"totalUpdatedRows": len(body["data"])})
+
+
+def test_flush_against_local_http_stand_in(monkeypatch):
+    pytest.importorskip("googleapiclient")
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(gsheet, "SHEETS_API_ENDPOINT", f"http://127.0.0.1:{srv.server_port}")
+        client = gsheet.SheetsClient(write=True)
+        wb = SheetWriteBack(lambda: client.service(""))
+        wb.add("abc:0", [2, 3], "Bong", "/out/e.mp4")
+        assert wb.flush() == 2
+    finally:
+        srv.shutdown()
+    assert _StandIn.posts == [("/v4/spreadsheets/abc/values:batchUpdate", {
+        "valueInputOption": "RAW",
+        "data": [{"range": "'Data'!G2:I3", "values": [["Bong", "/out/e.mp4", ""]] * 2}]})]
@@ -0,0 +1,102 @@
+import types
+
+import pytest
+
+import download_core as D
+from download_core import HostBudget, Scheduler, parse_platform_limits
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Đồng hồ giả cho HostBudget (token bucket dùng time.monotonic)."""
+    now = [1000.0]
+    monkeypatch.setattr(D, "time", types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    return now
+
+
+# ---- HostBudget (AIMD) ----
+def test_budget_caps_parallel_jobs_and_start_rate(clock):
+    b = HostBudget({"yt": (2, 1.0)})
+    for _ in range(2):
+        assert b.ready("yt")
+        b.acquire("yt")
+    assert not b.ready("yt") and b.wait_time("yt") is None   # hết slot
+    b.release("yt")
+    assert not b.ready("yt")                                  # còn slot nhưng hết token
+    assert b.wait_time("yt") == pytest.approx(1.0)
+    clock[0] += 1.0
+    assert b.ready("yt")
+
+
+def test_budget_halves_on_throttle_and_recovers_additively(clock):
+    b = HostBudget({"tt": (8, 4.0)})
+    st = b._state("tt")
+    b.acquire("tt")
+    b.release("tt", throttled=True)
+    assert (st.window, st.rate) == (4.0, 2.0) and st.tokens <= 0
+    b.acquire("tt")
+    b.release("tt", throttled=True)
+    assert (st.window, st.rate) == (2.0, 1.0)
+    b.acquire("tt")
+    b.release("tt")
+    assert st.window == pytest.approx(2.5) and st.rate == pytest.approx(1.4)
+    for _ in range(200):
+        b.acquire("tt")
+        b.release("tt")
+    assert (st.window, st.rate) == (8.0, 4.0)               # không vượt mức cấu hình
+
+
+def test_budget_floor_and_unknown_host_uses_other(clock):
+    b = HostBudget()
+    st = b._state("example")
+    assert (st.cap, st.base_rate) == D.PLATFORM_LIMITS["other"]
+    for _ in range(10):
+        b.acquire("example")
+        b.release("example", throttled=True)
+    assert st.window == 1.0 and st.rate == pytest.approx(st.base_rate / 16)
+
+
+def test_scheduler_throttle_shrinks_platform_window(clock):
+    s = Scheduler(max_workers=10, budget=HostBudget({"ig": (2, 1000.0), "yt": (4, 1000.0)}))
+    for i in range(4):
+        s.add(("ig", i), host="ig")
+    s.add(("yt", 0), host="yt")
+    assert [s.next() for _ in range(3)] == [("ig", 0), ("ig", 1), ("yt", 0)]   # ig đầy slot
+    s.done(("ig", 0), False, retryable=False, throttled=True)
+    clock[0] += 10
+    assert s.next() is None        # cửa sổ ig còn 1, ("ig", 1) vẫn đang chạy
+    s.done(("ig", 1), True)
+    assert s.next() == ("ig", 2)
+
+
+def test_default_limits_scale_up_with_max_workers_but_overrides_stay(clock):
+    b = HostBudget(max_workers=4)
+    assert b.limits == D.PLATFORM_LIMITS                    # ít worker hơn mức chỉnh → giữ nguyên
+    b = HostBudget({"ig": (3, None), "tt": (1, 0.2)}, max_workers=20)
+    assert b.limits["yt"] == (20, 10.0) and b.limits["fb"] == (8, 2.5)
+    assert b.limits["ig"] == (3, 1.25) and b.limits["tt"] == (1, 0.2)
+
+
+def test_scheduler_reset_rescales_budget(clock):
+    s = Scheduler(max_workers=5)
+    for i in range(20):
+        s.add(("yt", i), host="yt")
+    s.reset(max_workers=20)
+    for i in range(20):
+        s.add(("yt", i), host="yt")
+    assert len([k for k in iter(s.next, None)]) == 20
+
+
+@pytest.mark.parametrize("text, limits", [
+    ("yt=12/6; ig=2", {"yt": (12, 6.0), "ig": (2, None)}),
+    ("TT = 3 / 0.5,\nother=5", {"tt": (3, 0.5), "other": (5, None)}),
+    ("", {}),
+])
+def test_parse_platform_limits(text, limits):
+    assert parse_platform_limits(text) == limits
+
+
+@pytest.mark.parametrize("text", ["yt", "yt=0", "youtube=4", "yt=4/0", "yt=4/fast"])
+def test_parse_platform_limits_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        parse_platform_limits(text)
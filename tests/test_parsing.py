@@ -0,0 +1,81 @@
+import pytest
+
+from download_core import parse_rate, parse_schedule, media_key, identity_key, classify_error
+
+
+@pytest.mark.parametrize("text, rate", [
+    ("5M", 5 * 1024 ** 2), ("800k", 800 * 1024), ("1.5m", 1.5 * 1024 ** 2), ("2g", 2 * 1024 ** 3),
+    ("3MB/s", 3 * 1024 ** 2), (" 100 ", 100.0), (2_000_000, 2_000_000.0), (-5, 0.0),
+    ("", 0.0), ("0", 0.0), ("off", 0.0), ("Unlimited", 0.0), (None, 0.0),
+])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+@pytest.mark.parametrize("text", ["fast", "5T", "1,5M"])
+def test_parse_rate_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_parse_schedule_minutes_and_midnight_wrap():
+    assert parse_schedule("08:00-18:00=2M; 18:00-08:00=0") == [
+        (480, 1080, 2 * 1024 ** 2), (1080, 480, 0.0)]
+    assert parse_schedule("9-17:30=500k,\n24-6=off") == [(540, 1050, 500 * 1024), (0, 360, 0.0)]
+    assert parse_schedule("") == parse_schedule(None) == []
+
+
+@pytest.mark.parametrize("text", ["08:00=2M", "8-18", "08:00-18:00=lots"])
+def test_parse_schedule_rejects_bad_entries(text):
+    with pytest.raises(ValueError):
+        parse_schedule(text)
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=abc",
+    "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ",
+])
+def test_media_key_same_video_any_spelling(url):
+    assert media_key(url) == ("yt", "dQw4w9WgXcQ")
+
+
+def test_media_key_other_platforms_and_empty():
+    assert media_key("https://www.tiktok.com/@user/video/7234567890123456789?lang=en") == ("tt", "7234567890123456789")
+    assert media_key("https://www.instagram.com/reel/Cx1abcDEF_g/") == ("ig", "Cx1abcDEF_g")
+    assert media_key("") is None
+
+
+def test_identity_key_collections_and_videos():
+    assert identity_key("https://www.youtube.com/playlist?list=PL123abc") == ("yt", "list:PL123abc")
+    assert identity_key("https://www.youtube.com/@SomeChannel/videos") == \
+        identity_key("https://www.youtube.com/@somechannel/videos/")
+    assert identity_key("https://youtu.be/dQw4w9WgXcQ") == ("yt", "dQw4w9WgXcQ")
+
+
+def _err(msg, extract=False):
+    e = RuntimeError(msg)
+    if extract:
+        e._extract_error = True
+    return e
+
+
+@pytest.mark.parametrize("msg, extract, cls", [
+    ("ERROR: [youtube] x: Private video. Sign in if you've been granted access", False, "unavailable"),
+    ("ERROR: [youtube] x: Video unavailable. This video has been removed", True, "unavailable"),
+    ("ERROR: [generic] x: Unable to download webpage: HTTP Error 404: Not Found", True, "unavailable"),
+    ("ERROR: unable to download video data: HTTP Error 404: Not Found", False, "network"),
+    ("ERROR: fragment 3: HTTP Error 410: Gone", False, "network"),
+    ("ERROR: unable to download video data: HTTP Error 403: Forbidden", False, "forbidden"),
+    ("HTTP Error 429: Too Many Requests", False, "rate_limit"),
+    ("HTTP Error 416: Requested range not satisfiable", False, "http416"),
+    ("something odd", False, "unknown"),
+])
+def test_classify_error(msg, extract, cls):
+    assert classify_error(_err(msg, extract)) == cls
+
+
+def test_classify_error_cancel():
+    assert classify_error(KeyboardInterrupt("UserCanceled")) == "canceled"
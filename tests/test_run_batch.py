@@ -0,0 +1,29 @@
+import io, json
+
+import download_core as D
+
+
+class _Job:
+    error_class = ""
+    throttled = False
+    last_status = ""
+
+    def __init__(self, url, **kw):
+        self.url = url
+
+    def run(self):
+        return True, ""
+
+
+def test_cli_batch_dedupes_every_spelling_of_a_video(monkeypatch, tmp_path):
+    monkeypatch.setattr(D, "DownloadJob", _Job)
+    out = io.StringIO()
+    urls = [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://youtu.be/dQw4w9WgXcQ?si=abc",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+        "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+        "https://youtu.be/aaaaaaaaaaa",
+    ]
+    assert D.run_batch(urls, tmp_path, results=out, expand=False, use_archive=False) == (2, 0)
+    assert len([json.loads(line) for line in out.getvalue().splitlines()]) == 2
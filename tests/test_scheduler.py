@@ -0,0 +1,164 @@
+import download_core as D
+from download_core import JobQueue, HostQueues, HostBudget, Scheduler
+
+
+def _drain(q, *args):
+    out = []
+    while (k := q.pop(*args)) is not None:
+        out.append(k)
+    return out
+
+
+# ---- JobQueue ----
+def test_job_queue_orders_by_priority_then_fifo():
+    q = JobQueue()
+    for key, prio in (("a", 2), ("b", 1), ("c", 2), ("d", 0), ("e", 1)):
+        q.push(key, prio)
+    assert list(q) == ["d", "b", "e", "a", "c"]
+    assert _drain(q) == ["d", "b", "e", "a", "c"]
+    assert len(q) == 0 and q.pop() is None
+
+
+def test_job_queue_repush_moves_key_to_end_of_new_class_and_remove():
+    q = JobQueue()
+    for key in "abc":
+        q.push(key, 1)
+    q.push("a", 1)          # cùng lớp → xuống cuối
+    q.push("c", 0)          # lên lớp trên
+    assert q.remove("b") and not q.remove("b")
+    assert q.priority("a") == 1 and "b" not in q
+    assert _drain(q) == ["c", "a"]
+
+
+def test_job_queue_compacts_dead_entries():
+    q = JobQueue()
+    for i in range(3000):
+        q.push(i, 1)
+    for i in range(2500):
+        q.remove(i)
+    assert len(q) == 500 and len(q._heap) < 3000
+    assert _drain(q) == list(range(2500, 3000))
+
+
+# ---- HostQueues ----
+def test_host_queues_keep_fifo_across_hosts():
+    q = HostQueues()
+    order = [("yt", 0), ("tt", 0), ("yt", 1), ("ig", 0), ("tt", 1), ("yt", 2)]
+    for key in order[:3]:
+        q.push(key, 1, key[0])
+    for i in range(50):                 # host "yt" đã push nhiều hơn → seq riêng sẽ lớn hơn
+        q.push(("yt", 100 + i), 1, "yt")
+        q.remove(("yt", 100 + i))
+    for key in order[3:]:
+        q.push(key, 1, key[0])
+    assert _drain(q) == order
+
+
+def test_host_queues_priority_beats_host_order_and_skips_unready_hosts():
+    q = HostQueues()
+    q.push("slow", 2, "ig")
+    q.push("late", 2, "yt")
+    q.push("urgent", 0, "ig")
+    assert q.pop(lambda host: host != "ig") == "late"
+    assert q.hosts() == ["ig"]
+    assert _drain(q) == ["urgent", "slow"]
+
+
+def test_host_queues_moving_key_to_another_host():
+    q = HostQueues()
+    q.push("k", 1, "yt")
+    q.push("k", 1, "tt")
+    assert len(q) == 1 and q.hosts() == ["tt"] and q.priority("k") == 1
+
+
+# ---- Scheduler ----
+def _sched(**kw):
+    return Scheduler(budget=HostBudget({h: (100, 1e6) for h in D.PLATFORM_LIMITS}), **kw)
+
+
+def test_scheduler_fifo_across_platforms_within_priority():
+    s = _sched(max_workers=100)
+    keys = [("yt", 0), ("yt", 1), ("tt", 0), ("yt", 2), ("ig", 0), ("tt", 1), ("yt", 3)]
+    for k in keys:
+        s.add(k, host=k[0])
+    assert [s.next() for _ in keys] == keys
+
+
+def test_scheduler_priority_classes_and_pin():
+    s = _sched(max_workers=100)
+    s.add("m1")
+    s.add("p1", kind="preventive", group="g")      # chờ main fail, không vào hàng đợi
+    s.add("s1", kind="sound")
+    s.add("m2")
+    s.pin(["m2"])
+    assert [s.next() for _ in range(4)] == ["m2", "s1", "m1", None]
+
+
+def test_scheduler_retry_goes_behind_fresh_work_then_fails():
+    s = _sched(max_workers=1, max_retries=1)
+    s.add("a")
+    s.add("b")
+    assert s.next() == "a" and s.next() is None            # 1 worker
+    assert s.done("a", False).retry == 1
+    assert s.next() == "b"
+    s.done("b", True)
+    assert s.next() == "a"
+    out = s.done("a", False)
+    assert (out.retry, out.failed) == (0, True) and s.idle
+
+
+def test_scheduler_permanent_error_promotes_preventive():
+    s = _sched()
+    s.add("main", group="g1")
+    s.add("prev", kind="preventive", group="g1")
+    assert s.next() == "main"
+    out = s.done("main", False, retryable=False)
+    assert out.promoted == ["prev"] and out.retry == 0
+    assert s.next() == "prev"
+
+
+def test_scheduler_main_ok_skips_preventive():
+    s = _sched()
+    s.add("main", group="g1")
+    s.add("prev", kind="preventive", group="g1")
+    s.next()
+    assert s.done("main", True).skipped == ["prev"]
+    assert s.idle
+
+
+def test_scheduler_hold_release_and_cancel_running():
+    s = _sched()
+    s.hold("t")
+    s.add("t")
+    assert s.next() is None and not s.idle
+    assert s.release("t") and s.next() == "t"
+    s.cancel(["t"])
+    out = s.done("t", False)
+    assert out.canceled and out.retry == 0
+
+
+
+def test_scheduler_group_index_tracks_cancel_requeue_and_readd():
+    s = _sched()
+    s.add("main", group="g1")
+    for k in ("p1", "p2", "p3"):
+        s.add(k, kind="preventive", group="g1")
+    s.add("other", kind="preventive", group="g2")
+    s.cancel(["p2"])
+    s.requeue("p3")                                  # đã tự đưa vào hàng đợi
+    s.add("other", kind="preventive", group="g1")    # add lại sang nhóm khác
+    assert s.next() == "main" and s.next() == "p3"
+    assert s.done("main", False, retryable=False).promoted == ["p1", "other"]
+    assert not s.waiting and not s.by_group
+
+
+def test_scheduler_done_does_not_scan_all_jobs():
+    class NoScan(dict):
+        def items(self):
+            raise AssertionError("scanned meta")
+    s = _sched()
+    s.meta = NoScan()
+    s.add("main", group="g1")
+    s.add("prev", kind="preventive", group="g1")
+    s.next()
+    assert s.done("main", False, retryable=False).promoted == ["prev"]
@@ -0,0 +1,144 @@
+import sqlite3, types
+
+from download_archive import DownloadArchive, reuse_archived
+from job_journal import JobJournal, JournalRecord, is_finished
+
+
+# ---- JobJournal ----
+def _job(jid, url, status="Pending", **kw):
+    base = dict(id=jid, url=url, quality="1080p", stt=str(jid), filename=None,
+                from_collection=False, checked=True, status=status, error="")
+    base.update(kw)
+    return types.SimpleNamespace(**base)
+
+
+def test_journal_add_touch_flush_remove_and_reload(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    j = JobJournal(path)
+    jobs = [_job(1, "https://youtu.be/a"), _job(2, "https://youtu.be/b"), _job(3, "https://youtu.be/c")]
+    j.add(jobs)
+    jobs[0].status, jobs[0].error = "Error", "[network] boom"
+    jobs[1].checked = False
+    j.touch(jobs[0])
+    j.touch(jobs[1])
+    j.remove([3])
+    j.set_meta("out_dir", "/tmp/out")
+    j.close()                                  # close() flush phần bẩn còn lại
+
+    j2 = JobJournal(path)
+    assert j2.load() == [
+        JournalRecord("https://youtu.be/a", "1080p", "1", None, False, True, "Error", "[network] boom"),
+        JournalRecord("https://youtu.be/b", "1080p", "2", None, False, False, "Pending", ""),
+    ]
+    assert j2.get_meta("out_dir") == "/tmp/out" and j2.get_meta("nope", "d") == "d"
+    j2.close()
+
+
+def test_journal_keeps_sheet_source(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    j = JobJournal(path)
+    job = _job(1, "u1", source=("sid:0", (2, 5)))
+    j.add([job, _job(2, "u2")])
+    job.source = ("sid:0", (2, 5, 9))
+    j.touch(job)
+    j.close()
+    assert [r.source for r in JobJournal(path).load()] == [("sid:0", (2, 5, 9)), None]
+
+
+def test_journal_adds_source_column_to_old_file(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    db = sqlite3.connect(str(path))
+    db.execute("CREATE TABLE jobs (jid INTEGER PRIMARY KEY, url TEXT NOT NULL, quality TEXT NOT NULL,"
+               " stt TEXT NOT NULL, filename TEXT, from_collection INTEGER NOT NULL,"
+               " checked INTEGER NOT NULL, status TEXT NOT NULL, error TEXT NOT NULL, updated REAL NOT NULL)")
+    db.execute("INSERT INTO jobs VALUES (1, 'u1', '720p', '1', NULL, 0, 1, 'Pending', '', 0)")
+    db.commit(); db.close()
+    j = JobJournal(path)
+    assert j.load() == [JournalRecord("u1", "720p", "1", None, False, True, "Pending", "")]
+    j.add([_job(2, "u2", source=("sid:", (3,)))])
+    assert j.load()[1].source == ("sid:", (3,))
+    j.close()
+
+
+def test_journal_touch_is_batched_until_flush(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    j = JobJournal(path)
+    job = _job(1, "https://youtu.be/a")
+    j.add([job])
+    job.status = "Downloading"
+    j.touch(job)
+    assert JobJournal(path).load()[0].status == "Pending"
+    j.flush()
+    assert JobJournal(path).load()[0].status == "Downloading"
+    j.close()
+
+
+def test_journal_reset_and_clear(tmp_path):
+    j = JobJournal(tmp_path / "journal.sqlite3")
+    j.add([_job(1, "u1"), _job(2, "u2")])
+    j.reset([_job(10, "u2"), _job(11, "u3")])
+    assert [r.url for r in j.load()] == ["u2", "u3"]
+    j.clear()
+    assert j.load() == []
+    j.close()
+
+
+def test_journal_survives_unwritable_path(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    j = JobJournal(blocker / "journal.sqlite3")   # thư mục cha là file → SQLite lỗi, bị nuốt
+    j.add([_job(1, "u1")])
+    j.flush()
+    assert j.load() == [] and j.get_meta("k", "d") == "d"
+
+
+def test_is_finished():
+    assert is_finished("Bong") and is_finished("Canceled") and is_finished("Skipped (archived)")
+    assert not is_finished("Error") and not is_finished("Queued")
+
+
+# ---- DownloadArchive ----
+def test_archive_lookup_many_returns_only_intact_files(tmp_path):
+    arc = DownloadArchive(tmp_path / "archive.sqlite3")
+    a, b = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    a.write_bytes(b"x" * 10)
+    b.write_bytes(b"y" * 20)
+    arc.record("yt", "AAA", a)
+    arc.record("tt", "123", b)
+    arc.record("yt", "missing", tmp_path / "nope.mp4")     # không stat được → không ghi
+    found = arc.lookup_many([("yt", "AAA"), ("tt", "123"), ("yt", "missing"), None])
+    assert {k: (e.path, e.size) for k, e in found.items()} == {("yt", "AAA"): (a, 10), ("tt", "123"): (b, 20)}
+
+    b.write_bytes(b"changed")                              # file bị sửa → bản ghi tự bỏ
+    assert arc.lookup("tt", "123") is None
+    b.write_bytes(b"y" * 20)
+    assert arc.lookup("tt", "123") is None
+    arc.close()
+
+
+def test_archive_lookup_many_chunks_large_batches(tmp_path):
+    arc = DownloadArchive(tmp_path / "archive.sqlite3")
+    f = tmp_path / "f.mp4"
+    f.write_bytes(b"z")
+    for i in range(0, 1000, 7):
+        arc.record("yt", f"id{i}", f)
+    found = arc.lookup_many(("yt", f"id{i}") for i in range(1000))
+    assert sorted(found) == sorted(("yt", f"id{i}") for i in range(0, 1000, 7))
+    arc.close()
+
+
+def test_reuse_archived_links_into_new_folder_and_checks_existing(tmp_path):
+    arc = DownloadArchive(tmp_path / "archive.sqlite3")
+    src = tmp_path / "old" / "clip.mp4"
+    src.parent.mkdir()
+    src.write_bytes(b"v" * 5)
+    arc.record("yt", "AAA", src)
+    entry = arc.lookup("yt", "AAA")
+
+    dst = reuse_archived(entry, tmp_path / "out", "S1_title")
+    assert dst == tmp_path / "out" / "S1_title.mp4" and dst.read_bytes() == b"v" * 5
+    assert reuse_archived(entry, tmp_path / "out", "S1_title") == dst          # đã có, đúng kích thước
+    assert reuse_archived(entry, src.parent) == src                             # nằm đúng chỗ rồi
+    (tmp_path / "out" / "other.mp4").write_bytes(b"different")
+    assert reuse_archived(entry, tmp_path / "out", "other") is None
+    arc.close()
@@ -0,0 +1,50 @@
+import threading
+
+from download_core import WorkerPool, TitlePrefetcher
+
+
+class _Job:
+    row = 0
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.warm = None
+
+    def run(self):
+        self.gate.wait(5)
+        return True, ""
+
+    def stop(self):
+        self.gate.set()
+
+
+def test_burst_gets_threads_even_when_some_are_idle():
+    done = []
+    pool = WorkerPool(4, on_done=lambda job, ok, err: done.append(job))
+    warmup = threading.Event()
+    for _ in range(2):
+        pool.submit(_Job(warmup))
+    warmup.set()
+    while len(done) < 2 or pool._idle < 2:      # 2 thread rảnh chờ việc
+        pass
+    gate = threading.Event()
+    for _ in range(4):
+        pool.submit(_Job(gate))
+    assert pool.threads == 4
+    gate.set()
+    pool.shutdown()
+
+
+def test_prefetcher_burst_gets_threads_even_when_some_are_idle():
+    gate, titles = threading.Event(), []
+    pf = TitlePrefetcher(max_workers=4, per_host=4, resolver=lambda url: gate.wait(5) and url)
+    for i in range(2):
+        pf.submit(f"https://youtu.be/{i:011d}", lambda u, t: titles.append(t))
+    gate.set()
+    while len(titles) < 2 or pf._idle < 2:
+        pass
+    gate.clear()
+    for i in range(4):
+        pf.submit(f"https://youtu.be/{i:011d}", lambda u, t: titles.append(t))
+    assert len(pf._threads) == 4
+    gate.set()